@@ -2,15 +2,32 @@
 This file handles data insertion.
 """
 
+import argparse
 import ast
+import time
 import mysql.connector
 import pandas as pd
 from pathlib import Path
 from ast import literal_eval
 
-from utilities import MYSQL_DATABASE_NAME, connect_mysql_server
+from create_db_script import create_post_load_schema, create_pre_load_schema
+from movies_dataset import MOVIES_DATASET_FILENAME, ROLE_IDS, load_normalized_dataset
+from profiling import configure_profiling, profile_span, profiling_summary
+from summary_tables import refresh_summary_tables
+from utilities import close_connection_pool, get_connection_pool, mysql_database_name
+
+# Number of rows sent per executemany call in bulk mode
+BULK_BATCH_SIZE = 5000
+
+
+def _parse_description(description):
+    if pd.notna(description):
+        try:
+            return " ".join(ast.literal_eval(description))
+        except Exception:
+            return None
+    return None
 
-MOVIES_DATASET_FILENAME = "imdb_movies_dataset_10K.csv"
 
 def _extract_unique_genres(movies_data_frame):
     genres_set = set()
@@ -24,7 +41,8 @@ def _extract_unique_genres(movies_data_frame):
 
 
 def _insert_genres(mysql_connection, mysql_cursor, genres_set):
-    mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME};")
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    rows_count = 0
     try:
         mysql_cursor.execute("START TRANSACTION;")
         for genre in genres_set:
@@ -36,14 +54,18 @@ def _insert_genres(mysql_connection, mysql_cursor, genres_set):
                     "INSERT INTO Genre (name) VALUES (%s);",
                     (genre,)
                 )
+                rows_count += 1
         mysql_connection.commit()
     except mysql.connector.Error as error:
         print("Error inserting genres: ", error)
         mysql_connection.rollback()
+        rows_count = 0
+    return rows_count
 
 
 def _insert_certificates(mysql_connection, mysql_cursor, certificates):
-    mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME};")
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    rows_count = 0
     try:
         mysql_cursor.execute("START TRANSACTION;")
 
@@ -56,20 +78,24 @@ def _insert_certificates(mysql_connection, mysql_cursor, certificates):
                     "INSERT INTO Certificate (certificate, description) VALUES (%s, %s);",
                     (certificate, "Description placeholder")  # Assuming you need a placeholder for description
                 )
+                rows_count += 1
         mysql_connection.commit()  # Use the connection object to commit
     except mysql.connector.Error as error:
         print("Error inserting certificates: ", error)
         mysql_connection.rollback()  # Use the connection object to rollback
+        rows_count = 0
+    return rows_count
 
 
-def _insert_roles(mysql_connection, mysql_cursor):
+def insert_roles(mysql_connection, mysql_cursor, raise_errors=False):
     # Define a list of roles
     roles = [
         {'role_id': 2, 'name': 'actor'},
         {'role_id': 1, 'name': 'director'}
     ]
 
-    mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME};")
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    rows_count = 0
     try:
         mysql_cursor.execute("START TRANSACTION;")
 
@@ -83,14 +109,19 @@ def _insert_roles(mysql_connection, mysql_cursor):
                     "INSERT INTO Role (role_id, name) VALUES (%s, %s);",
                     (role['role_id'], role['name'])
                 )
+                rows_count += 1
         mysql_connection.commit()
     except mysql.connector.Error as error:
         print("Error inserting roles: ", error)
         mysql_connection.rollback()
+        if raise_errors:
+            raise
+        rows_count = 0
+    return rows_count
 
 def _extract_and_insert_workers(mysql_connection, mysql_cursor, movies_data_frame):
     # Define role_ids based on your database setup
-    role_ids = {'actor': 2, 'director': 1}
+    role_ids = ROLE_IDS
 
     # Initialize a set to keep track of unique names to avoid duplicates
     workers = set()
@@ -113,7 +144,7 @@ def _extract_and_insert_workers(mysql_connection, mysql_cursor, movies_data_fram
                 workers.add((star, role_ids['actor']))
 
     # Insert workers into the database
-    mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME};")
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
     try:
         mysql_cursor.execute("START TRANSACTION;")
         for worker, role_id in workers:
@@ -126,9 +157,11 @@ def _extract_and_insert_workers(mysql_connection, mysql_cursor, movies_data_fram
     except mysql.connector.Error as error:
         print("Error inserting workers: ", error)
         mysql_connection.rollback()
+        return 0
+    return len(workers)
 
 def _insert_movies_tables(mysql_connection, mysql_cursor, movies_data_frame):
-    mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME};")
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
     try:
         mysql_cursor.execute("START TRANSACTION;")
 
@@ -141,13 +174,7 @@ def _insert_movies_tables(mysql_connection, mysql_cursor, movies_data_frame):
             else:
                 certificate_id = None
 
-            if pd.notna(row["Description"]):
-                try:
-                    description = " ".join(ast.literal_eval(row["Description"]))
-                except Exception:
-                    description = None
-            else:
-                description = None
+            description = _parse_description(row["Description"])
             # Insert the movie data into the Movie table.
             mysql_cursor.execute(
                 "INSERT INTO Movie (movie_id, title, release_year, duration_minutes, description, certificate_id) VALUES (%s, %s, %s, %s, %s, %s)",
@@ -158,10 +185,12 @@ def _insert_movies_tables(mysql_connection, mysql_cursor, movies_data_frame):
     except mysql.connector.Error as mysql_connection_error:
         print("Error in statement: ", mysql_connection_error)
         mysql_connection.rollback()
+        return 0
+    return len(movies_data_frame)
 
 
 def _insert_movie_metrics(mysql_connection, mysql_cursor, movies_data_frame):
-    mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME};")
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
     try:
         mysql_cursor.execute("START TRANSACTION;")
 
@@ -169,29 +198,25 @@ def _insert_movie_metrics(mysql_connection, mysql_cursor, movies_data_frame):
             metascore = row["MetaScore"] if not pd.isnull(row["MetaScore"]) else None
             revenue = row["Gross"] if not pd.isnull(row["Gross"]) else None
 
-            # Insert into MovieMetrics table
+            # Insert into MovieMetrics table, keyed by its movie
             movie_id = index + 1
             mysql_cursor.execute(
                 "INSERT INTO MovieMetrics (rating, votes, metascore, revenue, movie_id) VALUES (%s, %s, %s, %s, %s);",
                 (row["Movie Rating"], row["Votes"], metascore, revenue, movie_id)
             )
 
-            # Update Movie Foriegn Key
-            metrics_id = mysql_cursor.lastrowid
-            mysql_cursor.execute(
-                "UPDATE Movie SET metrics_id = %s WHERE movie_id = %s;",
-                (metrics_id, movie_id)
-            )
-
         mysql_connection.commit()
         print("Movie metrics populated successfully.")
     except mysql.connector.Error as error:
         print("Error inserting movie metrics: ", error)
         mysql_connection.rollback()
+        return 0
+    return len(movies_data_frame)
 
 
 def _insert_movie_genre_associations(mysql_connection, mysql_cursor, movies_data_frame):
-    mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME};")
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    rows_count = 0
     try:
         mysql_cursor.execute("START TRANSACTION;")
 
@@ -208,17 +233,21 @@ def _insert_movie_genre_associations(mysql_connection, mysql_cursor, movies_data
                     "INSERT INTO MovieGenreAssociation (movie_id, genre_id) VALUES (%s, %s);",
                     (index + 1, genre_id)
                 )
+                rows_count += 1
 
         mysql_connection.commit()
         print("Movie-genre associations populated successfully.")
     except mysql.connector.Error as error:
         print("Error inserting movie-genre associations: ", error)
         mysql_connection.rollback()
+        return 0
+    return rows_count
 
 
 def _insert_movie_worker_associations(mysql_connection, movies_data_frame):
     mysql_cursor = mysql_connection.cursor()
-    mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME};")
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    rows_count = 0
     try:
         mysql_cursor.execute("START TRANSACTION;")
 
@@ -244,6 +273,7 @@ def _insert_movie_worker_associations(mysql_connection, movies_data_frame):
                             "INSERT INTO MovieWorkerAssociation (movie_id, worker_id) VALUES (%s, %s);",
                             (movie_id, director_id)
                         )
+                        rows_count += 1
 
             # Handle actors
             if 'Stars' in row and pd.notna(row['Stars']):
@@ -259,71 +289,365 @@ def _insert_movie_worker_associations(mysql_connection, movies_data_frame):
                             "INSERT INTO MovieWorkerAssociation (movie_id, worker_id) VALUES (%s, %s);",
                             (movie_id, actor_id[0])
                         )
+                        rows_count += 1
 
         mysql_connection.commit()
     except mysql.connector.Error as error:
         print("Error inserting movie-worker associations: ", error)
-        mysql_cursor.rollback()
+        mysql_connection.rollback()
+        rows_count = 0
     finally:
         mysql_cursor.close()
+    return rows_count
+
+
+def column_values(data_frame, column):
+    """
+    Returns a column as a list of native python values, with None in place of missing values
+    """
+    column_data = data_frame[column].astype(object)
+    return column_data.where(column_data.notna(), None).tolist()
+
 
+def fetch_id_map(mysql_cursor, query):
+    """
+    Builds a key -> id map from a query whose last column is the id.
+    Single key columns are mapped by value, composite keys by tuple.
+    """
+    mysql_cursor.execute(query)
+    id_map = {}
+    for row in mysql_cursor.fetchall():
+        key = row[0] if len(row) == 2 else tuple(row[:-1])
+        id_map[key] = row[-1]
+    return id_map
 
-def main():
+
+def executemany_in_batches(mysql_cursor, statement, rows, batch_size):
+    """
+    Sends the rows with multi-row executemany calls of at most batch_size rows.
+    Returns the number of rows sent.
     """
-    handles data insertion
+    rows_count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            mysql_cursor.executemany(statement, batch)
+            rows_count += len(batch)
+            batch = []
+    if batch:
+        mysql_cursor.executemany(statement, batch)
+        rows_count += len(batch)
+    return rows_count
+
+
+def map_ids(keys, id_map):
+    """
+    Maps every key to its id, with None for unknown keys
+    """
+    return [id_map.get(key) for key in keys]
+
+
+# The loaders print and roll back a failed stage and report 0 rows, with raise_errors=True they re-raise the error
+def bulk_insert_certificates(mysql_connection, mysql_cursor, certificates, batch_size, raise_errors=False):
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        existing_certificates = fetch_id_map(mysql_cursor, "SELECT certificate, certificate_id FROM Certificate;")
+        rows = [
+            (certificate, "Description placeholder")
+            for certificate in column_values(certificates, "certificate")
+            if certificate not in existing_certificates
+        ]
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            "INSERT INTO Certificate (certificate, description) VALUES (%s, %s);",
+            rows,
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error inserting certificates: ", error)
+        mysql_connection.rollback()
+        if raise_errors:
+            raise
+        return 0
+
+
+def bulk_insert_genres(mysql_connection, mysql_cursor, genres, batch_size, raise_errors=False):
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        existing_genres = fetch_id_map(mysql_cursor, "SELECT name, genre_id FROM Genre;")
+        rows = [(genre,) for genre in column_values(genres, "name") if genre not in existing_genres]
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            "INSERT INTO Genre (name) VALUES (%s);",
+            rows,
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error inserting genres: ", error)
+        mysql_connection.rollback()
+        if raise_errors:
+            raise
+        return 0
+
+
+def bulk_insert_workers(mysql_connection, mysql_cursor, workers, batch_size, raise_errors=False):
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        existing_workers = fetch_id_map(mysql_cursor, "SELECT full_name, role_id, worker_id FROM Worker;")
+        rows = [
+            worker
+            for worker in zip(column_values(workers, "full_name"), column_values(workers, "role_id"))
+            if worker not in existing_workers
+        ]
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            "INSERT INTO Worker (full_name, role_id) VALUES (%s, %s);",
+            rows,
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error inserting workers: ", error)
+        mysql_connection.rollback()
+        if raise_errors:
+            raise
+        return 0
+
+
+def bulk_insert_movies(mysql_connection, mysql_cursor, movies, batch_size, raise_errors=False):
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        certificate_ids = fetch_id_map(mysql_cursor, "SELECT certificate, certificate_id FROM Certificate;")
+        rows = zip(
+            column_values(movies, "movie_id"),
+            column_values(movies, "title"),
+            column_values(movies, "release_year"),
+            column_values(movies, "duration_minutes"),
+            column_values(movies, "description"),
+            map_ids(column_values(movies, "certificate"), certificate_ids)
+        )
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            "INSERT INTO Movie (movie_id, title, release_year, duration_minutes, description, certificate_id) VALUES (%s, %s, %s, %s, %s, %s);",
+            rows,
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error in statement: ", error)
+        mysql_connection.rollback()
+        if raise_errors:
+            raise
+        return 0
+
+
+def bulk_insert_movie_metrics(mysql_connection, mysql_cursor, movies, batch_size, raise_errors=False):
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        rows = zip(
+            column_values(movies, "rating"),
+            column_values(movies, "votes"),
+            column_values(movies, "metascore"),
+            column_values(movies, "revenue"),
+            column_values(movies, "movie_id")
+        )
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            "INSERT INTO MovieMetrics (rating, votes, metascore, revenue, movie_id) VALUES (%s, %s, %s, %s, %s);",
+            rows,
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error inserting movie metrics: ", error)
+        mysql_connection.rollback()
+        if raise_errors:
+            raise
+        return 0
+
+
+def bulk_insert_movie_genre_associations(mysql_connection, mysql_cursor, movie_genres, batch_size, raise_errors=False):
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        genre_ids = fetch_id_map(mysql_cursor, "SELECT name, genre_id FROM Genre;")
+        rows = [
+            row
+            for row in zip(column_values(movie_genres, "movie_id"), map_ids(column_values(movie_genres, "name"), genre_ids))
+            if row[1] is not None
+        ]
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            "INSERT INTO MovieGenreAssociation (movie_id, genre_id) VALUES (%s, %s);",
+            rows,
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error inserting movie-genre associations: ", error)
+        mysql_connection.rollback()
+        if raise_errors:
+            raise
+        return 0
+
+
+def bulk_insert_movie_worker_associations(mysql_connection, mysql_cursor, movie_workers, batch_size, raise_errors=False):
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        worker_ids = fetch_id_map(mysql_cursor, "SELECT full_name, role_id, worker_id FROM Worker;")
+        worker_keys = zip(column_values(movie_workers, "full_name"), column_values(movie_workers, "role_id"))
+        # A person credited both as director and actor of a movie is one association row
+        rows = {
+            row
+            for row in zip(column_values(movie_workers, "movie_id"), map_ids(worker_keys, worker_ids))
+            if row[1] is not None
+        }
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            "INSERT INTO MovieWorkerAssociation (movie_id, worker_id) VALUES (%s, %s);",
+            sorted(rows),
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error inserting movie-worker associations: ", error)
+        mysql_connection.rollback()
+        if raise_errors:
+            raise
+        return 0
+
+
+def bulk_insert_movie_fingerprints(mysql_connection, mysql_cursor, movies, batch_size, raise_errors=False):
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            "INSERT INTO MovieFingerprint (movie_id, source_key, row_hash) VALUES (%s, %s, %s);",
+            zip(
+                column_values(movies, "movie_id"),
+                column_values(movies, "source_key"),
+                column_values(movies, "row_hash")
+            ),
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error inserting movie fingerprints: ", error)
+        mysql_connection.rollback()
+        if raise_errors:
+            raise
+        return 0
+
+
+def run_stage(stage_name, stage_function, *args):
+    """
+    Runs a loader stage and reports its throughput in rows/sec
+    """
+    print(f"Populating {stage_name}.")
+    started_at = time.perf_counter()
+    # Every stage takes its connection first
+    with profile_span("stage", stage_name, args[0] if args else None) as record:
+        rows_count = stage_function(*args)
+        if record is not None:
+            record["rows"] = rows_count
+    elapsed = time.perf_counter() - started_at
+    rows_per_second = rows_count / elapsed if elapsed > 0 else 0.0
+    print(f"{stage_name} populated: {rows_count} rows in {elapsed:.2f}s ({rows_per_second:.0f} rows/sec).")
+    return rows_count
+
+
+def bulk_load_stages(mysql_connection, mysql_cursor, normalized_dataset, batch_size=BULK_BATCH_SIZE):
+    """
+    Returns the bulk load stages in load order, as (stage name, stage function, arguments)
+    """
+    stage_tables = [
+        ("Certificates", bulk_insert_certificates, "certificates"),
+        ("Genres", bulk_insert_genres, "genres"),
+        ("Movies", bulk_insert_movies, "movies"),
+        ("MovieMetrics", bulk_insert_movie_metrics, "movies"),
+        ("Workers", bulk_insert_workers, "workers"),
+        ("MovieGenresAssociations", bulk_insert_movie_genre_associations, "movie_genres"),
+        ("MovieWorkerAssociations", bulk_insert_movie_worker_associations, "movie_workers"),
+        ("MovieFingerprints", bulk_insert_movie_fingerprints, "movies"),
+    ]
+    stages = [
+        (stage_name, stage_function, (mysql_connection, mysql_cursor, normalized_dataset[table_name], batch_size))
+        for stage_name, stage_function, table_name in stage_tables
+    ]
+    stages.insert(1, ("Roles", insert_roles, (mysql_connection, mysql_cursor)))
+    stages.append(("Summary tables", refresh_summary_tables, (mysql_connection,)))
+    return stages
+
+
+def main(bulk_mode=False, batch_size=BULK_BATCH_SIZE, fast_load=False):
+    """
+    handles data insertion.
+    bulk_mode loads every table with batched multi-row inserts and in-memory id maps
+    instead of one INSERT and lookup per row.
+    fast_load creates the tables without secondary indexes and foreign keys, bulk loads
+    them with constraint checks off, then builds the indexes and verifies the constraints.
     """
     mysql_connection = None
     mysql_cursor = None
 
     try:
-        mysql_connection = connect_mysql_server()
+        mysql_connection = get_connection_pool().checkout()
         mysql_cursor = mysql_connection.cursor()
 
-        # Load the CSV
         script_directory = Path(__file__).resolve().parent
-        movies_data_frame = pd.read_csv(script_directory / MOVIES_DATASET_FILENAME)
 
-        # Populate certificates
+        if fast_load:
+            bulk_mode = True
+            create_pre_load_schema(mysql_cursor)
+            mysql_cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0;")
+
+        if bulk_mode:
+            print(f"Running bulk load with batch size {batch_size}.")
+            normalized_dataset = load_normalized_dataset(script_directory / MOVIES_DATASET_FILENAME)
+            for stage_name, stage_function, stage_arguments in bulk_load_stages(mysql_connection, mysql_cursor, normalized_dataset, batch_size):
+                run_stage(stage_name, stage_function, *stage_arguments)
+
+            if fast_load:
+                mysql_cursor.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1;")
+                started_at = time.perf_counter()
+                violations = create_post_load_schema(mysql_cursor)
+                print(f"Post-load phase done in {time.perf_counter() - started_at:.2f}s, {len(violations)} constraints violated.")
+            return
+
+        # Load the CSV
+        movies_data_frame = pd.read_csv(script_directory / MOVIES_DATASET_FILENAME)
         unique_certificates = movies_data_frame['Certification'].dropna().unique()
-        print("Populating Certificates.")
-        _insert_certificates(mysql_connection, mysql_cursor, unique_certificates)
-        print("Certificates populated successfully.")
-
-        # Populate Roles
-        print("Populating Roles.")
-        _insert_roles(mysql_connection, mysql_cursor)
-        print("Roles populated successfully.")
-
-        # Populate Genres
-        unique_genres = _extract_unique_genres(movies_data_frame)
-        print("Populating Genres.")
-        _insert_genres(mysql_connection, mysql_cursor, unique_genres)
-        print("Genres populated successfully.")
-
-        # Populate Movies
-        print("Populating Movies.")
-        _insert_movies_tables(mysql_connection, mysql_cursor, movies_data_frame)
-        print("Movies populated successfully.")
-
-        # Populate MovieMetrics
-        print("Populating MovieMetrics.")
-        _insert_movie_metrics(mysql_connection, mysql_cursor, movies_data_frame)
-        print("MovieMetrics populated successfully.")
-
-        # Populate Workers
-        print("Populating Workers.")
-        _extract_and_insert_workers(mysql_connection, mysql_cursor, movies_data_frame)
-        print("Workers populated successfully.")
-        
-        # Populate MovieGenresAssociations
-        print("Populating MovieGenresAssociations.")
-        _insert_movie_genre_associations(mysql_connection, mysql_cursor, movies_data_frame)
-        print("MovieGenresAssociations populated successfully.")
-
-        # Populate MovieWorkerAssociations
-        print("Populating MovieWorkerAssociations.")
-        _insert_movie_worker_associations(mysql_connection, movies_data_frame)
-        print("MovieWorkerAssociations populated successfully.")
+
+        run_stage("Certificates", _insert_certificates, mysql_connection, mysql_cursor, unique_certificates)
+        run_stage("Roles", insert_roles, mysql_connection, mysql_cursor)
+        run_stage("Genres", _insert_genres, mysql_connection, mysql_cursor, _extract_unique_genres(movies_data_frame))
+        run_stage("Movies", _insert_movies_tables, mysql_connection, mysql_cursor, movies_data_frame)
+        run_stage("MovieMetrics", _insert_movie_metrics, mysql_connection, mysql_cursor, movies_data_frame)
+        run_stage("Workers", _extract_and_insert_workers, mysql_connection, mysql_cursor, movies_data_frame)
+        run_stage("MovieGenresAssociations", _insert_movie_genre_associations, mysql_connection, mysql_cursor, movies_data_frame)
+        run_stage("MovieWorkerAssociations", _insert_movie_worker_associations, mysql_connection, movies_data_frame)
+        # Movie ids are the row index + 1 on both paths, the fingerprints make the database ready for delta runs
+        movies = load_normalized_dataset(script_directory / MOVIES_DATASET_FILENAME)["movies"]
+        run_stage("MovieFingerprints", bulk_insert_movie_fingerprints, mysql_connection, mysql_cursor, movies, batch_size)
+        run_stage("Summary tables", refresh_summary_tables, mysql_connection)
 
     except mysql.connector.Error as mysql_connection_error:
         print("MySQL data retrieve error: ", mysql_connection_error)
@@ -333,7 +657,25 @@ def main():
         if mysql_cursor:
             mysql_cursor.close() 
         if mysql_connection:
-            mysql_connection.close()
+            get_connection_pool().checkin(mysql_connection)
+        close_connection_pool()
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Populate the movies database from the IMDb dataset")
+    parser.add_argument("--bulk", action="store_true", help="use batched multi-row inserts")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="rows per batch in bulk mode")
+    parser.add_argument("--fast-load", action="store_true",
+                        help="bulk load into a pre-load schema, then build indexes and verify constraints")
+    parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="LOG",
+                        help="profile every stage, logging JSON records to LOG (stderr when omitted)")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    main()
+    arguments = _parse_arguments()
+    if arguments.profile:
+        configure_profiling(enabled=True, log_path=arguments.profile)
+    main(bulk_mode=arguments.bulk, batch_size=arguments.batch_size, fast_load=arguments.fast_load)
+    if arguments.profile:
+        print(profiling_summary().to_string(index=False))
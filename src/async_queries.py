@@ -0,0 +1,187 @@
+"""
+This file provides an asyncio facade over the queries in queries_db_script.
+
+Each query runs in a worker thread over its own pooled connection, so several
+queries can be awaited together and a mixed batch takes about as long as its
+slowest query. The results are the same DataFrames the synchronous functions return.
+
+Usage:
+    results = await gather_queries([
+        ("top_genres", "query_1", {"years": 10}),
+        ("drama_trend", "query_2", {"genre": "Drama", "years": 20}, 5.0),
+        ("space", "query_4", {"buzzwords": ["space"]}),
+    ])
+"""
+
+import asyncio
+import functools
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import queries_db_script
+from query_cache import configure_query_cache
+from utilities import MYSQL_POOL_SIZE, close_connection_pool, configure_connection_pool
+
+QUERY_FUNCTIONS = {
+    "query_1": queries_db_script.query_1,
+    "query_2": queries_db_script.query_2,
+    "query_2_trend": queries_db_script.query_2_trend,
+    "query_3": queries_db_script.query_3,
+    "director_actors": queries_db_script.director_actors,
+    "query_4": queries_db_script.query_4,
+    "query_5": queries_db_script.query_5,
+    "query_5_batch": queries_db_script.query_5_batch,
+    "fetch_genres": queries_db_script.fetch_genres,
+}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MYSQL_POOL_SIZE, thread_name_prefix="query")
+    return _executor
+
+
+def configure_async_queries(workers=MYSQL_POOL_SIZE):
+    """
+    Sizes the worker threads and the connection pool for `workers` concurrent queries
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+    configure_connection_pool(size=workers)
+
+
+async def run_query(query_name, timeout=None, **parameters):
+    """
+    Runs one query in a worker thread over a pooled connection.
+    Raises asyncio.TimeoutError after `timeout` seconds; the database keeps
+    running the abandoned statement until it completes.
+    """
+    query_function = functools.partial(QUERY_FUNCTIONS[query_name], **parameters)
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(_get_executor(), query_function), timeout)
+
+
+async def query_1(years=None, timeout=None):
+    return await run_query("query_1", timeout, years=years)
+
+
+async def fetch_genres(timeout=None):
+    return await run_query("fetch_genres", timeout)
+
+
+async def query_2(genre, years, timeout=None):
+    return await run_query("query_2", timeout, genre=genre, years=years)
+
+
+async def query_2_trend(genre, years, timeout=None):
+    return await run_query("query_2_trend", timeout, genre=genre, years=years)
+
+
+async def query_3(timeout=None):
+    return await run_query("query_3", timeout)
+
+
+async def director_actors(director_id, top_n=None, timeout=None):
+    return await run_query("director_actors", timeout, director_id=director_id, top_n=top_n)
+
+
+async def query_4(buzzwords, timeout=None, engine="mysql", mode="any"):
+    return await run_query("query_4", timeout, buzzwords=buzzwords, engine=engine, mode=mode)
+
+
+async def query_5(buzzword, timeout=None, engine="mysql"):
+    return await run_query("query_5", timeout, buzzword=buzzword, engine=engine)
+
+
+async def query_5_batch(buzzwords, timeout=None, engine="mysql"):
+    return await run_query("query_5_batch", timeout, buzzwords=buzzwords, engine=engine)
+
+
+async def gather_queries(calls):
+    """
+    Runs the calls concurrently. Every call is (result name, query name, parameters)
+    or (result name, query name, parameters, timeout in seconds).
+    Returns result name -> result, with the exception in place of the result of a failed or timed out call.
+    """
+    names = [call[0] for call in calls]
+    awaitables = [
+        run_query(call[1], call[3] if len(call) > 3 else None, **call[2])
+        for call in calls
+    ]
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    return dict(zip(names, results))
+
+
+DEMO_BATCH = [
+    ("top_genres", "query_1", {"years": 10}),
+    ("drama_trend", "query_2", {"genre": "Drama", "years": 20}),
+    ("directors", "query_3", {}),
+    ("space_war", "query_4", {"buzzwords": ["space", "war"]}),
+    ("love_revenue", "query_5", {"buzzword": "love"}),
+]
+
+# Timed runs of each mode, the medians are reported
+BENCHMARK_RUNS = 5
+
+
+async def _run_sequentially(calls):
+    """
+    Runs the calls one after the other, returns result name -> seconds
+    """
+    latencies = {}
+    for name, query_name, parameters, *_ in calls:
+        started_at = time.perf_counter()
+        await run_query(query_name, **parameters)
+        latencies[name] = time.perf_counter() - started_at
+    return latencies
+
+
+async def _benchmark(calls, runs=BENCHMARK_RUNS):
+    # Untimed warm-up: opening the pooled connections and the lazy imports would only slow down the first timed pass
+    await gather_queries(calls)
+
+    single_latencies = {call[0]: [] for call in calls}
+    sequential_timings = []
+    concurrent_timings = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        for name, latency in (await _run_sequentially(calls)).items():
+            single_latencies[name].append(latency)
+        sequential_timings.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        results = await gather_queries(calls)
+        concurrent_timings.append(time.perf_counter() - started_at)
+
+    print(f"Median of {runs} runs:")
+    for name, latencies in single_latencies.items():
+        status = "failed" if isinstance(results[name], Exception) else "ok"
+        print(f"  {name}: {statistics.median(latencies):.3f}s ({status})")
+    print(f"Sequential batch: {statistics.median(sequential_timings):.3f}s")
+    print(f"Concurrent batch: {statistics.median(concurrent_timings):.3f}s")
+    print(f"Slowest single query: {max(statistics.median(latencies) for latencies in single_latencies.values()):.3f}s")
+
+
+def main():
+    """
+    Benchmarks a mixed batch of queries run back-to-back against the same batch run concurrently,
+    after an untimed warm-up run, reporting the medians of BENCHMARK_RUNS runs
+    """
+    # Every run has to reach the database for the comparison to be meaningful
+    configure_query_cache(enabled=False)
+    configure_async_queries(len(DEMO_BATCH))
+    try:
+        asyncio.run(_benchmark(DEMO_BATCH))
+    finally:
+        _get_executor().shutdown(wait=True)
+        close_connection_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+This file benchmarks the ingest and the queries at configurable dataset sizes.
+
+For every size it builds a dataset of that many movies, provisions a fresh
+schema with create_db_script, fast loads it while timing every loader stage of
+api_data_retrieve, then times query_1..query_5 cold, warm in the database and
+warm in the query cache, and captures their EXPLAIN ANALYZE plans. The genre
+trend chart is timed rendered and served from the chart cache, and every query
+is timed and memory traced with the typed result materialization of
+result_frames and with fetchall() into pd.DataFrame(rows).
+With several storage backends the whole run is repeated on each of them. The
+benchmark never touches the application's data: on MySQL it provisions its own
+database (BENCHMARK_MYSQL_DATABASE), on SQLite a database file of
+BENCHMARK_DATA_DIRECTORY.
+The results are written as a sorted, indented JSON file to diff between runs.
+
+--startup instead times the import of the entry points in fresh interpreters
+against STARTUP_IMPORT_BUDGET, and fails when one is over budget or loads a
+module that should only load on first use.
+
+Usage:
+    python src/benchmark.py --sizes 10000 100000 1000000 --output benchmark_results.json
+    python src/benchmark.py --sizes 10000 100000 --backends mysql sqlite
+    python src/benchmark.py --startup
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+from api_data_retrieve import BULK_BATCH_SIZE, bulk_load_stages
+from create_db_script import create_post_load_schema, create_pre_load_schema
+from dataset_generator import DEFAULT_SEED, write_dataset
+from movies_dataset import MOVIES_DATASET_FILENAME, load_normalized_dataset
+from queries_db_script import fetch_genres, query_1, query_2, query_2_trend, query_3, query_4, query_5, query_5_batch
+from query_cache import configure_query_cache
+from result_frames import configure_materialization
+from trend_charts import configure_chart_cache, genre_trend_chart
+from utilities import (
+    MYSQL_DATABASE_NAME,
+    STORAGE_BACKENDS,
+    close_connection_pool,
+    configure_storage_backend,
+    connect_database,
+    get_connection_pool,
+    mysql_database_name,
+    storage_backend_name,
+)
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DEFAULT_REPEATS = 5
+BENCHMARK_DATA_DIRECTORY = Path(__file__).resolve().parent / ".benchmark_data"
+BENCHMARK_SQLITE_PATH = BENCHMARK_DATA_DIRECTORY / "benchmark.sqlite3"
+# MySQL database the benchmark drops and provisions at every size, next to the application's one
+BENCHMARK_MYSQL_DATABASE = f"{MYSQL_DATABASE_NAME}_benchmark"
+
+# Seconds importing an entry point may take, its prompt or server shows up right after
+STARTUP_IMPORT_BUDGET = 0.5
+STARTUP_MODULES = ["queries_execution", "query_service", "async_queries"]
+# Modules the entry points load on first use only
+STARTUP_DEFERRED_MODULES = ["matplotlib", "numpy", "pandas"]
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+started_at = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started_at
+print(json.dumps({{"seconds": seconds, "deferred_modules": [name for name in {deferred_modules!r} if name in sys.modules]}}))
+"""
+
+# Storage backend -> statement prefix returning the plan of a query, the plan text is the last column
+QUERY_PLAN_PREFIXES = {"mysql": "EXPLAIN ANALYZE ", "sqlite": "EXPLAIN QUERY PLAN "}
+
+# Benchmark name -> (query function, representative arguments)
+BENCHMARK_QUERIES = {
+    "query_1": (query_1, {"years": 10}),
+    "query_2": (query_2, {"genre": "Drama", "years": 20}),
+    "query_2_trend": (query_2_trend, {"genre": "Drama", "years": 20}),
+    "query_3": (query_3, {}),
+    "query_4": (query_4, {"buzzwords": ["space", "war"]}),
+    "query_5": (query_5, {"buzzword": "love"}),
+    "query_5_batch": (query_5_batch, {"buzzwords": ["love", "war", "space", "family", "murder", "friends", "life", "world", "young", "city"]}),
+    "fetch_genres": (fetch_genres, {}),
+}
+
+
+class _RecordingCursor:
+    """
+    Cursor proxy recording the statements it executes
+    """
+
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, statement, params=None):
+        self._statements.append((statement, params))
+        return self._cursor.execute(statement, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _RecordingConnection:
+    """
+    Connection proxy whose cursors record the statements they execute
+    """
+
+    def __init__(self, mysql_connection):
+        self._connection = mysql_connection
+        self.statements = []
+
+    def cursor(self, *args, **kwargs):
+        return _RecordingCursor(self._connection.cursor(*args, **kwargs), self.statements)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def scaled_dataset_path(size, base_csv_path=None, synthetic=False):
+    """
+    Writes (once) a dataset of `size` movies, generated by dataset_generator when synthetic,
+    otherwise by repeating the base dataset and renaming every repeated movie
+    """
+    if synthetic:
+        dataset_path = BENCHMARK_DATA_DIRECTORY / f"synthetic_{size}_{DEFAULT_SEED}.csv"
+        if not dataset_path.exists():
+            write_dataset(dataset_path, size, DEFAULT_SEED)
+        return dataset_path
+
+    if base_csv_path is None:
+        base_csv_path = Path(__file__).resolve().parent / MOVIES_DATASET_FILENAME
+    base_data_frame = pd.read_csv(base_csv_path)
+    if size == len(base_data_frame):
+        return Path(base_csv_path)
+
+    dataset_path = BENCHMARK_DATA_DIRECTORY / f"movies_{size}.csv"
+    if not dataset_path.exists():
+        positions = np.arange(size)
+        scaled_data_frame = base_data_frame.iloc[positions % len(base_data_frame)].reset_index(drop=True)
+        copy_numbers = positions // len(base_data_frame)
+        repeated = copy_numbers > 0
+        scaled_data_frame.loc[repeated, "Movie Name"] = (
+            scaled_data_frame.loc[repeated, "Movie Name"] + " #" + pd.Series(copy_numbers[repeated], index=np.flatnonzero(repeated)).astype(str)
+        )
+        BENCHMARK_DATA_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        scaled_data_frame.to_csv(dataset_path, index=False)
+    return dataset_path
+
+
+def _timed(function, *args, **kwargs):
+    started_at = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started_at
+
+
+def provision_and_load(mysql_connection, csv_path, batch_size):
+    """
+    Drops and recreates the benchmark database, fast loads the dataset and returns stage name -> {rows, seconds}
+    """
+    if mysql_database_name() == MYSQL_DATABASE_NAME:
+        raise RuntimeError(f"Refusing to drop the application database {MYSQL_DATABASE_NAME}")
+    stage_results = {}
+    mysql_cursor = mysql_connection.cursor()
+    try:
+        mysql_cursor.execute(f"DROP DATABASE IF EXISTS {mysql_database_name()}")
+        _, elapsed = _timed(create_pre_load_schema, mysql_cursor)
+        stage_results["Pre-load schema"] = {"rows": 0, "seconds": elapsed}
+
+        normalized_dataset, elapsed = _timed(load_normalized_dataset, csv_path, False)
+        stage_results["Parse"] = {"rows": len(normalized_dataset["movies"]), "seconds": elapsed}
+
+        mysql_cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0;")
+        for stage_name, stage_function, stage_arguments in bulk_load_stages(mysql_connection, mysql_cursor, normalized_dataset, batch_size):
+            rows_count, elapsed = _timed(stage_function, *stage_arguments)
+            stage_results[stage_name] = {"rows": rows_count, "seconds": elapsed}
+            print(f"  {stage_name}: {rows_count} rows in {elapsed:.2f}s")
+        mysql_cursor.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1;")
+
+        violations, elapsed = _timed(create_post_load_schema, mysql_cursor)
+        stage_results["Post-load schema"] = {"rows": len(violations), "seconds": elapsed}
+    finally:
+        mysql_cursor.close()
+    return stage_results
+
+
+def _explain_analyze(mysql_connection, statements):
+    """
+    Returns the EXPLAIN ANALYZE plan (EXPLAIN QUERY PLAN on SQLite) of every query among the statements
+    """
+    plan_prefix = QUERY_PLAN_PREFIXES[storage_backend_name()]
+    plans = []
+    cursor = mysql_connection.cursor()
+    try:
+        for statement, params in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            try:
+                cursor.execute(plan_prefix + statement, params)
+                plans.append("\n".join(str(row[-1]) for row in cursor.fetchall()))
+            except mysql.connector.Error as error:
+                plans.append(f"{plan_prefix.strip()} failed: {error}")
+    finally:
+        cursor.close()
+    return plans
+
+
+def _flush_tables(mysql_connection):
+    # Best effort, FLUSH TABLES needs the RELOAD privilege
+    cursor = mysql_connection.cursor()
+    try:
+        cursor.execute("FLUSH TABLES;")
+    except mysql.connector.Error:
+        pass
+    finally:
+        cursor.close()
+
+
+def benchmark_queries(mysql_connection, repeats=DEFAULT_REPEATS):
+    """
+    Times every benchmark query cold, warm in the database and warm in the query cache.
+    Returns (query name -> timings, query name -> plans).
+    """
+    query_results = {}
+    query_plans = {}
+    for query_name, (query_function, arguments) in BENCHMARK_QUERIES.items():
+        uncached_function = query_function.uncached
+
+        _flush_tables(mysql_connection)
+        recording_connection = _RecordingConnection(mysql_connection)
+        result, cold_elapsed = _timed(uncached_function, mysql_connection=recording_connection, **arguments)
+
+        database_timings = [_timed(uncached_function, mysql_connection=mysql_connection, **arguments)[1] for _ in range(repeats)]
+
+        configure_query_cache()
+        query_function(mysql_connection=mysql_connection, **arguments)
+        cache_timings = [_timed(query_function, mysql_connection=mysql_connection, **arguments)[1] for _ in range(repeats)]
+
+        query_results[query_name] = {
+            "arguments": arguments,
+            "rows": None if result is None else len(result),
+            "cold_seconds": cold_elapsed,
+            "warm_database_seconds": statistics.median(database_timings),
+            "warm_cache_seconds": statistics.median(cache_timings),
+        }
+        query_plans[query_name] = _explain_analyze(mysql_connection, recording_connection.statements)
+        print(f"  {query_name}: cold {cold_elapsed:.4f}s, warm {query_results[query_name]['warm_database_seconds']:.4f}s, "
+              f"cached {query_results[query_name]['warm_cache_seconds']:.6f}s")
+    return query_results, query_plans
+
+
+def benchmark_genre_trend_chart(mysql_connection, repeats=DEFAULT_REPEATS, genre="Drama", years=20):
+    """
+    Times rendering the genre trend chart with an empty chart cache and serving it from the chart cache
+    """
+    configure_query_cache(enabled=False)
+    configure_chart_cache()
+    chart, rendered_elapsed = _timed(genre_trend_chart, genre, years, mysql_connection=mysql_connection)
+    cache_timings = [_timed(genre_trend_chart, genre, years)[1] for _ in range(repeats)]
+    configure_query_cache()
+    configure_chart_cache()
+    print(f"  genre_trend_chart: rendered {rendered_elapsed:.4f}s, cached {statistics.median(cache_timings):.6f}s")
+    return {
+        "arguments": {"genre": genre, "years": years},
+        "chart_bytes": None if chart is None else len(chart),
+        "rendered_seconds": rendered_elapsed,
+        "cached_seconds": statistics.median(cache_timings),
+    }
+
+
+def _measure_materialization(query_function, mysql_connection, arguments, repeats):
+    tracemalloc.start()
+    result = query_function(mysql_connection=mysql_connection, **arguments)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings = [_timed(query_function, mysql_connection=mysql_connection, **arguments)[1] for _ in range(repeats)]
+    return {
+        "seconds": statistics.median(timings),
+        "peak_kib": peak_bytes / 1024,
+        "result_kib": 0.0 if result is None else float(result.memory_usage(deep=True).sum()) / 1024,
+    }
+
+
+def benchmark_materialization(mysql_connection, repeats=DEFAULT_REPEATS):
+    """
+    Times and traces the peak memory of every benchmark query materialized into typed columns and into pd.DataFrame(rows).
+    Returns query name -> {typed, rows, seconds_saved, peak_kib_saved, result_kib_saved}.
+    """
+    materialization_results = {}
+    for query_name, (query_function, arguments) in BENCHMARK_QUERIES.items():
+        # fetch_genres returns a list of names
+        if query_name == "fetch_genres":
+            continue
+        measurements = {}
+        for path, typed in (("rows", False), ("typed", True)):
+            configure_materialization(typed=typed)
+            measurements[path] = _measure_materialization(query_function.uncached, mysql_connection, arguments, repeats)
+        rows, typed = measurements["rows"], measurements["typed"]
+        materialization_results[query_name] = dict(
+            measurements,
+            **{f"{measure}_saved": rows[measure] - typed[measure] for measure in ("seconds", "peak_kib", "result_kib")},
+        )
+        print(f"  {query_name} materialization: {rows['seconds']:.4f}s -> {typed['seconds']:.4f}s, "
+              f"peak {rows['peak_kib']:.0f} -> {typed['peak_kib']:.0f} KiB, result {rows['result_kib']:.0f} -> {typed['result_kib']:.0f} KiB")
+    configure_materialization()
+    return materialization_results
+
+
+def benchmark_backend(sizes, repeats, batch_size, base_csv_path, synthetic):
+    """
+    Runs the benchmark at every size on the configured storage backend
+    """
+    backend_results = {"sizes": {}}
+    mysql_connection = None
+    try:
+        mysql_connection, backend_results["connect_seconds"] = _timed(get_connection_pool().checkout)
+        mysql_cursor = mysql_connection.cursor()
+        mysql_cursor.execute("SELECT VERSION();")
+        backend_results["version"] = mysql_cursor.fetchone()[0]
+        mysql_cursor.close()
+
+        for size in sizes:
+            print(f"Benchmarking {size} movies on {storage_backend_name()}.")
+            csv_path = scaled_dataset_path(size, base_csv_path, synthetic)
+            load_results = provision_and_load(mysql_connection, csv_path, batch_size)
+            query_results, query_plans = benchmark_queries(mysql_connection, repeats)
+            chart_results = benchmark_genre_trend_chart(mysql_connection, repeats)
+            materialization_results = benchmark_materialization(mysql_connection, repeats)
+            backend_results["sizes"][str(size)] = {
+                "load": load_results,
+                "queries": query_results,
+                "plans": query_plans,
+                "genre_trend_chart": chart_results,
+                "materialization": materialization_results,
+            }
+    except mysql.connector.Error as mysql_connection_error:
+        print(f"{storage_backend_name()} benchmark error: ", mysql_connection_error)
+    finally:
+        if mysql_connection:
+            get_connection_pool().checkin(mysql_connection)
+        close_connection_pool()
+    return backend_results
+
+
+def benchmark_startup(modules=STARTUP_MODULES, repeats=DEFAULT_REPEATS):
+    """
+    Times `import module` in fresh interpreters, returns module -> {seconds (median), deferred modules loaded, within budget}
+    """
+    startup_results = {}
+    for module in modules:
+        script = _STARTUP_SCRIPT.format(module=module, deferred_modules=STARTUP_DEFERRED_MODULES)
+        runs = [
+            json.loads(subprocess.run(
+                [sys.executable, "-c", script], cwd=Path(__file__).resolve().parent, capture_output=True, text=True, check=True
+            ).stdout.splitlines()[-1])
+            for _ in range(repeats)
+        ]
+        seconds = statistics.median(run["seconds"] for run in runs)
+        deferred_modules = sorted({name for run in runs for name in run["deferred_modules"]})
+        startup_results[module] = {
+            "seconds": seconds,
+            "deferred_modules_loaded": deferred_modules,
+            "within_budget": seconds <= STARTUP_IMPORT_BUDGET and not deferred_modules,
+        }
+        print(f"  import {module}: {seconds:.3f}s (budget {STARTUP_IMPORT_BUDGET}s)"
+              + (f", loaded {', '.join(deferred_modules)}" if deferred_modules else ""))
+    return startup_results
+
+
+def _print_backend_comparison(backend_results):
+    """
+    Prints the warm database time of every query on every backend, side by side
+    """
+    backends = list(backend_results)
+    sizes = dict.fromkeys(size for results in backend_results.values() for size in results["sizes"])
+    for size in sizes:
+        print(f"Warm database seconds at {size} movies ({', '.join(backends)}):")
+        for query_name in BENCHMARK_QUERIES:
+            timings = [
+                backend_results[backend]["sizes"].get(size, {}).get("queries", {}).get(query_name, {}).get("warm_database_seconds")
+                for backend in backends
+            ]
+            print(f"  {query_name}: " + ", ".join("-" if timing is None else f"{timing:.4f}" for timing in timings))
+
+
+def _create_benchmark_database():
+    """
+    Creates BENCHMARK_MYSQL_DATABASE over a connection to the application database, the pool connects to it afterwards
+    """
+    mysql_connection = connect_database()
+    try:
+        mysql_cursor = mysql_connection.cursor()
+        mysql_cursor.execute(f"CREATE DATABASE IF NOT EXISTS {BENCHMARK_MYSQL_DATABASE}")
+        mysql_cursor.close()
+    finally:
+        mysql_connection.close()
+
+
+def main(sizes=DEFAULT_SIZES, output_path="benchmark_results.json", repeats=DEFAULT_REPEATS, batch_size=BULK_BATCH_SIZE, base_csv_path=None,
+         synthetic=False, backends=None):
+    """
+    Runs the benchmark at every size on every storage backend and writes the results file
+    """
+    configured_backend = storage_backend_name()
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "settings": {"repeats": repeats, "batch_size": batch_size, "synthetic": synthetic},
+        "backends": {},
+    }
+    try:
+        for backend in backends or [configured_backend]:
+            if backend == "sqlite":
+                BENCHMARK_DATA_DIRECTORY.mkdir(parents=True, exist_ok=True)
+            else:
+                configure_storage_backend(backend)
+                _create_benchmark_database()
+            configure_storage_backend(backend, BENCHMARK_SQLITE_PATH, BENCHMARK_MYSQL_DATABASE)
+            results["backends"][backend] = benchmark_backend(sizes, repeats, batch_size, base_csv_path, synthetic)
+    finally:
+        configure_storage_backend(configured_backend)
+
+    if len(results["backends"]) > 1:
+        _print_backend_comparison(results["backends"])
+    with open(output_path, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True, default=str)
+    print(f"Benchmark results written to {output_path}")
+
+
+def main_startup(output_path="benchmark_results.json", repeats=DEFAULT_REPEATS):
+    """
+    Runs the startup benchmark and writes the results file, returns whether every entry point is within budget
+    """
+    print("Benchmarking startup.")
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "settings": {"repeats": repeats, "budget_seconds": STARTUP_IMPORT_BUDGET},
+        "startup": benchmark_startup(repeats=repeats),
+    }
+    with open(output_path, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True, default=str)
+    print(f"Benchmark results written to {output_path}")
+    return all(module_results["within_budget"] for module_results in results["startup"].values())
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest and the queries at several dataset sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of movies to benchmark")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"), help="results file")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="runs per warm measurement")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="rows per executemany batch")
+    parser.add_argument("--csv", type=Path, default=None, help="base dataset the sized datasets are built from")
+    parser.add_argument("--synthetic", action="store_true", help="benchmark synthetic datasets from dataset_generator")
+    parser.add_argument("--backends", nargs="+", choices=sorted(STORAGE_BACKENDS), default=None,
+                        help="storage backends to benchmark (the configured one by default)")
+    parser.add_argument("--startup", action="store_true", help="only benchmark the import time of the entry points")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = _parse_arguments()
+    if arguments.startup:
+        sys.exit(0 if main_startup(arguments.output, arguments.repeats) else 1)
+    main(arguments.sizes, arguments.output, arguments.repeats, arguments.batch_size, arguments.csv, arguments.synthetic, arguments.backends)
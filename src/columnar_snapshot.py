@@ -0,0 +1,366 @@
+"""
+This file exports the normalized tables to a columnar snapshot and answers query_1, query_2 and query_3 from it.
+
+The snapshot is a directory of memory-mapped NumPy arrays:
+    movies       movie_id, release_year, has_metrics, revenue (+ revenue_valid), rating, metascore (+ metascore_valid)
+    genres       genre names, and the movie -> genre edges as CSR arrays (movie_genre_offsets, movie_genre_ids)
+    workers      worker_id, role, full names (UTF-8 blob), and the movie -> worker edges as CSR arrays
+Edge targets and CSR rows are positions in the genre, worker and movie arrays.
+ColumnarSnapshot answers the three analyses with vectorized group-bys over
+those arrays, without a database. Running this file exports the snapshot of the
+current database, checks that every snapshot result equals the SQL result and
+reports the latency and memory of both.
+
+Usage:
+    python src/columnar_snapshot.py --repeats 5
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from queries_db_script import QUERY_2_CURRENT_YEAR, query_1, query_2, query_3
+from query_cache import fetch_ingest_generation
+from search_index import read_text_column, read_texts, write_text_column
+from utilities import close_connection_pool, mysql_database_name, pooled_connection
+
+COLUMNAR_SNAPSHOT_DIRECTORY = Path(__file__).resolve().parent / ".columnar_snapshot"
+COLUMNAR_SNAPSHOT_VERSION = 1
+
+_MOVIES_QUERY = """
+    SELECT M.movie_id, M.release_year, MM.movie_id IS NOT NULL, MM.revenue, MM.rating, MM.metascore
+    FROM Movie M
+    LEFT JOIN MovieMetrics MM ON M.movie_id = MM.movie_id
+    ORDER BY M.movie_id;
+"""
+
+# Decimal places of DirectorMetascore.avg_metascore
+_AVERAGE_PLACES = 4
+
+# Representative arguments of the verification and latency report
+VERIFIED_QUERIES = {
+    "query_1": {"years": 10},
+    "query_1_all_years": {"years": None},
+    "query_2": {"genre": "Drama", "years": 20},
+    "query_3": {},
+}
+
+
+def _fetch_all(cursor, query):
+    cursor.execute(query)
+    return cursor.fetchall()
+
+
+def _csr_edges(row_positions, target_positions, rows_count):
+    """
+    Sorts (row, target) edges by row and returns the CSR (offsets, targets) arrays
+    """
+    order = np.lexsort((target_positions, row_positions))
+    offsets = np.zeros(rows_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_positions, minlength=rows_count), out=offsets[1:])
+    return offsets, target_positions[order].astype(np.int32)
+
+
+def export_snapshot(mysql_connection, directory):
+    """
+    Writes the snapshot of the database contents into directory, returns its metadata
+    """
+    directory = Path(directory)
+    staging_path = directory.with_name(directory.name + ".staging")
+    shutil.rmtree(staging_path, ignore_errors=True)
+    staging_path.mkdir(parents=True)
+
+    cursor = mysql_connection.cursor()
+    try:
+        cursor.execute(f"USE {mysql_database_name()};")
+        movies = pd.DataFrame(
+            _fetch_all(cursor, _MOVIES_QUERY),
+            columns=["movie_id", "release_year", "has_metrics", "revenue", "rating", "metascore"],
+        )
+        genres = _fetch_all(cursor, "SELECT genre_id, name FROM Genre ORDER BY genre_id;")
+        workers = _fetch_all(cursor, "SELECT W.worker_id, W.full_name, R.name FROM Worker W JOIN Role R ON W.role_id = R.role_id ORDER BY W.worker_id;")
+        movie_genres = np.array(_fetch_all(cursor, "SELECT movie_id, genre_id FROM MovieGenreAssociation;"), dtype=np.int64).reshape(-1, 2)
+        movie_workers = np.array(_fetch_all(cursor, "SELECT movie_id, worker_id FROM MovieWorkerAssociation;"), dtype=np.int64).reshape(-1, 2)
+    finally:
+        cursor.close()
+
+    movie_ids = movies["movie_id"].to_numpy(dtype=np.int64)
+    revenues = pd.to_numeric(movies["revenue"])
+    metascores = pd.to_numeric(movies["metascore"])
+    np.save(staging_path / "movie_id.npy", movie_ids.astype(np.int32))
+    np.save(staging_path / "release_year.npy", movies["release_year"].to_numpy(dtype=np.int16))
+    np.save(staging_path / "has_metrics.npy", movies["has_metrics"].to_numpy(dtype=bool))
+    np.save(staging_path / "revenue.npy", revenues.fillna(0).to_numpy().astype(np.int64))
+    np.save(staging_path / "revenue_valid.npy", revenues.notna().to_numpy())
+    np.save(staging_path / "rating.npy", pd.to_numeric(movies["rating"]).to_numpy(dtype=np.float64))
+    np.save(staging_path / "metascore.npy", metascores.fillna(0).to_numpy().astype(np.int16))
+    np.save(staging_path / "metascore_valid.npy", metascores.notna().to_numpy())
+
+    genre_ids = np.array([genre_id for genre_id, _ in genres], dtype=np.int64)
+    offsets, targets = _csr_edges(
+        np.searchsorted(movie_ids, movie_genres[:, 0]), np.searchsorted(genre_ids, movie_genres[:, 1]), len(movie_ids)
+    )
+    np.save(staging_path / "movie_genre_offsets.npy", offsets)
+    np.save(staging_path / "movie_genre_ids.npy", targets)
+
+    worker_ids = np.array([worker_id for worker_id, _, _ in workers], dtype=np.int64)
+    role_names = sorted({role_name for _, _, role_name in workers})
+    np.save(staging_path / "worker_id.npy", worker_ids.astype(np.int32))
+    np.save(staging_path / "worker_role.npy", np.array([role_names.index(role_name) for _, _, role_name in workers], dtype=np.int8))
+    write_text_column(staging_path, "worker_name", [full_name for _, full_name, _ in workers])
+    offsets, targets = _csr_edges(
+        np.searchsorted(movie_ids, movie_workers[:, 0]), np.searchsorted(worker_ids, movie_workers[:, 1]), len(movie_ids)
+    )
+    np.save(staging_path / "movie_worker_offsets.npy", offsets)
+    np.save(staging_path / "movie_worker_ids.npy", targets)
+
+    meta = {
+        "version": COLUMNAR_SNAPSHOT_VERSION, "generation": fetch_ingest_generation(mysql_connection),
+        "movies": len(movie_ids), "genres": [name for _, name in genres], "roles": role_names, "workers": len(worker_ids),
+        "movie_genres": len(movie_genres), "movie_workers": len(movie_workers),
+    }
+    with open(staging_path / "meta.json", "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    staging_path.rename(directory)
+    return meta
+
+
+def _scaled_half_up_averages(sums, counts):
+    # AVG of an integer column is an exact DECIMAL rounded half up, like DirectorMetascore.avg_metascore
+    scale = 10 ** _AVERAGE_PLACES
+    return (2 * sums * scale + counts) // (2 * counts)
+
+
+class ColumnarSnapshot:
+    """
+    Read-only view of a snapshot directory, arrays are mapped on first use
+    """
+
+    def __init__(self, directory=COLUMNAR_SNAPSHOT_DIRECTORY):
+        self.directory = Path(directory)
+        with open(self.directory / "meta.json", encoding="utf-8") as meta_file:
+            self.meta = json.load(meta_file)
+
+    def __getattr__(self, name):
+        # Every array of the snapshot is an attribute: snapshot.release_year, snapshot.movie_genre_offsets, ...
+        array_path = self.__dict__["directory"] / f"{name}.npy"
+        if not array_path.exists():
+            raise AttributeError(name)
+        array = np.load(array_path, mmap_mode="r")
+        setattr(self, name, array)
+        return array
+
+    @cached_property
+    def _worker_names(self):
+        return read_text_column(self.directory, "worker_name")
+
+    def worker_names(self, workers):
+        return read_texts(self._worker_names, workers)
+
+    def size_bytes(self):
+        return sum(path.stat().st_size for path in self.directory.iterdir())
+
+    @staticmethod
+    def _edge_rows(offsets):
+        # The CSR row of every edge
+        return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+    def query_1(self, years=None, last_year=2022):
+        """
+        Top genre(s) by max revenue of every year, like queries_db_script.query_1
+        """
+        start_year = 0 if years is None else last_year - int(years) + 1
+        movies = self._edge_rows(self.movie_genre_offsets)
+        genres = np.asarray(self.movie_genre_ids)
+        release_years = self.release_year[movies]
+        selected = (
+            self.has_metrics[movies] & self.revenue_valid[movies] & (release_years >= start_year) & (release_years <= last_year)
+        )
+        movies, genres, release_years = movies[selected], genres[selected], release_years[selected]
+        revenues = self.revenue[movies]
+
+        distinct_years, year_indexes = np.unique(release_years, return_inverse=True)
+        year_max_revenues = np.full(len(distinct_years), -1, dtype=np.int64)
+        np.maximum.at(year_max_revenues, year_indexes, revenues)
+        # A genre tops its year when one of its movies has the year's max revenue
+        top = revenues == year_max_revenues[year_indexes]
+        genres_count = len(self.meta["genres"])
+        top_pairs = np.unique(year_indexes[top].astype(np.int64) * genres_count + genres[top])
+        top_year_indexes, top_genres = np.divmod(top_pairs, genres_count)
+
+        result = pd.DataFrame({
+            "Year": distinct_years[top_year_indexes].astype(np.int64),
+            "Top Genre": [self.meta["genres"][genre] for genre in top_genres],
+            "Max Revenue": year_max_revenues[top_year_indexes],
+        })
+        return result.sort_values(["Year", "Top Genre"], ascending=[False, True], ignore_index=True)
+
+    def query_2(self, genre, years):
+        """
+        Year, revenue and rating of the movies of the genre in the last `years` years, like queries_db_script.query_2
+        """
+        start_year = QUERY_2_CURRENT_YEAR - int(years)
+        # Genre names compare case-insensitively, like the database collation
+        genre_positions = [position for position, name in enumerate(self.meta["genres"]) if name.casefold() == genre.casefold()]
+        movies = self._edge_rows(self.movie_genre_offsets)[np.isin(self.movie_genre_ids, genre_positions)]
+        movies = movies[self.has_metrics[movies] & (self.release_year[movies] >= start_year)]
+        movies = movies[np.argsort(self.release_year[movies], kind="stable")]
+        if not len(movies):
+            print(f"No data found for the specified genre in the last {years} years.")
+            return None
+
+        revenue_valid = self.revenue_valid[movies]
+        revenues = self.revenue[movies]
+        return pd.DataFrame({
+            "Year": self.release_year[movies].astype(np.int64),
+            "Revenue": revenues if revenue_valid.all() else np.where(revenue_valid, revenues, np.nan),
+            "Rating": self.rating[movies],
+        })
+
+    def query_3(self):
+        """
+        Every director by the average metascore of their movies, like queries_db_script.query_3
+        """
+        director_role = self.meta["roles"].index("director")
+        movies = self._edge_rows(self.movie_worker_offsets)
+        workers = np.asarray(self.movie_worker_ids)
+        selected = (self.worker_role[workers] == director_role) & self.has_metrics[movies]
+        movies, workers = movies[selected], workers[selected]
+
+        rated = self.metascore_valid[movies]
+        directors, director_indexes = np.unique(workers, return_inverse=True)
+        rated_counts = np.bincount(director_indexes[rated], minlength=len(directors))
+        metascore_sums = np.bincount(director_indexes[rated], weights=self.metascore[movies[rated]], minlength=len(directors))
+        metascore_sums = metascore_sums.astype(np.int64)
+
+        has_average = rated_counts > 0
+        scaled_averages = np.full(len(directors), -1, dtype=np.int64)
+        scaled_averages[has_average] = _scaled_half_up_averages(metascore_sums[has_average], rated_counts[has_average])
+        averages = np.full(len(directors), None, dtype=object)
+        averages[has_average] = [Decimal(int(value)).scaleb(-_AVERAGE_PLACES) for value in scaled_averages[has_average]]
+        # Highest average first, directors without any metascore last
+        order = np.lexsort((self.worker_id[directors], -scaled_averages))
+        directors = directors[order]
+        return pd.DataFrame({
+            "Director": self.worker_names(directors),
+            "Average Metascore": averages[order],
+            "Director Id": self.worker_id[directors].astype(np.int64),
+        })
+
+
+def _comparable(result, sort_columns, ascending):
+    # Row order among equal sort keys is unspecified in SQL
+    result = result.copy()
+    for column in result.columns:
+        if result[column].dtype == object and result[column].map(lambda value: isinstance(value, Decimal)).any():
+            result[column] = result[column].map(lambda value: None if value is None else float(value)).astype(float)
+    return result.sort_values(sort_columns, ascending=ascending, na_position="last", ignore_index=True)
+
+
+_SORT_KEYS = {
+    "query_1": (["Year", "Top Genre"], [False, True]),
+    "query_2": (["Year", "Revenue", "Rating"], [True, True, True]),
+    "query_3": (["Average Metascore", "Director Id"], [False, True]),
+}
+
+
+def results_equal(query_name, sql_result, snapshot_result):
+    """
+    True when both results hold the same rows, whatever the order of the rows SQL doesn't order
+    """
+    if sql_result is None or snapshot_result is None:
+        return sql_result is None and snapshot_result is None
+    sort_columns, ascending = _SORT_KEYS[query_name.split("_all_")[0]]
+    try:
+        pd.testing.assert_frame_equal(
+            _comparable(sql_result, sort_columns, ascending), _comparable(snapshot_result, sort_columns, ascending), check_dtype=False,
+        )
+    except AssertionError:
+        return False
+    return True
+
+
+def _measure(function, arguments, repeats):
+    """
+    Returns (result, median seconds, peak traced bytes of one call)
+    """
+    tracemalloc.start()
+    result = function(**arguments)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        function(**arguments)
+        timings.append(time.perf_counter() - started_at)
+    return result, statistics.median(timings), peak_bytes
+
+
+def compare_engines(mysql_connection, snapshot, repeats=5):
+    """
+    Runs every verified query on MySQL and on the snapshot, returns one report row per query
+    """
+    sql_functions = {"query_1": query_1.uncached, "query_2": query_2.uncached, "query_3": query_3.uncached}
+    report = []
+    for query_name, arguments in VERIFIED_QUERIES.items():
+        base_name = query_name.split("_all_")[0]
+        sql_result, sql_seconds, sql_peak = _measure(
+            lambda **kwargs: sql_functions[base_name](mysql_connection=mysql_connection, **kwargs), arguments, repeats
+        )
+        snapshot_result, snapshot_seconds, snapshot_peak = _measure(getattr(snapshot, base_name), arguments, repeats)
+        report.append({
+            "query": query_name,
+            "rows": None if sql_result is None else len(sql_result),
+            "equal": results_equal(query_name, sql_result, snapshot_result),
+            "sql_seconds": sql_seconds,
+            "snapshot_seconds": snapshot_seconds,
+            "speedup": sql_seconds / snapshot_seconds if snapshot_seconds else None,
+            "sql_peak_kib": sql_peak / 1024,
+            "snapshot_peak_kib": snapshot_peak / 1024,
+        })
+    return pd.DataFrame(report)
+
+
+def main(directory=COLUMNAR_SNAPSHOT_DIRECTORY, repeats=5, verify=True):
+    """
+    Exports the snapshot of the database, then verifies it against the SQL queries and reports both engines
+    """
+    try:
+        with pooled_connection() as mysql_connection:
+            started_at = time.perf_counter()
+            meta = export_snapshot(mysql_connection, directory)
+            snapshot = ColumnarSnapshot(directory)
+            print(f"Exported {meta['movies']} movies, {meta['movie_genres']} genre and {meta['movie_workers']} worker edges "
+                  f"({snapshot.size_bytes() / 2 ** 20:.1f} MiB) in {time.perf_counter() - started_at:.2f}s to {directory}")
+            if verify:
+                report = compare_engines(mysql_connection, snapshot, repeats)
+                print(report.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+                if not report["equal"].all():
+                    print("Snapshot results differ from the SQL results for:", ", ".join(report.loc[~report["equal"], "query"]))
+    finally:
+        close_connection_pool()
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Export the columnar snapshot and compare its engine to the SQL queries")
+    parser.add_argument("--output", type=Path, default=COLUMNAR_SNAPSHOT_DIRECTORY, help="snapshot directory")
+    parser.add_argument("--repeats", type=int, default=5, help="runs per latency measurement")
+    parser.add_argument("--skip-verify", action="store_true", help="only export the snapshot")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = _parse_arguments()
+    main(arguments.output, arguments.repeats, not arguments.skip_verify)
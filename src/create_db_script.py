@@ -2,19 +2,26 @@
 This file contains code responsible for creating the database
 """
 
+import argparse
+import re
+
 import mysql.connector
 
-from utilities import MYSQL_DATABASE_NAME, connect_mysql_server
+from utilities import close_connection_pool, get_connection_pool, mysql_database_name, storage_backend_name
 
 
 def _create_database(mysql_cursor) -> None:
     try:
-        mysql_cursor.execute(f"CREATE DATABASE IF NOT EXISTS {MYSQL_DATABASE_NAME}")
+        mysql_cursor.execute(f"CREATE DATABASE IF NOT EXISTS {mysql_database_name()}")
     except mysql.connector.Error as mysql_connection_error:
-        print(f"Error while creating database: {MYSQL_DATABASE_NAME}")
+        print(f"Error while creating database: {mysql_database_name()}")
         raise Exception(str(mysql_connection_error))
 
 
+# Matches a foreign key clause of a table creation statement, with its leading comma
+_FOREIGN_KEY_PATTERN = re.compile(r",\s*FOREIGN KEY\((\w+)\) REFERENCES (\w+)\((\w+)\)")
+
+
 def _get_tables() -> dict[str,str]:
     tables = {}
 
@@ -50,13 +57,12 @@ def _get_tables() -> dict[str,str]:
 
     tables["MovieMetrics"] = """
     CREATE TABLE IF NOT EXISTS MovieMetrics(
-        metrics_id INT NOT NULL AUTO_INCREMENT,
         rating FLOAT CHECK (rating BETWEEN 0 AND 10),
         votes INT UNSIGNED,
         metascore TINYINT UNSIGNED NULL CHECK (metascore BETWEEN 0 AND 100),
         revenue BIGINT UNSIGNED NULL,
-        movie_id INT,
-        PRIMARY KEY(metrics_id),
+        movie_id INT NOT NULL,
+        PRIMARY KEY(movie_id),
         FOREIGN KEY(movie_id) REFERENCES Movie(movie_id)
     );
     """
@@ -100,12 +106,104 @@ def _get_tables() -> dict[str,str]:
     );
     """
 
+    tables["MovieFingerprint"] = """
+    CREATE TABLE IF NOT EXISTS MovieFingerprint(
+        movie_id INT NOT NULL,
+        source_key BIGINT UNSIGNED NOT NULL,
+        row_hash BIGINT UNSIGNED NOT NULL,
+        PRIMARY KEY(movie_id),
+        FOREIGN KEY(movie_id) REFERENCES Movie(movie_id)
+    );
+    """
+
     return tables
 
 
-def _create_tables(mysql_cursor) -> None:
-    tables = _get_tables()
+def _get_summary_tables() -> dict[str,str]:
+    """
+    Tables derived from the loaded data, refreshed by summary_tables.py
+    """
+    tables = {}
+
+    tables["GenreYearRevenue"] = """
+    CREATE TABLE IF NOT EXISTS GenreYearRevenue(
+        release_year SMALLINT UNSIGNED NOT NULL,
+        genre_id INT NOT NULL,
+        max_revenue BIGINT UNSIGNED NULL,
+        total_revenue DECIMAL(24, 0) NULL,
+        movies_count INT UNSIGNED NOT NULL,
+        PRIMARY KEY(release_year, genre_id),
+        INDEX idx_year_max_revenue(release_year, max_revenue)
+    );
+    """
+
+    tables["DirectorMetascore"] = """
+    CREATE TABLE IF NOT EXISTS DirectorMetascore(
+        director_id INT NOT NULL,
+        avg_metascore DECIMAL(7, 4) NULL,
+        movies_count INT UNSIGNED NOT NULL,
+        PRIMARY KEY(director_id),
+        INDEX idx_director_avg_metascore(avg_metascore)
+    );
+    """
+
+    tables["DirectorActorCollaboration"] = """
+    CREATE TABLE IF NOT EXISTS DirectorActorCollaboration(
+        director_id INT NOT NULL,
+        actor_rank INT UNSIGNED NOT NULL,
+        actor_id INT NOT NULL,
+        avg_metascore DECIMAL(7, 4) NULL,
+        movies_count INT UNSIGNED NOT NULL,
+        PRIMARY KEY(director_id, actor_rank)
+    );
+    """
+
+    tables["IngestGeneration"] = """
+    CREATE TABLE IF NOT EXISTS IngestGeneration(
+        id TINYINT UNSIGNED NOT NULL,
+        generation BIGINT UNSIGNED NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY(id)
+    );
+    """
+
+    return tables
+
+
+def _get_foreign_keys() -> list[tuple[str, str, str, str]]:
+    """
+    Returns (table, column, referenced table, referenced column) for every foreign key
+    """
+    foreign_keys = []
+    for table_name, table_creation_statement in _get_tables().items():
+        for column, referenced_table, referenced_column in _FOREIGN_KEY_PATTERN.findall(table_creation_statement):
+            foreign_keys.append((table_name, column, referenced_table, referenced_column))
+    return foreign_keys
+
+
+def _get_indexes() -> list[str]:
+    return [
+        "CREATE INDEX idx_movie_release_year ON Movie(release_year)",
+        "CREATE INDEX idx_metascore ON MovieMetrics(metascore)",
+        "CREATE INDEX idx_genre_name ON Genre(name) USING HASH",
+        "CREATE INDEX idx_role_name ON Role(name) USING HASH",
+        "CREATE INDEX idx_worker_name_role ON Worker(full_name, role_id)",
+        "CREATE INDEX idx_worker_role_name ON Worker(role_id, full_name)",
+        "CREATE INDEX idx_fingerprint_source_key ON MovieFingerprint(source_key)",
+        "CREATE FULLTEXT INDEX idx_movie_description ON Movie(description)",
+    ]
+
+
+def _adds_foreign_keys_after_load() -> bool:
+    # SQLite can't add a foreign key to an existing table, its tables are created with theirs
+    return storage_backend_name() != "sqlite"
+
+
+def _create_tables(mysql_cursor, with_foreign_keys=True) -> None:
+    tables = {**_get_tables(), **_get_summary_tables()}
     for table_name, table_creation_statement in tables.items():
+        if not with_foreign_keys and _adds_foreign_keys_after_load():
+            table_creation_statement = _FOREIGN_KEY_PATTERN.sub("", table_creation_statement)
         try:
             print(f"Creating table: {table_name}")
             mysql_cursor.execute(table_creation_statement)
@@ -114,25 +212,48 @@ def _create_tables(mysql_cursor) -> None:
             raise Exception(str(mysql_connection_error))
 
 
-def _create_indexes(mysql_cursor) -> None:
-    add_full_text_index = """
-    ALTER TABLE Movie
-    ADD FULLTEXT(description)
+def _column_exists(mysql_cursor, table_name, column_name) -> bool:
+    mysql_cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s;",
+        (mysql_database_name(), table_name, column_name)
+    )
+    return mysql_cursor.fetchone()[0] > 0
+
+
+def migrate_metrics_to_movie_key(mysql_cursor) -> None:
     """
-    add_forgien_key_metrics = """
-    ALTER TABLE Movie ADD COLUMN metrics_id INT;
-    ALTER TABLE Movie ADD FOREIGN KEY(metrics_id) REFERENCES MovieMetrics(metrics_id)
+    Migrates a database created with the Movie.metrics_id link to MovieMetrics keyed by movie_id
     """
-    indexes_queries = [
-        "CREATE INDEX idx_movie_release_year ON Movie(release_year)",
-        "CREATE INDEX idx_metascore ON MovieMetrics(metascore)",
-        "CREATE INDEX idx_genre_name ON Genre(name) USING HASH",
-        "CREATE INDEX idx_role_name ON Role(name) USING HASH",
-    ]
-    indexes_queries.append(add_full_text_index)
-    indexes_queries.append(add_forgien_key_metrics)
+    if storage_backend_name() == "sqlite":
+        print("Nothing to migrate, SQLite databases are created with the current schema")
+        return
+    mysql_cursor.execute(f"USE {mysql_database_name()}")
+
+    if _column_exists(mysql_cursor, "Movie", "metrics_id"):
+        mysql_cursor.execute(
+            """
+            SELECT CONSTRAINT_NAME
+            FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'Movie' AND COLUMN_NAME = 'metrics_id'
+                AND REFERENCED_TABLE_NAME IS NOT NULL;
+            """,
+            (mysql_database_name(),)
+        )
+        for (constraint_name,) in mysql_cursor.fetchall():
+            print(f"Dropping foreign key: Movie.{constraint_name}")
+            mysql_cursor.execute(f"ALTER TABLE Movie DROP FOREIGN KEY {constraint_name}")
+        print("Dropping column: Movie.metrics_id")
+        mysql_cursor.execute("ALTER TABLE Movie DROP COLUMN metrics_id")
 
-    for index_query in indexes_queries:
+    if _column_exists(mysql_cursor, "MovieMetrics", "metrics_id"):
+        print("Re-keying MovieMetrics on movie_id")
+        mysql_cursor.execute(
+            "ALTER TABLE MovieMetrics DROP COLUMN metrics_id, MODIFY movie_id INT NOT NULL, ADD PRIMARY KEY(movie_id)"
+        )
+
+
+def _create_indexes(mysql_cursor) -> None:
+    for index_query in _get_indexes():
         try:
             print("Creating index: ", index_query)
             mysql_cursor.execute(index_query)
@@ -140,27 +261,122 @@ def _create_indexes(mysql_cursor) -> None:
             print(f"Error while creating index: {index_query}. {mysql_connection_error}")
 
 
-def main():
+def _existing_foreign_keys(mysql_cursor) -> set[tuple[str, str]]:
+    mysql_cursor.execute(
+        """
+        SELECT TABLE_NAME, COLUMN_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL;
+        """,
+        (mysql_database_name(),)
+    )
+    return set(mysql_cursor.fetchall())
+
+
+def _add_foreign_keys(mysql_cursor) -> None:
     """
-    Create Database Script
+    Adds the missing foreign keys, one ALTER TABLE per table
+    """
+    existing_foreign_keys = _existing_foreign_keys(mysql_cursor)
+    constraints_by_table = {}
+    for table_name, column, referenced_table, referenced_column in _get_foreign_keys():
+        if (table_name, column) in existing_foreign_keys:
+            continue
+        constraints_by_table.setdefault(table_name, []).append(
+            f"ADD CONSTRAINT fk_{table_name.lower()}_{column} FOREIGN KEY({column}) REFERENCES {referenced_table}({referenced_column})"
+        )
+
+    for table_name, constraints in constraints_by_table.items():
+        foreign_key_query = f"ALTER TABLE {table_name} " + ", ".join(constraints)
+        try:
+            print("Creating foreign keys: ", foreign_key_query)
+            mysql_cursor.execute(foreign_key_query)
+        except mysql.connector.Error as mysql_connection_error:
+            print(f"Error while creating foreign keys: {foreign_key_query}. {mysql_connection_error}")
+
+
+def verify_constraints(mysql_cursor) -> dict[str, int]:
+    """
+    Counts the rows violating every foreign key, returns the violated ones
+    """
+    violations = {}
+    for table_name, column, referenced_table, referenced_column in _get_foreign_keys():
+        mysql_cursor.execute(
+            f"""
+            SELECT COUNT(*)
+            FROM {table_name} C
+            LEFT JOIN {referenced_table} P ON C.{column} = P.{referenced_column}
+            WHERE C.{column} IS NOT NULL AND P.{referenced_column} IS NULL;
+            """
+        )
+        orphans_count = mysql_cursor.fetchone()[0]
+        if orphans_count:
+            violations[f"{table_name}.{column} -> {referenced_table}.{referenced_column}"] = orphans_count
+    return violations
+
+
+def create_pre_load_schema(mysql_cursor) -> None:
+    """
+    Creates the database and its tables with primary keys only, ready for a bulk load
+    """
+    print("Creating Databse")
+    _create_database(mysql_cursor)
+    mysql_cursor.execute(f"USE {mysql_database_name()}")
+
+    print("Creating tables")
+    _create_tables(mysql_cursor, with_foreign_keys=False)
+
+
+def create_post_load_schema(mysql_cursor) -> dict[str, int]:
+    """
+    Builds the secondary and full-text indexes and the foreign keys over the loaded data,
+    then re-enables constraint checks and verifies the data against them.
+    Returns the violated foreign keys.
+    """
+    mysql_cursor.execute(f"USE {mysql_database_name()}")
+    # The data is verified once below instead of by every ALTER TABLE
+    mysql_cursor.execute("SET SESSION foreign_key_checks = 0")
+    try:
+        print("Creating database indexes")
+        _create_indexes(mysql_cursor)
+
+        if _adds_foreign_keys_after_load():
+            print("Creating foreign keys")
+            _add_foreign_keys(mysql_cursor)
+    finally:
+        mysql_cursor.execute("SET SESSION foreign_key_checks = 1")
+
+    print("Verifying constraints")
+    violations = verify_constraints(mysql_cursor)
+    for foreign_key, orphans_count in violations.items():
+        print(f"Constraint violated: {foreign_key} ({orphans_count} rows)")
+    if not violations:
+        print("All constraints verified.")
+    return violations
+
+
+def main(phase="all"):
+    """
+    Create Database Script.
+    phase "pre-load" creates the tables with primary keys only, "post-load" adds the
+    indexes and foreign keys after a load, and "all" does both.
+    phase "migrate" upgrades an existing database to the current schema.
     """
     mysql_connection = None
     mysql_cursor = None
 
     try:
-        mysql_connection = connect_mysql_server()
+        mysql_connection = get_connection_pool().checkout()
         mysql_cursor = mysql_connection.cursor()
-    
-        print("Creating Databse")
-        _create_database(mysql_cursor)
 
-        mysql_cursor.execute(f"USE {MYSQL_DATABASE_NAME}")
+        if phase == "migrate":
+            migrate_metrics_to_movie_key(mysql_cursor)
 
-        print("Creating tables")
-        _create_tables(mysql_cursor)
+        if phase in ("all", "pre-load"):
+            create_pre_load_schema(mysql_cursor)
 
-        print("Creating database indexes")
-        _create_indexes(mysql_cursor)
+        if phase in ("all", "post-load"):
+            create_post_load_schema(mysql_cursor)
 
     except mysql.connector.Error as mysql_connection_error:
         print("MySQL create db error: ", mysql_connection_error)
@@ -170,7 +386,17 @@ def main():
         if mysql_cursor:
             mysql_cursor.close()
         if mysql_connection:
-            mysql_connection.close()
+            get_connection_pool().checkin(mysql_connection)
+        close_connection_pool()
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Create the movies database schema")
+    parser.add_argument("--phase", choices=["all", "pre-load", "post-load", "migrate"], default="all",
+                        help="schema phase to create")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    main()
+    arguments = _parse_arguments()
+    main(arguments.phase)
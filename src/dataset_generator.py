@@ -0,0 +1,408 @@
+"""
+This file generates synthetic IMDb-shaped datasets for load and scale testing.
+
+The generated CSV has the columns and list-literal formats of
+imdb_movies_dataset_10K.csv, so every loader reads it unchanged. The data is
+skewed like the real catalogue: director and actor participation follows a
+power law, genres co-occur in typical pairs, description words follow a Zipf
+distribution over a vocabulary holding the common buzzwords, and the numeric
+columns have the original null rates. Generation is seeded and vectorized.
+
+Usage:
+    python src/dataset_generator.py --rows 1000000 --output movies_1M.csv --seed 7
+"""
+
+import argparse
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SEED = 0
+
+GENRES = [
+    "Action", "Adventure", "Animation", "Biography", "Comedy", "Crime", "Drama", "Family", "Fantasy", "Film-Noir",
+    "History", "Horror", "Music", "Musical", "Mystery", "Romance", "Sci-Fi", "Sport", "Thriller", "War", "Western"
+]
+GENRE_WEIGHTS = [12, 10, 4, 4, 16, 10, 30, 3, 5, 1, 3, 6, 2, 1, 5, 9, 4, 2, 8, 2, 1]
+
+# Genres frequently listed together, with their affinity boost
+GENRE_PAIRS = {
+    ("Action", "Adventure"): 6, ("Action", "Sci-Fi"): 4, ("Action", "Thriller"): 4, ("Adventure", "Animation"): 5,
+    ("Adventure", "Fantasy"): 4, ("Animation", "Family"): 5, ("Biography", "Drama"): 6, ("Biography", "History"): 4,
+    ("Comedy", "Romance"): 6, ("Comedy", "Family"): 3, ("Crime", "Drama"): 6, ("Crime", "Thriller"): 5,
+    ("Drama", "Romance"): 5, ("Drama", "War"): 3, ("Horror", "Mystery"): 4, ("Horror", "Thriller"): 5,
+    ("Music", "Drama"): 2, ("Mystery", "Thriller"): 5, ("Sport", "Drama"): 3, ("Western", "Action"): 2,
+}
+
+# Probabilities of 1, 2 and 3 genres per movie
+GENRE_COUNT_PROBABILITIES = [0.08, 0.25, 0.67]
+DIRECTOR_COUNT_PROBABILITIES = [0.93, 0.06, 0.01]
+STARS_PER_MOVIE = 4
+
+CERTIFICATIONS = ["R", "PG-13", "Not Rated", "PG", "G", "TV-MA", "Approved", "Passed", "TV-14", "Unrated", "TV-PG", "NC-17"]
+CERTIFICATION_WEIGHTS = [4048, 2149, 1272, 1174, 222, 200, 151, 150, 83, 71, 35, 28]
+
+NULL_RATES = {"MetaScore": 0.20, "Gross": 0.29, "Certification": 0.037}
+
+# People pool sizes per movie, and Zipf-Mandelbrot skew and head offsets (as fractions of the pools)
+# of their participation, tuned to the distinct counts and top counts of the 10K dataset
+DIRECTORS_POOL_RATIO = 1.0
+ACTORS_POOL_RATIO = 6.0
+PEOPLE_SKEW = 1.0
+DIRECTORS_RANK_OFFSET = 0.005
+ACTORS_RANK_OFFSET = 0.0013
+
+# Zipf exponent of the description word frequencies
+WORDS_SKEW = 1.05
+
+# Number of movies whose descriptions, or CSV lines, are built at once
+TEXT_CHUNK_ROWS = 100000
+
+# Fewest buckets of the guide tables the weighted draws start their search from
+GUIDE_TABLE_MIN_BUCKETS = 2 ** 19
+
+# Most frequent description words, in rank order, before the generated vocabulary
+COMMON_WORDS = [
+    "the", "a", "of", "to", "and", "his", "in", "her", "an", "with", "for", "their", "on", "is", "who", "by",
+    "after", "when", "from", "young", "life", "man", "woman", "family", "world", "love", "new", "story", "two",
+    "must", "friends", "war", "father", "find", "home", "town", "city", "mysterious", "secret", "past", "murder",
+    "school", "team", "mother", "son", "daughter", "journey", "space", "crime", "dangerous", "police", "killer",
+    "time", "help", "death", "revenge", "group", "discovers", "brother", "detective", "escape", "future", "battle",
+]
+
+_SYLLABLES = [
+    "ka", "lo", "mi", "ra", "to", "ne", "sa", "vi", "do", "re", "an", "el", "or", "us", "in", "ba", "ti", "mo",
+    "la", "de", "ro", "si", "na", "ve", "go", "pa", "li", "ze", "ha", "ju", "ko", "ma", "ri", "te", "no", "be",
+]
+_FIRST_NAMES = [
+    "James", "Mary", "John", "Anna", "Robert", "Linda", "Michael", "Sarah", "David", "Emma", "Richard", "Laura",
+    "Thomas", "Julia", "Daniel", "Nina", "Paul", "Clara", "Mark", "Elena", "George", "Alice", "Peter", "Sofia",
+    "Hiro", "Yuki", "Ravi", "Priya", "Ahmed", "Leila", "Pierre", "Chloe", "Hans", "Greta", "Luca", "Giulia",
+]
+
+
+def _distinct_codes(count, total, rng):
+    """
+    Returns `count` distinct codes below `total` in random order, through a random affine permutation
+    """
+    if count > total:
+        raise ValueError(f"Cannot draw {count} distinct codes out of {total}")
+    multiplier = int(rng.integers(1, total)) if total > 1 else 1
+    while math.gcd(multiplier, total) != 1:
+        multiplier += 1
+    offset = int(rng.integers(0, total))
+    return (np.arange(count, dtype=np.int64) * multiplier + offset) % total
+
+
+def _syllable_words(codes, length):
+    """
+    Spells every code as a pseudo-word of `length` syllables
+    """
+    syllables = np.array(_SYLLABLES, dtype=object)
+    words = syllables[codes % len(syllables)]
+    for _ in range(length - 1):
+        codes = codes // len(syllables)
+        words = words + syllables[codes % len(syllables)]
+    return words
+
+
+def _person_names(count, rng):
+    """
+    Returns a function spelling indexes below `count` as distinct quoted full names
+    """
+    surname_length = 2
+    while len(_FIRST_NAMES) * len(_SYLLABLES) ** surname_length < count:
+        surname_length += 1
+    codes = _distinct_codes(count, len(_FIRST_NAMES) * len(_SYLLABLES) ** surname_length, rng)
+
+    # Every name is one concatenation of two small tables: the first name with the head of the surname,
+    # indexed by the low digits of its code, and the tail of the surname, indexed by the high digits
+    head_length = surname_length // 2
+    head_count = len(_FIRST_NAMES) * len(_SYLLABLES) ** head_length
+    head_codes = np.arange(head_count)
+    surname_heads = pd.Series(_syllable_words(head_codes // len(_FIRST_NAMES), head_length)).str.capitalize().to_numpy()
+    heads = "'" + np.array(_FIRST_NAMES, dtype=object)[head_codes % len(_FIRST_NAMES)] + " " + surname_heads
+    tail_length = surname_length - head_length
+    tails = _syllable_words(np.arange(len(_SYLLABLES) ** tail_length), tail_length) + "'"
+
+    def spell(indexes):
+        name_codes = codes[indexes]
+        return heads[name_codes % head_count] + tails[name_codes // head_count]
+
+    return spell
+
+
+def _zipf_probabilities(count, skew, offset=0.0):
+    """
+    Zipf-Mandelbrot probabilities of ranks 1..count, the offset flattens the head
+    """
+    weights = 1.0 / (np.arange(1, count + 1) + offset) ** skew
+    return weights / weights.sum()
+
+
+def _weighted_sampler(probabilities):
+    """
+    Returns a function drawing indexes following the probabilities. The draws are those of
+    rng.choice(len(probabilities), size, p=probabilities), found from a guide table instead of a binary search.
+    """
+    cumulative = np.cumsum(probabilities)
+    cumulative /= cumulative[-1]
+    # With a power of two bucket count uniform * buckets is exact, so no draw starts past its index
+    buckets = max(GUIDE_TABLE_MIN_BUCKETS, 1 << (len(cumulative) - 1).bit_length())
+    guide = cumulative.searchsorted(np.arange(buckets) / buckets, side="right")
+
+    def sample(size, rng):
+        uniform = rng.random(size)
+        indexes = guide[(uniform * buckets).astype(np.intp)]
+        flat_uniform, flat_indexes = uniform.reshape(-1), indexes.reshape(-1)
+        behind = np.flatnonzero(cumulative[flat_indexes] <= flat_uniform)
+        while len(behind):
+            flat_indexes[behind] += 1
+            behind = behind[cumulative[flat_indexes[behind]] <= flat_uniform[behind]]
+        return indexes
+
+    return sample
+
+
+def _sample_distinct_per_row(rows, per_row, sample, rng, attempts=5):
+    """
+    Draws `per_row` indexes per row with the weighted sampler, resampling repeats within a row
+    """
+    samples = sample((rows, per_row), rng)
+    for _ in range(attempts):
+        sorted_samples = np.sort(samples, axis=1)
+        repeated_rows = np.flatnonzero((sorted_samples[:, 1:] == sorted_samples[:, :-1]).any(axis=1))
+        if len(repeated_rows) == 0:
+            break
+        samples[repeated_rows] = sample((len(repeated_rows), per_row), rng)
+    return samples
+
+
+def _quoted(values):
+    return "'" + np.asarray(values, dtype=object) + "'"
+
+
+def _join_runs(items, counts, separator, prefix="", suffix=""):
+    """
+    Joins consecutive runs of `counts` items (at least one each) into one string per run
+    """
+    # A NUL item between runs turns one big join into all the runs
+    boundaries = np.cumsum(counts)[:-1]
+    text = separator.join(np.insert(np.asarray(items, dtype=object), boundaries, "\0").tolist())
+    text = text.replace(separator + "\0" + separator, suffix + "\0" + prefix)
+    return (prefix + text + suffix).split("\0")
+
+
+def _list_literals(quoted_items, counts):
+    """
+    Formats consecutive runs of `counts` quoted items as python list literals: "['a', 'b']"
+    """
+    return _join_runs(quoted_items, counts, ", ", "[", "]")
+
+
+def _genre_literals(rows, rng):
+    """
+    Picks 1 to 3 genres per movie: a primary genre by popularity, the others by affinity with it
+    """
+    genre_count = len(GENRES)
+    popularity = np.array(GENRE_WEIGHTS, dtype=float) / sum(GENRE_WEIGHTS)
+    affinity = np.tile(popularity, (genre_count, 1))
+    for (first_genre, second_genre), boost in GENRE_PAIRS.items():
+        first_index, second_index = GENRES.index(first_genre), GENRES.index(second_genre)
+        affinity[first_index, second_index] *= boost
+        affinity[second_index, first_index] *= boost
+    np.fill_diagonal(affinity, 0.0)
+
+    primary = rng.choice(genre_count, size=rows, p=popularity)
+    counts = rng.choice([1, 2, 3], size=rows, p=GENRE_COUNT_PROBABILITIES)
+
+    # Gumbel top-k: the largest log(affinity) + Gumbel noise are a weighted sample without replacement
+    with np.errstate(divide="ignore"):
+        scores = np.log(affinity[primary]) + rng.gumbel(size=(rows, genre_count))
+    second = scores.argmax(axis=1)
+    scores[np.arange(rows), second] = -np.inf
+    third = scores.argmax(axis=1)
+
+    chosen = np.column_stack([primary, second, third])
+    chosen = np.where(np.arange(3) < counts[:, None], chosen, genre_count)
+    # The dataset lists genres alphabetically, every genre after the first with a leading space
+    chosen = np.sort(chosen, axis=1)
+    # Movies share few genre combinations, every combination is formatted once
+    _, combination_rows, combination_indexes = np.unique(
+        chosen @ (genre_count + 1) ** np.arange(2, -1, -1), return_index=True, return_inverse=True
+    )
+    combinations = chosen[combination_rows]
+    names = np.where(
+        np.arange(3) == 0, _quoted(GENRES + [""])[combinations], _quoted([" " + genre for genre in GENRES] + [""])[combinations]
+    )
+    valid = combinations < genre_count
+    return np.array(_list_literals(names[valid], valid.sum(axis=1)), dtype=object)[combination_indexes.ravel()]
+
+
+def _description_literals(rows, vocabulary, rng):
+    """
+    Samples Zipf-distributed words into sentence-shaped descriptions of 8 to 45 words
+    """
+    lengths = np.clip(rng.normal(24, 7, size=rows).round().astype(int), 8, 45)
+    sample_words = _weighted_sampler(_zipf_probabilities(len(vocabulary), WORDS_SKEW))
+    # Every word as it opens, continues and ends a description literal, a NUL marks where each description starts
+    first_words = "\0[" + _quoted(pd.Series(vocabulary).str.capitalize()) + ", "
+    middle_words = _quoted(vocabulary) + ", "
+    last_words = _quoted(vocabulary + ".") + "]"
+
+    descriptions = []
+    # Built in chunks to bound the number of word references alive at once
+    for start in range(0, rows, TEXT_CHUNK_ROWS):
+        chunk_lengths = lengths[start:start + TEXT_CHUNK_ROWS]
+        word_indexes = sample_words(int(chunk_lengths.sum()), rng)
+        words = middle_words[word_indexes]
+        ends = np.cumsum(chunk_lengths)
+        starts = ends - chunk_lengths
+        words[starts] = first_words[word_indexes[starts]]
+        words[ends - 1] = last_words[word_indexes[ends - 1]]
+        descriptions.extend("".join(words.tolist()).split("\0")[1:])
+    return descriptions
+
+
+def _with_nulls(values, null_rate, rng):
+    values = pd.Series(values)
+    return values.mask(rng.random(len(values)) < null_rate)
+
+
+def generate_movies_data_frame(rows, seed=DEFAULT_SEED, directors=None, actors=None, vocabulary_size=20000):
+    """
+    Generates `rows` movies in the layout of the IMDb dataset.
+    directors and actors are the sizes of the people pools, by default proportional to rows.
+    """
+    rng = np.random.default_rng(seed)
+    directors = directors or max(10, int(rows * DIRECTORS_POOL_RATIO))
+    actors = actors or max(20, int(rows * ACTORS_POOL_RATIO))
+
+    generated_words = vocabulary_size - len(COMMON_WORDS)
+    vocabulary = np.concatenate([
+        np.array(COMMON_WORDS, dtype=object),
+        _syllable_words(_distinct_codes(generated_words, len(_SYLLABLES) ** 3, rng), 3),
+    ])
+
+    # Ratings drive the metascores, votes and gross, as in the real data
+    ratings = np.clip(rng.normal(6.6, 1.0, size=rows), 1.0, 9.9).round(1)
+    metascores = np.clip((ratings - 1.0) * 11 + rng.normal(0, 10, size=rows), 1, 100).round()
+    votes = np.maximum(5, rng.lognormal(8 + (ratings - 6.6) * 0.6, 1.8, size=rows)).astype(np.int64)
+    gross = (rng.lognormal(16.5, 1.8, size=rows) * (votes / votes.mean()) ** 0.3).round(-4)
+
+    years = np.clip(2023 - rng.exponential(22, size=rows), 1915, 2023).astype(np.int64)
+    certifications = np.array(CERTIFICATIONS, dtype=object)[
+        rng.choice(len(CERTIFICATIONS), size=rows, p=np.array(CERTIFICATION_WEIGHTS) / sum(CERTIFICATION_WEIGHTS))
+    ]
+
+    title_lengths = rng.choice([1, 2, 3, 4], size=rows, p=[0.25, 0.35, 0.25, 0.15])
+    title_words = pd.Series(vocabulary).str.capitalize().to_numpy()[
+        rng.integers(len(COMMON_WORDS), len(vocabulary), size=int(title_lengths.sum()))
+    ]
+    titles = _join_runs(title_words, title_lengths, " ")
+
+    director_names = _person_names(directors, rng)
+    director_counts = rng.choice([1, 2, 3], size=rows, p=DIRECTOR_COUNT_PROBABILITIES)
+    director_samples = _sample_distinct_per_row(
+        rows, 3, _weighted_sampler(_zipf_probabilities(directors, PEOPLE_SKEW, directors * DIRECTORS_RANK_OFFSET)), rng
+    )
+    director_items = director_names(director_samples[np.arange(3) < director_counts[:, None]])
+
+    actor_names = _person_names(actors, rng)
+    actor_samples = _sample_distinct_per_row(
+        rows, STARS_PER_MOVIE, _weighted_sampler(_zipf_probabilities(actors, PEOPLE_SKEW, actors * ACTORS_RANK_OFFSET)), rng
+    )
+
+    movies_data_frame = pd.DataFrame({
+        "Movie Name": titles,
+        "Year of Release": years,
+        "Run Time in minutes": np.clip(rng.normal(110, 22, size=rows), 60, 240).astype(np.int64),
+        "Movie Rating": ratings,
+        "Votes": votes,
+        "MetaScore": _with_nulls(metascores, NULL_RATES["MetaScore"], rng),
+        "Gross": _with_nulls(gross, NULL_RATES["Gross"], rng),
+        "Genre": _genre_literals(rows, rng),
+        "Certification": _with_nulls(certifications, NULL_RATES["Certification"], rng),
+        "Director": _list_literals(director_items, director_counts),
+        "Stars": _list_literals(actor_names(actor_samples.ravel()), np.full(rows, STARS_PER_MOVIE)),
+        "Description": _description_literals(rows, vocabulary, rng),
+    })
+    return movies_data_frame
+
+
+def _csv_fields(column):
+    """
+    Formats a column as the CSV fields DataFrame.to_csv writes, less their enclosing quotes: numbers by repr,
+    missing values empty and quotes in text doubled. Returns the fields and whether each one is quoted,
+    as text holding a separator, quote or line break is.
+    """
+    values = column.to_numpy()
+    if values.dtype.kind in "iuf":
+        # Numbers repeat a lot, every distinct one is formatted once and missing ones have the code -1
+        value_codes, distinct_values = pd.factorize(values)
+        fields = list(map(str if values.dtype.kind in "iu" else repr, distinct_values.tolist()))
+        return np.array(fields + [""], dtype=object)[value_codes], np.zeros(len(values), dtype=bool)
+    fields = np.where(pd.isna(values), "", values)
+    values = fields.tolist()
+    quoted = np.array([
+        "," in value or '"' in value or "\n" in value or "\r" in value for value in values
+    ], dtype=bool)
+    # Quotes are rare, they are only escaped in a column holding one
+    if '"' in "".join(values):
+        fields = np.array([value.replace('"', '""') for value in values], dtype=object)
+    return fields, quoted
+
+
+# Separators between two CSV fields and line ends, by whether the fields around them are quoted
+_CSV_SEPARATORS = np.array([",", ',"', '",', '","'], dtype=object)
+_CSV_LINE_ENDS = np.array(["\n", '"\n'], dtype=object)
+
+
+def write_dataset(csv_path, rows, seed=DEFAULT_SEED):
+    """
+    Generates the dataset and writes it as a CSV with the original leading index column.
+    The lines are formatted and written TEXT_CHUNK_ROWS movies at a time, the same bytes as DataFrame.to_csv.
+    """
+    movies_data_frame = generate_movies_data_frame(rows, seed)
+    Path(csv_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(csv_path, "w", encoding="utf-8") as csv_file:
+        csv_file.write(",".join(["", *movies_data_frame.columns]) + "\n")
+        for start in range(0, rows, TEXT_CHUNK_ROWS):
+            chunk = movies_data_frame.iloc[start:start + TEXT_CHUNK_ROWS]
+            # The fields of each line alternate with its separators, which carry the quotes, so the chunk is one join
+            fields = np.empty((len(chunk), 2 * (len(chunk.columns) + 1)), dtype=object)
+            fields[:, 0] = np.array(list(map(str, chunk.index.tolist())), dtype=object)
+            previous_quoted = np.zeros(len(chunk), dtype=bool)
+            for position, column in enumerate(chunk.columns, start=1):
+                column_fields, quoted = _csv_fields(chunk[column])
+                fields[:, 2 * position - 1] = _CSV_SEPARATORS[2 * previous_quoted + quoted]
+                fields[:, 2 * position] = column_fields
+                previous_quoted = quoted
+            fields[:, -1] = _CSV_LINE_ENDS[previous_quoted.astype(int)]
+            csv_file.write("".join(fields.ravel().tolist()))
+    return csv_path
+
+
+def main(rows, output_path, seed=DEFAULT_SEED):
+    """
+    Writes a synthetic dataset of `rows` movies
+    """
+    started_at = time.perf_counter()
+    write_dataset(output_path, rows, seed)
+    print(f"Generated {rows} movies into {output_path} in {time.perf_counter() - started_at:.2f}s.")
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate a synthetic IMDb-shaped movies dataset")
+    parser.add_argument("--rows", type=int, required=True, help="number of movies")
+    parser.add_argument("--output", type=Path, required=True, help="CSV file to write")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="random seed")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = _parse_arguments()
+    main(arguments.rows, arguments.output, arguments.seed)
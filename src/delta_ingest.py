@@ -0,0 +1,338 @@
+"""
+This file handles incremental data insertion.
+
+Every movie row is fingerprinted (see movies_dataset): source_key identifies
+the movie across dataset versions and row_hash covers all of its columns.
+A delta run compares the dataset against the fingerprints stored in
+MovieFingerprint and only writes the new, changed and deleted movies, so the
+refresh time scales with the size of the change rather than the dataset.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import mysql.connector
+import pandas as pd
+
+from api_data_retrieve import BULK_BATCH_SIZE, column_values, executemany_in_batches, insert_roles, map_ids
+from movies_dataset import MOVIES_DATASET_FILENAME, ROLE_IDS, load_normalized_dataset
+from streaming_ingest import LOOKUP_BATCH_SIZE, create_dimension_resolvers
+from summary_tables import bump_ingest_generation, refresh_director_collaborations, refresh_genre_year_revenue
+from utilities import connect_database, mysql_database_name
+
+
+def _execute_for_ids(mysql_cursor, statement, ids):
+    """
+    Runs a statement holding an `{ids}` placeholder for the ids, LOOKUP_BATCH_SIZE ids at a time.
+    Returns the fetched rows of every batch.
+    """
+    ids = list(ids)
+    rows = []
+    for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+        batch = ids[start:start + LOOKUP_BATCH_SIZE]
+        mysql_cursor.execute(statement.format(ids=", ".join(["%s"] * len(batch))), batch)
+        if mysql_cursor.description is not None:
+            rows.extend(mysql_cursor.fetchall())
+    return rows
+
+
+def _fetch_fingerprints(mysql_cursor):
+    mysql_cursor.execute("SELECT movie_id, source_key, row_hash FROM MovieFingerprint;")
+    return pd.DataFrame(mysql_cursor.fetchall(), columns=["movie_id", "source_key", "row_hash"])
+
+
+def _with_occurrence(fingerprints, order_column):
+    """
+    Numbers the rows sharing a source_key, so duplicate keys pair up in order
+    """
+    fingerprints = fingerprints.sort_values(order_column)
+    fingerprints["occurrence"] = fingerprints.groupby("source_key").cumcount()
+    return fingerprints
+
+
+def compute_delta(movies, stored_fingerprints, next_movie_id):
+    """
+    Matches the dataset movies against the stored fingerprints.
+    Returns (new, changed, deleted movie ids, dataset movie id -> database movie id for new and changed movies).
+    """
+    incoming = _with_occurrence(movies[["movie_id", "source_key", "row_hash"]].copy(), "movie_id")
+    stored = _with_occurrence(stored_fingerprints.astype({"source_key": "uint64", "row_hash": "uint64"}), "movie_id")
+    matched = incoming.merge(stored, on=["source_key", "occurrence"], suffixes=("", "_stored"))
+
+    new_movies = incoming[~incoming["movie_id"].isin(matched["movie_id"])]
+    changed_movies = matched[matched["row_hash"] != matched["row_hash_stored"]]
+    deleted_movies = stored[~stored["movie_id"].isin(matched["movie_id_stored"])]
+
+    new_ids = list(range(next_movie_id, next_movie_id + len(new_movies)))
+    changed_ids = changed_movies["movie_id_stored"].astype("int64").tolist()
+    id_mapping = dict(zip(new_movies["movie_id"].astype("int64").tolist(), new_ids))
+    id_mapping.update(zip(changed_movies["movie_id"].astype("int64").tolist(), changed_ids))
+    return new_ids, changed_ids, deleted_movies["movie_id"].astype("int64").tolist(), id_mapping
+
+
+def _remap_movie_ids(table, id_mapping):
+    """
+    Keeps the rows of the delta movies, with their database movie ids
+    """
+    table = table[table["movie_id"].isin(id_mapping.keys())].copy()
+    table["movie_id"] = table["movie_id"].map(id_mapping)
+    return table
+
+
+def _remove_movie_rows(mysql_cursor, movie_ids, deleted_ids):
+    """
+    Removes the associations of the given movies, and the deleted movies with their metrics.
+    Returns the genre and worker ids these movies referenced.
+    """
+    genre_ids = [row[0] for row in _execute_for_ids(
+        mysql_cursor, "SELECT DISTINCT genre_id FROM MovieGenreAssociation WHERE movie_id IN ({ids});", movie_ids
+    )]
+    worker_ids = [row[0] for row in _execute_for_ids(
+        mysql_cursor, "SELECT DISTINCT worker_id FROM MovieWorkerAssociation WHERE movie_id IN ({ids});", movie_ids
+    )]
+    _execute_for_ids(mysql_cursor, "DELETE FROM MovieGenreAssociation WHERE movie_id IN ({ids});", movie_ids)
+    _execute_for_ids(mysql_cursor, "DELETE FROM MovieWorkerAssociation WHERE movie_id IN ({ids});", movie_ids)
+    _execute_for_ids(mysql_cursor, "DELETE FROM MovieMetrics WHERE movie_id IN ({ids});", deleted_ids)
+    _execute_for_ids(mysql_cursor, "DELETE FROM MovieFingerprint WHERE movie_id IN ({ids});", deleted_ids)
+    _execute_for_ids(mysql_cursor, "DELETE FROM Movie WHERE movie_id IN ({ids});", deleted_ids)
+    return genre_ids, worker_ids
+
+
+def _remove_orphans(mysql_cursor, genre_ids, worker_ids):
+    """
+    Removes the genres and workers no movie references anymore, among the given ids
+    """
+    _execute_for_ids(
+        mysql_cursor,
+        """
+        DELETE G FROM Genre G
+        LEFT JOIN MovieGenreAssociation MGA ON G.genre_id = MGA.genre_id
+        WHERE MGA.genre_id IS NULL AND G.genre_id IN ({ids});
+        """,
+        genre_ids
+    )
+    _execute_for_ids(
+        mysql_cursor,
+        """
+        DELETE W FROM Worker W
+        LEFT JOIN MovieWorkerAssociation MWA ON W.worker_id = MWA.worker_id
+        WHERE MWA.worker_id IS NULL AND W.worker_id IN ({ids});
+        """,
+        worker_ids
+    )
+
+
+def _write_movies(mysql_cursor, movies, movie_genres, movie_workers, batch_size):
+    """
+    Upserts the delta movies and writes their metrics, associations and fingerprints
+    """
+    resolvers = create_dimension_resolvers(LOOKUP_BATCH_SIZE * 10)
+    certificate_ids = resolvers["certificates"].resolve(
+        mysql_cursor, [certificate for certificate in column_values(movies, "certificate") if certificate is not None], batch_size
+    )
+    genre_ids = resolvers["genres"].resolve(mysql_cursor, column_values(movie_genres, "name"), batch_size)
+    worker_keys = list(zip(column_values(movie_workers, "full_name"), column_values(movie_workers, "role_id")))
+    worker_ids = resolvers["workers"].resolve(mysql_cursor, worker_keys, batch_size)
+
+    movie_ids = column_values(movies, "movie_id")
+    executemany_in_batches(
+        mysql_cursor,
+        """
+        INSERT INTO Movie (movie_id, title, release_year, duration_minutes, description, certificate_id)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            title = VALUES(title),
+            release_year = VALUES(release_year),
+            duration_minutes = VALUES(duration_minutes),
+            description = VALUES(description),
+            certificate_id = VALUES(certificate_id);
+        """,
+        zip(
+            movie_ids,
+            column_values(movies, "title"),
+            column_values(movies, "release_year"),
+            column_values(movies, "duration_minutes"),
+            column_values(movies, "description"),
+            map_ids(column_values(movies, "certificate"), certificate_ids)
+        ),
+        batch_size
+    )
+    executemany_in_batches(
+        mysql_cursor,
+        """
+        INSERT INTO MovieMetrics (rating, votes, metascore, revenue, movie_id) VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            rating = VALUES(rating),
+            votes = VALUES(votes),
+            metascore = VALUES(metascore),
+            revenue = VALUES(revenue);
+        """,
+        zip(
+            column_values(movies, "rating"),
+            column_values(movies, "votes"),
+            column_values(movies, "metascore"),
+            column_values(movies, "revenue"),
+            movie_ids
+        ),
+        batch_size
+    )
+    executemany_in_batches(
+        mysql_cursor,
+        "INSERT INTO MovieGenreAssociation (movie_id, genre_id) VALUES (%s, %s);",
+        zip(column_values(movie_genres, "movie_id"), map_ids(column_values(movie_genres, "name"), genre_ids)),
+        batch_size
+    )
+    executemany_in_batches(
+        mysql_cursor,
+        "INSERT INTO MovieWorkerAssociation (movie_id, worker_id) VALUES (%s, %s);",
+        sorted(set(zip(column_values(movie_workers, "movie_id"), map_ids(worker_keys, worker_ids)))),
+        batch_size
+    )
+    executemany_in_batches(
+        mysql_cursor,
+        """
+        INSERT INTO MovieFingerprint (movie_id, source_key, row_hash) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE source_key = VALUES(source_key), row_hash = VALUES(row_hash);
+        """,
+        zip(movie_ids, column_values(movies, "source_key"), column_values(movies, "row_hash")),
+        batch_size
+    )
+
+
+def delta_ingest(mysql_connection, csv_path, batch_size=BULK_BATCH_SIZE, dry_run=False):
+    """
+    Applies the differences between the dataset and the database in one transaction.
+    Returns the number of new, changed and deleted movies.
+    """
+    normalized_dataset = load_normalized_dataset(csv_path)
+    mysql_cursor = mysql_connection.cursor()
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        # Without their fingerprints the stored movies would all look deleted and come back as new ones
+        mysql_cursor.execute("SELECT COUNT(*) FROM Movie WHERE movie_id NOT IN (SELECT movie_id FROM MovieFingerprint);")
+        unfingerprinted_count = mysql_cursor.fetchone()[0]
+        if unfingerprinted_count:
+            raise RuntimeError(
+                f"{unfingerprinted_count} stored movies have no fingerprint, record the fingerprints of the dataset "
+                "they were loaded from with --bootstrap first"
+            )
+        stored_fingerprints = _fetch_fingerprints(mysql_cursor)
+        mysql_cursor.execute("SELECT COALESCE(MAX(movie_id), 0) FROM Movie;")
+        next_movie_id = mysql_cursor.fetchone()[0] + 1
+
+        new_ids, changed_ids, deleted_ids, id_mapping = compute_delta(
+            normalized_dataset["movies"], stored_fingerprints, next_movie_id
+        )
+        delta_counts = {"new": len(new_ids), "changed": len(changed_ids), "deleted": len(deleted_ids)}
+        print(f"Delta: {delta_counts['new']} new, {delta_counts['changed']} changed, {delta_counts['deleted']} deleted movies.")
+        if dry_run or not any(delta_counts.values()):
+            return delta_counts
+
+        insert_roles(mysql_connection, mysql_cursor)
+        mysql_cursor.execute("START TRANSACTION;")
+        # The summary rows of both the previous and the new release years are affected
+        affected_years = {row[0] for row in _execute_for_ids(
+            mysql_cursor, "SELECT DISTINCT release_year FROM Movie WHERE movie_id IN ({ids});", changed_ids + deleted_ids
+        )}
+        delta_movies = _remap_movie_ids(normalized_dataset["movies"], id_mapping)
+        affected_years.update(column_values(delta_movies, "release_year"))
+
+        genre_ids, worker_ids = _remove_movie_rows(mysql_cursor, changed_ids + deleted_ids, deleted_ids)
+        _write_movies(
+            mysql_cursor,
+            delta_movies,
+            _remap_movie_ids(normalized_dataset["movie_genres"], id_mapping),
+            _remap_movie_ids(normalized_dataset["movie_workers"], id_mapping),
+            batch_size
+        )
+        _remove_orphans(mysql_cursor, genre_ids, worker_ids)
+        refresh_genre_year_revenue(mysql_cursor, affected_years)
+        # The collaborations of the directors of both the previous and the new movie rows are affected
+        affected_directors = {row[0] for row in _execute_for_ids(
+            mysql_cursor,
+            "SELECT DISTINCT MWA.worker_id FROM MovieWorkerAssociation MWA JOIN Worker W ON MWA.worker_id = W.worker_id "
+            f"WHERE W.role_id = {ROLE_IDS['director']} AND MWA.movie_id IN ({{ids}});",
+            new_ids + changed_ids
+        )}
+        affected_directors.update(worker_ids)
+        refresh_director_collaborations(mysql_cursor, affected_directors)
+        bump_ingest_generation(mysql_cursor)
+        mysql_connection.commit()
+        return delta_counts
+    except mysql.connector.Error as error:
+        print("Error applying delta: ", error)
+        mysql_connection.rollback()
+        raise
+    finally:
+        mysql_cursor.close()
+
+
+def record_fingerprints(mysql_connection, csv_path, batch_size=BULK_BATCH_SIZE):
+    """
+    Records the fingerprints of the dataset a database was fully loaded from,
+    for databases loaded before fingerprints existed. Movie ids are the row index + 1.
+    """
+    movies = load_normalized_dataset(csv_path)["movies"]
+    mysql_cursor = mysql_connection.cursor()
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        rows_count = executemany_in_batches(
+            mysql_cursor,
+            """
+            INSERT INTO MovieFingerprint (movie_id, source_key, row_hash) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE source_key = VALUES(source_key), row_hash = VALUES(row_hash);
+            """,
+            zip(column_values(movies, "movie_id"), column_values(movies, "source_key"), column_values(movies, "row_hash")),
+            batch_size
+        )
+        mysql_connection.commit()
+        return rows_count
+    except mysql.connector.Error as error:
+        print("Error recording fingerprints: ", error)
+        mysql_connection.rollback()
+        raise
+    finally:
+        mysql_cursor.close()
+
+
+def main(csv_path=None, batch_size=BULK_BATCH_SIZE, dry_run=False, bootstrap=False):
+    """
+    handles incremental data insertion
+    """
+    mysql_connection = None
+    if csv_path is None:
+        csv_path = Path(__file__).resolve().parent / MOVIES_DATASET_FILENAME
+
+    try:
+        mysql_connection = connect_database()
+        started_at = time.perf_counter()
+        if bootstrap:
+            rows_count = record_fingerprints(mysql_connection, csv_path, batch_size)
+            print(f"Recorded {rows_count} fingerprints.")
+        else:
+            delta_ingest(mysql_connection, csv_path, batch_size, dry_run)
+        print(f"Done in {time.perf_counter() - started_at:.2f}s.")
+    except mysql.connector.Error as mysql_connection_error:
+        print("MySQL data retrieve error: ", mysql_connection_error)
+    except Exception as err:
+        print(err)
+    finally:
+        if mysql_connection:
+            mysql_connection.close()
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Apply only the changed rows of the IMDb dataset to the movies database")
+    parser.add_argument("--csv", type=Path, default=None, help="updated dataset")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="rows per executemany batch")
+    parser.add_argument("--dry-run", action="store_true", help="only report the delta")
+    parser.add_argument("--bootstrap", action="store_true",
+                        help="record fingerprints for a database fully loaded from this dataset before fingerprints existed")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = _parse_arguments()
+    main(arguments.csv, arguments.batch_size, arguments.dry_run, arguments.bootstrap)
@@ -0,0 +1,42 @@
+"""
+This file reproduces the word rules of the InnoDB full-text parser.
+
+Text is split into words of MIN_TOKEN_LENGTH to MAX_TOKEN_LENGTH characters,
+case folded, and the default InnoDB stopwords are dropped. The in-process search
+index and the SQLite backend use the same rules, so a buzzword matches the same
+movies on every engine.
+"""
+
+import re
+
+# innodb_ft_min_token_size / innodb_ft_max_token_size defaults
+MIN_TOKEN_LENGTH = 3
+MAX_TOKEN_LENGTH = 84
+
+# INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD
+STOPWORDS = frozenset([
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how", "i", "in", "is", "it",
+    "la", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "who", "will", "with", "und",
+    "www",
+])
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*")
+
+
+def tokenize(text):
+    """
+    Returns the indexed terms of the text, in order: 'The Space-War of 1999' -> ['space', 'war', '1999']
+    """
+    return [
+        token for token in TOKEN_PATTERN.findall(text.casefold())
+        if MIN_TOKEN_LENGTH <= len(token) <= MAX_TOKEN_LENGTH and token not in STOPWORDS
+    ]
+
+
+def search_terms(words):
+    """
+    Returns the distinct terms of a buzzword or a list of buzzwords
+    """
+    if isinstance(words, str):
+        words = [words]
+    return list(dict.fromkeys(term for word in words for term in tokenize(word)))
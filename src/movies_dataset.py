@@ -0,0 +1,164 @@
+"""
+This file parses the IMDb movies dataset into normalized tables.
+
+The Genre, Director, Stars and Description cells hold python list literals.
+They are parsed once here, with vectorized string operations, into:
+
+    movies          movie_id, title, release_year, duration_minutes, description,
+                    certificate, rating, votes, metascore, revenue, source_key, row_hash
+    certificates    certificate
+    genres          name
+    workers         full_name, role_id
+    movie_genres    movie_id, name
+    movie_workers   movie_id, full_name, role_id
+
+The parsed tables are cached on disk, keyed by the hash of the CSV file,
+so re-runs skip the parsing entirely.
+"""
+
+import hashlib
+from pathlib import Path
+
+from utilities import lazy_import
+
+pd = lazy_import("pandas")
+
+MOVIES_DATASET_FILENAME = "imdb_movies_dataset_10K.csv"
+DATASET_CACHE_DIRECTORY = Path(__file__).resolve().parent / ".dataset_cache"
+
+# Bump when the normalized layout changes so stale cache files are ignored
+NORMALIZED_DATASET_VERSION = 2
+
+ROLE_IDS = {'actor': 2, 'director': 1}
+
+# Columns identifying a movie across dataset versions
+SOURCE_KEY_COLUMNS = ["Movie Name", "Year of Release", "Director", "Run Time in minutes"]
+
+# Columns whose contents make up a movie's fingerprint
+SOURCE_COLUMNS = [
+    "Movie Name", "Year of Release", "Run Time in minutes", "Movie Rating", "Votes", "MetaScore",
+    "Gross", "Genre", "Certification", "Director", "Stars", "Description"
+]
+NUMERIC_SOURCE_COLUMNS = ["Year of Release", "Run Time in minutes", "Movie Rating", "Votes", "MetaScore", "Gross"]
+
+# Matches one quoted item of a python list literal, e.g. 'Drama' or "Conan O'Brien"
+_LIST_ITEM_PATTERN = r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\""
+
+
+def _explode_list_column(column):
+    """
+    Explodes a column of list literals into a series of items indexed by the original row label
+    """
+    items = column.dropna().astype(str).str.findall(_LIST_ITEM_PATTERN).explode().dropna()
+    items = items.str[1:-1]
+    # Only the few items holding escape sequences need unescaping
+    escaped = items.str.contains("\\", regex=False)
+    items[escaped] = items[escaped].str.replace(r"\\(.)", r"\1", regex=True)
+    return items
+
+
+def _join_descriptions(column):
+    words = _explode_list_column(column)
+    descriptions = words.groupby(level=0).agg(" ".join).reindex(column.index)
+    # An empty list literal is an empty description, a missing cell stays missing
+    descriptions = descriptions.where(descriptions.notna() | column.isna(), "")
+    return descriptions.astype(object).where(descriptions.notna(), None)
+
+
+def _explode_names(movies_data_frame, column, movie_ids):
+    names = _explode_list_column(movies_data_frame[column]).str.strip()
+    return pd.DataFrame({
+        "movie_id": movie_ids.loc[names.index].to_numpy(),
+        "name": names.to_numpy()
+    })
+
+
+def _hash_rows(movies_data_frame, columns):
+    """
+    Hashes every row over the given columns into an unsigned 64 bit fingerprint.
+    Values are canonicalized first so a chunk's inferred dtypes do not change the hash.
+    """
+    canonical_columns = {}
+    for column in columns:
+        if column in NUMERIC_SOURCE_COLUMNS:
+            canonical_columns[column] = movies_data_frame[column].astype("float64")
+        else:
+            values = movies_data_frame[column].astype(object)
+            canonical_columns[column] = values.where(values.notna(), "").astype(str)
+    return pd.util.hash_pandas_object(pd.DataFrame(canonical_columns), index=False, categorize=False)
+
+
+def normalize_movies_data_frame(movies_data_frame):
+    """
+    Turns the raw dataset rows into the normalized tables.
+    Movie ids are the row index + 1, the same ids the row-by-row loader assigns.
+    """
+    movie_ids = pd.Series(movies_data_frame.index + 1, index=movies_data_frame.index, dtype="int64")
+
+    movies = pd.DataFrame({
+        "movie_id": movie_ids,
+        "title": movies_data_frame["Movie Name"].astype(str),
+        "release_year": movies_data_frame["Year of Release"].astype("int64"),
+        "duration_minutes": movies_data_frame["Run Time in minutes"].astype("int64"),
+        "description": _join_descriptions(movies_data_frame["Description"]),
+        "certificate": movies_data_frame["Certification"].astype(object).where(movies_data_frame["Certification"].notna(), None),
+        "rating": movies_data_frame["Movie Rating"].astype("float64"),
+        "votes": movies_data_frame["Votes"].astype("Int64"),
+        "metascore": movies_data_frame["MetaScore"].astype("Int64"),
+        "revenue": movies_data_frame["Gross"].astype("float64"),
+        "source_key": _hash_rows(movies_data_frame, SOURCE_KEY_COLUMNS),
+        "row_hash": _hash_rows(movies_data_frame, SOURCE_COLUMNS),
+    }).reset_index(drop=True)
+
+    movie_genres = _explode_names(movies_data_frame, "Genre", movie_ids).drop_duplicates(ignore_index=True)
+
+    directors = _explode_names(movies_data_frame, "Director", movie_ids)
+    directors["role_id"] = ROLE_IDS['director']
+    actors = _explode_names(movies_data_frame, "Stars", movie_ids)
+    actors["role_id"] = ROLE_IDS['actor']
+    movie_workers = pd.concat([directors, actors], ignore_index=True)
+    movie_workers = movie_workers.rename(columns={"name": "full_name"}).drop_duplicates(ignore_index=True)
+
+    certificates = pd.DataFrame({"certificate": movies_data_frame["Certification"].dropna().unique()})
+    genres = pd.DataFrame({"name": movie_genres["name"].drop_duplicates().sort_values(ignore_index=True)})
+    workers = movie_workers[["full_name", "role_id"]].drop_duplicates().sort_values(["full_name", "role_id"], ignore_index=True)
+
+    return {
+        "movies": movies,
+        "certificates": certificates,
+        "genres": genres,
+        "workers": workers,
+        "movie_genres": movie_genres,
+        "movie_workers": movie_workers,
+    }
+
+
+def _file_hash(csv_path):
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as csv_file:
+        for block in iter(lambda: csv_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_normalized_dataset(csv_path=None, use_cache=True):
+    """
+    Returns the normalized tables of the dataset, parsing the CSV only when
+    no cached copy exists for its current contents.
+    """
+    if csv_path is None:
+        csv_path = Path(__file__).resolve().parent / MOVIES_DATASET_FILENAME
+    csv_path = Path(csv_path)
+
+    cache_path = DATASET_CACHE_DIRECTORY / f"{_file_hash(csv_path)}.v{NORMALIZED_DATASET_VERSION}.pkl"
+    if use_cache and cache_path.exists():
+        print(f"Loading parsed dataset from cache: {cache_path.name}")
+        return pd.read_pickle(cache_path)
+
+    print(f"Parsing dataset: {csv_path.name}")
+    normalized_dataset = normalize_movies_data_frame(pd.read_csv(csv_path))
+
+    if use_cache:
+        DATASET_CACHE_DIRECTORY.mkdir(exist_ok=True)
+        pd.to_pickle(normalized_dataset, cache_path)
+    return normalized_dataset
@@ -0,0 +1,184 @@
+"""
+This file implements the in-memory name index over Worker.full_name.
+
+There is one index per role. Names are normalized (case, accents and spacing
+folded) and kept in a dict for exact lookups, in a sorted array for prefix
+lookups and in a trigram index for bounded edit distance lookups. The indexes
+are loaded from the database through the (role_id, full_name) index and
+rebuilt when the ingest generation changes, i.e. after every ingest.
+"""
+
+import bisect
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from movies_dataset import ROLE_IDS
+from query_cache import GENERATION_CHECK_INTERVAL, fetch_ingest_generation
+
+DEFAULT_MAX_DISTANCE = 2
+DEFAULT_MATCHES_LIMIT = 10
+
+
+def normalize_name(name):
+    """
+    Folds case, accents and repeated whitespace: ' Yûgô  Sakô' -> 'yugo sako'
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(character for character in decomposed if not unicodedata.combining(character))
+    return " ".join(stripped.casefold().split())
+
+
+def _trigrams(normalized_name):
+    padded = f"${normalized_name}$"
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(first, second, max_distance):
+    """
+    Levenshtein distance between the strings, or None once it exceeds max_distance
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return None
+    previous_row = list(range(len(second) + 1))
+    for row_index, first_character in enumerate(first, 1):
+        current_row = [row_index]
+        for column_index, second_character in enumerate(second, 1):
+            current_row.append(min(
+                previous_row[column_index] + 1,
+                current_row[column_index - 1] + 1,
+                previous_row[column_index - 1] + (first_character != second_character),
+            ))
+        if min(current_row) > max_distance:
+            return None
+        previous_row = current_row
+    distance = previous_row[-1]
+    return distance if distance <= max_distance else None
+
+
+class NameIndex:
+    """
+    Exact, prefix and bounded edit distance lookups over (worker id, full name) pairs.
+    Every lookup returns (worker id, full name, edit distance) matches.
+    """
+
+    def __init__(self, workers):
+        entries = sorted((normalize_name(full_name), worker_id, full_name) for worker_id, full_name in workers)
+        self._keys = [key for key, _, _ in entries]
+        self._entries = [(worker_id, full_name) for _, worker_id, full_name in entries]
+
+        words = sorted((word, position) for position, key in enumerate(self._keys) for word in key.split()[1:])
+        self._word_keys = [word for word, _ in words]
+        self._word_positions = [position for _, position in words]
+
+        self._exact = defaultdict(list)
+        self._trigram_postings = defaultdict(list)
+        self._positions_by_length = defaultdict(list)
+        for position, key in enumerate(self._keys):
+            self._exact[key].append(position)
+            self._positions_by_length[len(key)].append(position)
+            for trigram in _trigrams(key):
+                self._trigram_postings[trigram].append(position)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _matches(self, positions, distance=0):
+        return [(*self._entries[position], distance) for position in positions]
+
+    def exact(self, name):
+        return self._matches(self._exact.get(normalize_name(name), []))
+
+    def prefix(self, prefix, limit=DEFAULT_MATCHES_LIMIT):
+        """
+        Names starting with the prefix, then names with a later word starting with it, alphabetically
+        """
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        # Every key starting with the prefix sorts before prefix + the largest character
+        upper_bound = key + "\U0010ffff"
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_right(self._keys, upper_bound, lo=start)
+        positions = list(range(start, min(end, start + limit)))
+
+        if len(positions) < limit:
+            word_start = bisect.bisect_left(self._word_keys, key)
+            word_end = bisect.bisect_right(self._word_keys, upper_bound, lo=word_start)
+            word_positions = sorted(set(self._word_positions[word_start:word_end]) - set(positions))
+            positions.extend(word_positions[:limit - len(positions)])
+        return self._matches(positions)
+
+    def fuzzy(self, name, max_distance=DEFAULT_MAX_DISTANCE, limit=DEFAULT_MATCHES_LIMIT):
+        """
+        Names within max_distance edits, closest first
+        """
+        key = normalize_name(name)
+        query_trigrams = _trigrams(key)
+        # An edit changes at most 3 trigrams, closer names share at least this many
+        min_shared_trigrams = len(query_trigrams) - 3 * max_distance
+
+        if min_shared_trigrams > 0:
+            shared_trigrams = Counter()
+            for trigram in query_trigrams:
+                shared_trigrams.update(self._trigram_postings.get(trigram, ()))
+            candidates = [position for position, shared in shared_trigrams.items() if shared >= min_shared_trigrams]
+        else:
+            candidates = [
+                position
+                for length in range(len(key) - max_distance, len(key) + max_distance + 1)
+                for position in self._positions_by_length.get(length, ())
+            ]
+
+        matches = []
+        for position in candidates:
+            distance = bounded_edit_distance(key, self._keys[position], max_distance)
+            if distance is not None:
+                matches.append((distance, self._keys[position], position))
+        matches.sort()
+        return [(*self._entries[position], distance) for distance, _, position in matches[:limit]]
+
+    def resolve(self, name, max_distance=DEFAULT_MAX_DISTANCE, limit=DEFAULT_MATCHES_LIMIT):
+        """
+        The exact matches of the name, else the names it prefixes, else the closest names
+        """
+        if not normalize_name(name):
+            return []
+        return self.exact(name) or self.prefix(name, limit) or self.fuzzy(name, max_distance, limit)
+
+
+def load_name_index(mysql_connection, role_name):
+    """
+    Builds the index of the workers of a role, read in (role_id, full_name) index order
+    """
+    cursor = mysql_connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT worker_id, full_name FROM Worker WHERE role_id = %s ORDER BY full_name;", (ROLE_IDS[role_name],)
+        )
+        return NameIndex(cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+_name_indexes = {}
+_name_indexes_lock = threading.Lock()
+
+
+def get_name_index(mysql_connection, role_name="director"):
+    """
+    Returns the shared index of a role, rebuilt when an ingest completed since it was built
+    """
+    with _name_indexes_lock:
+        cached = _name_indexes.get(role_name)
+        now = time.monotonic()
+        if cached is not None and now - cached["checked_at"] < GENERATION_CHECK_INTERVAL:
+            return cached["index"]
+
+        generation = fetch_ingest_generation(mysql_connection)
+        if cached is None or generation != cached["generation"]:
+            cached = {"index": load_name_index(mysql_connection, role_name), "generation": generation}
+            _name_indexes[role_name] = cached
+        cached["checked_at"] = now
+        return cached["index"]
@@ -0,0 +1,275 @@
+"""
+This file handles parallel data insertion.
+
+The dataset is parsed in a process pool, then every table is loaded as soon as
+the tables it references are loaded. The load order comes from the foreign keys
+in create_db_script._get_tables(), and independent tables are inserted
+concurrently, each over its own connection. A table that fails to load cancels
+the tables depending on it, and the load raises once the other tables are done.
+--compare then empties the loaded tables and loads the dataset again with one
+process and one connection, the same loaders in dependency order, and reports
+the speedup of the parallel load over that baseline.
+"""
+
+import argparse
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import mysql.connector
+import pandas as pd
+
+from api_data_retrieve import (
+    BULK_BATCH_SIZE,
+    bulk_insert_certificates,
+    bulk_insert_genres,
+    bulk_insert_movie_fingerprints,
+    bulk_insert_movie_genre_associations,
+    bulk_insert_movie_metrics,
+    bulk_insert_movie_worker_associations,
+    bulk_insert_movies,
+    bulk_insert_workers,
+    insert_roles
+)
+from create_db_script import _get_tables
+from movies_dataset import MOVIES_DATASET_FILENAME, normalize_movies_data_frame
+from profiling import profile_span
+from summary_tables import refresh_summary_tables
+from utilities import close_connection_pool, configure_connection_pool, mysql_database_name, pooled_connection
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Number of CSV rows handed to each parsing process
+PARSE_CHUNK_SIZE = 2500
+
+
+def _insert_roles(mysql_connection, mysql_cursor, _roles, _batch_size, raise_errors=False):
+    return insert_roles(mysql_connection, mysql_cursor, raise_errors)
+
+
+def _table_loaders():
+    """
+    Maps every table to the function loading it and the normalized table it reads
+    """
+    return {
+        "Certificate": (bulk_insert_certificates, "certificates"),
+        "Genre": (bulk_insert_genres, "genres"),
+        "Movie": (bulk_insert_movies, "movies"),
+        "MovieMetrics": (bulk_insert_movie_metrics, "movies"),
+        "Role": (_insert_roles, None),
+        "Worker": (bulk_insert_workers, "workers"),
+        "MovieWorkerAssociation": (bulk_insert_movie_worker_associations, "movie_workers"),
+        "MovieGenreAssociation": (bulk_insert_movie_genre_associations, "movie_genres"),
+        "MovieFingerprint": (bulk_insert_movie_fingerprints, "movies"),
+    }
+
+
+def table_dependencies():
+    """
+    Returns the foreign key dependency graph: table name -> tables it references
+    """
+    dependencies = {}
+    for table_name, table_creation_statement in _get_tables().items():
+        referenced_tables = set(re.findall(r"REFERENCES\s+(\w+)", table_creation_statement))
+        referenced_tables.discard(table_name)
+        dependencies[table_name] = referenced_tables
+    return dependencies
+
+
+def _read_chunks(csv_path, chunk_size):
+    return list(pd.read_csv(csv_path, chunksize=chunk_size))
+
+
+def parse_dataset_in_parallel(csv_path, workers=DEFAULT_WORKERS, chunk_size=PARSE_CHUNK_SIZE):
+    """
+    Normalizes the dataset chunks in a process pool and merges them into one set of tables
+    """
+    chunks = _read_chunks(csv_path, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        normalized_chunks = list(executor.map(normalize_movies_data_frame, chunks))
+
+    normalized_dataset = {
+        table_name: pd.concat([chunk[table_name] for chunk in normalized_chunks], ignore_index=True)
+        for table_name in normalized_chunks[0]
+    }
+    # Dimensions were deduplicated per chunk only
+    normalized_dataset["certificates"] = normalized_dataset["certificates"].drop_duplicates(ignore_index=True)
+    normalized_dataset["genres"] = normalized_dataset["genres"].drop_duplicates().sort_values("name", ignore_index=True)
+    normalized_dataset["workers"] = normalized_dataset["workers"].drop_duplicates().sort_values(
+        ["full_name", "role_id"], ignore_index=True
+    )
+    return normalized_dataset
+
+
+def _load_table(table_name, normalized_dataset, batch_size):
+    """
+    Loads one table over its own connection, returns (rows written, seconds)
+    """
+    loader, dataset_table = _table_loaders()[table_name]
+    started_at = time.perf_counter()
+    with pooled_connection() as mysql_connection, profile_span("stage", table_name, mysql_connection) as record:
+        mysql_cursor = mysql_connection.cursor()
+        try:
+            rows_count = loader(mysql_connection, mysql_cursor, normalized_dataset.get(dataset_table), batch_size, raise_errors=True)
+        finally:
+            mysql_cursor.close()
+        if record is not None:
+            record["rows"] = rows_count
+    return rows_count, time.perf_counter() - started_at
+
+
+def _cancel_dependent_tables(pending, failed_table):
+    """
+    Removes the pending tables depending on failed_table, directly or not, and returns their names
+    """
+    blocked_tables = {failed_table}
+    cancelled_tables = []
+    while True:
+        dependent_tables = [table_name for table_name, dependencies in pending.items() if dependencies & blocked_tables]
+        if not dependent_tables:
+            return cancelled_tables
+        for table_name in dependent_tables:
+            del pending[table_name]
+        blocked_tables.update(dependent_tables)
+        cancelled_tables.extend(dependent_tables)
+
+
+def load_tables_in_parallel(normalized_dataset, workers=DEFAULT_WORKERS, batch_size=BULK_BATCH_SIZE):
+    """
+    Loads every table once the tables it references are loaded, up to `workers` tables at a time.
+    Returns table name -> (rows written, seconds), raises RuntimeError when a table failed to load.
+    """
+    configure_connection_pool(size=workers)
+    pending = table_dependencies()
+    completed = {}
+    failed = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            ready_tables = [table_name for table_name, dependencies in pending.items() if dependencies <= completed.keys()]
+            for table_name in ready_tables:
+                del pending[table_name]
+                print(f"Loading {table_name}.")
+                running[executor.submit(_load_table, table_name, normalized_dataset, batch_size)] = table_name
+
+            if not running:
+                raise RuntimeError(f"Unresolvable table dependencies: {pending}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                table_name = running.pop(future)
+                try:
+                    completed[table_name] = future.result()
+                except Exception as error:
+                    failed[table_name] = error
+                    cancelled_tables = _cancel_dependent_tables(pending, table_name)
+                    print(f"{table_name} failed: {error}."
+                          + (f" Cancelled {', '.join(cancelled_tables)}." if cancelled_tables else ""))
+                    continue
+                rows_count, elapsed = completed[table_name]
+                print(f"{table_name} loaded: {rows_count} rows in {elapsed:.2f}s.")
+
+    if failed:
+        raise RuntimeError(f"Failed to load {', '.join(failed)}: " + "; ".join(str(error) for error in failed.values()))
+    return completed
+
+
+def _clear_loaded_tables(table_names):
+    """
+    Deletes the rows of the tables, given in load order, so the tables referencing others go first
+    """
+    with pooled_connection() as mysql_connection:
+        mysql_cursor = mysql_connection.cursor()
+        try:
+            mysql_cursor.execute(f"USE {mysql_database_name()};")
+            for table_name in reversed(table_names):
+                mysql_cursor.execute(f"DELETE FROM {table_name};")
+            mysql_connection.commit()
+        finally:
+            mysql_cursor.close()
+
+
+def load_sequentially(csv_path, batch_size=BULK_BATCH_SIZE):
+    """
+    The baseline of the parallel load: parses the dataset in this process and loads one table at a time.
+    Returns (parse seconds, load seconds).
+    """
+    started_at = time.perf_counter()
+    normalized_dataset = normalize_movies_data_frame(pd.read_csv(csv_path))
+    parse_elapsed = time.perf_counter() - started_at
+    load_started_at = time.perf_counter()
+    load_tables_in_parallel(normalized_dataset, workers=1, batch_size=batch_size)
+    return parse_elapsed, time.perf_counter() - load_started_at
+
+
+def _speedup(baseline_elapsed, parallel_elapsed):
+    return baseline_elapsed / parallel_elapsed if parallel_elapsed > 0 else 0.0
+
+
+def main(workers=DEFAULT_WORKERS, batch_size=BULK_BATCH_SIZE, csv_path=None, compare=False):
+    """
+    handles parallel data insertion,
+    compare times a sequential load of the same dataset after the parallel one and reports the speedup
+    """
+    if csv_path is None:
+        csv_path = Path(__file__).resolve().parent / MOVIES_DATASET_FILENAME
+
+    try:
+        started_at = time.perf_counter()
+        normalized_dataset = parse_dataset_in_parallel(csv_path, workers)
+        parse_elapsed = time.perf_counter() - started_at
+        print(f"Dataset parsed with {workers} processes in {parse_elapsed:.2f}s.")
+
+        load_started_at = time.perf_counter()
+        stage_timings = load_tables_in_parallel(normalized_dataset, workers, batch_size)
+        load_elapsed = time.perf_counter() - load_started_at
+        total_elapsed = time.perf_counter() - started_at
+
+        if compare:
+            # Run second, the baseline reads a warm CSV and database cache, so the speedup is rather understated
+            print("\nEmptying the loaded tables for the sequential baseline.")
+            _clear_loaded_tables(list(stage_timings))
+            baseline_parse_elapsed, baseline_load_elapsed = load_sequentially(csv_path, batch_size)
+
+        with pooled_connection() as mysql_connection:
+            refresh_summary_tables(mysql_connection)
+
+        # Stages slow each other down when they overlap, the sum of their times is not the time of a sequential load
+        stages_elapsed = sum(elapsed for _, elapsed in stage_timings.values())
+        print("\nStage wall-clock times:")
+        for table_name, (rows_count, elapsed) in stage_timings.items():
+            print(f"  {table_name}: {elapsed:.2f}s ({rows_count} rows)")
+        print(f"Load wall-clock: {load_elapsed:.2f}s, sum of stages: {stages_elapsed:.2f}s, "
+              f"average stages running at once: {stages_elapsed / load_elapsed if load_elapsed > 0 else 0:.2f}")
+        print(f"Parse and load wall-clock: {total_elapsed:.2f}s")
+        if compare:
+            baseline_elapsed = baseline_parse_elapsed + baseline_load_elapsed
+            print(f"Sequential baseline: parse {baseline_parse_elapsed:.2f}s, load {baseline_load_elapsed:.2f}s, "
+                  f"total {baseline_elapsed:.2f}s")
+            print(f"Speedup with {workers} workers: parse {_speedup(baseline_parse_elapsed, parse_elapsed):.2f}x, "
+                  f"load {_speedup(baseline_load_elapsed, load_elapsed):.2f}x, "
+                  f"total {_speedup(baseline_elapsed, total_elapsed):.2f}x")
+    except mysql.connector.Error as mysql_connection_error:
+        print("MySQL data retrieve error: ", mysql_connection_error)
+    except Exception as err:
+        print(err)
+    finally:
+        close_connection_pool()
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Load the IMDb dataset with concurrent table loads")
+    parser.add_argument("--csv", type=Path, default=None, help="dataset to load")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="parsing processes and concurrent connections")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="rows per executemany batch")
+    parser.add_argument("--compare", action="store_true",
+                        help="also time a sequential load of the dataset (the loaded tables are emptied first) and report the speedup")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = _parse_arguments()
+    main(arguments.workers, arguments.batch_size, arguments.csv, arguments.compare)
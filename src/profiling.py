@@ -0,0 +1,257 @@
+"""
+This file implements the profiling hooks of the queries and the loader stages.
+
+A span records one query execution or loader stage: its wall time, the time of
+its phases (fetching the rows, building the DataFrame), and the deltas of the
+server counters of its connection: server execution time and rows sent and
+examined (performance_schema statement summaries of the session) plus handler,
+temporary table and sort counters (session status). The cost of reading the
+counters is measured once per connection and subtracted.
+
+Profiling is off until configure_profiling(enabled=True). Records are kept in
+memory for profiling_records() / profiling_summary() and, when a log path is
+given, written as JSON lines.
+"""
+
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+
+import mysql.connector
+
+from utilities import lazy_import
+
+pd = lazy_import("pandas")
+
+MAX_PROFILE_RECORDS = 10000
+
+SESSION_STATUS_COUNTERS = [
+    "Bytes_sent", "Created_tmp_disk_tables", "Created_tmp_tables", "Handler_read_first", "Handler_read_key",
+    "Handler_read_next", "Handler_read_rnd_next", "Select_full_join", "Select_scan", "Sort_rows",
+]
+
+_STATEMENT_COUNTERS_QUERY = """
+    SELECT SUM(SUM_TIMER_WAIT), SUM(SUM_ROWS_SENT), SUM(SUM_ROWS_EXAMINED), SUM(COUNT_STAR)
+    FROM performance_schema.events_statements_summary_by_thread_by_event_name
+    WHERE THREAD_ID = PS_CURRENT_THREAD_ID();
+"""
+
+_logger = logging.getLogger("movies.profile")
+
+
+def _server_counters(mysql_connection):
+    """
+    Returns the cumulative counters of the session, without the ones the server can't provide
+    """
+    counters = {}
+    cursor = mysql_connection.cursor()
+    try:
+        try:
+            cursor.execute(_STATEMENT_COUNTERS_QUERY)
+            timer_wait, rows_sent, rows_examined, statements = cursor.fetchone()
+            if timer_wait is not None:
+                # performance_schema timers are in picoseconds
+                counters["server_seconds"] = float(timer_wait) / 1e12
+                counters["rows_sent"] = int(rows_sent)
+                counters["rows_examined"] = int(rows_examined)
+                counters["statements"] = int(statements)
+        except mysql.connector.Error:
+            pass
+
+        placeholders = ", ".join(["%s"] * len(SESSION_STATUS_COUNTERS))
+        try:
+            cursor.execute(f"SHOW SESSION STATUS WHERE Variable_name IN ({placeholders});", SESSION_STATUS_COUNTERS)
+            for name, value in cursor.fetchall():
+                counters[name] = int(value)
+        except mysql.connector.Error:
+            pass
+    finally:
+        cursor.close()
+    return counters
+
+
+def _counter_deltas(before, after, overhead):
+    return {
+        name: max(after[name] - before[name] - overhead.get(name, 0), 0)
+        for name in after if name in before
+    }
+
+
+class Profiler:
+    """
+    Collects the profiling records of the spans run while it is enabled
+    """
+
+    def __init__(self, enabled=False, max_records=MAX_PROFILE_RECORDS):
+        self.enabled = enabled
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Keyed by the connection itself: an entry goes away with its connection, and a new connection
+        # taking the id of a discarded one does not inherit its overhead
+        self._overheads = weakref.WeakKeyDictionary()
+
+    def _counter_overhead(self, mysql_connection):
+        # Reading the counters is itself counted, measure it once per connection
+        overhead = self._overheads.get(mysql_connection)
+        if overhead is None:
+            first = _server_counters(mysql_connection)
+            second = _server_counters(mysql_connection)
+            overhead = self._overheads[mysql_connection] = _counter_deltas(first, second, {})
+        return overhead
+
+    def _span_stack(self):
+        if not hasattr(self._local, "spans"):
+            self._local.spans = []
+        return self._local.spans
+
+    @contextlib.contextmanager
+    def span(self, kind, name, mysql_connection=None, **details):
+        """
+        Profiles the block as one `kind` ("query" or "stage") record named `name`
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        record = {"kind": kind, "name": name, "phases": {}, **details}
+        counters_before = None
+        if mysql_connection is not None:
+            overhead = self._counter_overhead(mysql_connection)
+            counters_before = _server_counters(mysql_connection)
+
+        span_stack = self._span_stack()
+        span_stack.append(record)
+        started_at = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - started_at
+            span_stack.pop()
+            if counters_before is not None:
+                record["server"] = _counter_deltas(counters_before, _server_counters(mysql_connection), overhead)
+            record["finished_at"] = time.time()
+            with self._lock:
+                self._records.append(record)
+            _logger.info(json.dumps(record, default=str))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Adds the time of the block to the phase `name` of the innermost running span
+        """
+        span_stack = self._span_stack() if self.enabled else None
+        if not span_stack:
+            yield
+            return
+        record = span_stack[-1]
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["phases"][name] = record["phases"].get(name, 0.0) + time.perf_counter() - started_at
+
+    def records(self, kind=None, name=None):
+        with self._lock:
+            return [
+                record for record in self._records
+                if (kind is None or record["kind"] == kind) and (name is None or record["name"] == name)
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+_profiler = Profiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+def configure_profiling(enabled=True, log_path=None):
+    """
+    Enables or disables profiling, writing the records as JSON lines to log_path ('-' for stderr) when given
+    """
+    if enabled:
+        # Imported now, not in the build_data_frame phase of the first profiled query
+        pd.DataFrame
+    _profiler.enabled = enabled
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
+    if enabled and log_path is not None:
+        handler = logging.StreamHandler(sys.stderr) if str(log_path) == "-" else logging.FileHandler(log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    return _profiler
+
+
+def profile_span(kind, name, mysql_connection=None, **details):
+    return _profiler.span(kind, name, mysql_connection, **details)
+
+
+def profile_phase(name):
+    return _profiler.phase(name)
+
+
+def profiling_records(kind=None, name=None):
+    """
+    Returns the records of the profiled spans, optionally only those of one kind and/or name
+    """
+    return _profiler.records(kind, name)
+
+
+def profiling_summary(kind=None):
+    """
+    Returns one row per (kind, name) with the call count and the wall, phase and server time statistics
+    """
+    rows = []
+    for record in profiling_records(kind):
+        row = {"kind": record["kind"], "name": record["name"], "wall_seconds": record["wall_seconds"]}
+        row.update({f"{phase}_seconds": elapsed for phase, elapsed in record["phases"].items()})
+        row.update(record.get("server", {}))
+        rows.append(row)
+    if not rows:
+        return pd.DataFrame()
+
+    records_data_frame = pd.DataFrame(rows)
+    grouped = records_data_frame.groupby(["kind", "name"])
+    summary = grouped["wall_seconds"].agg(calls="count", wall_mean="mean", wall_p95=lambda wall: wall.quantile(0.95), wall_max="max")
+    other_columns = [column for column in records_data_frame.columns if column not in ("kind", "name", "wall_seconds")]
+    if other_columns:
+        summary = summary.join(grouped[other_columns].mean().add_suffix("_mean"))
+    return summary.reset_index()
+
+
+def profiled_query(query_function):
+    """
+    Profiles every call of a query function taking a `mysql_connection` argument
+    """
+    signature = inspect.signature(query_function)
+
+    @functools.wraps(query_function)
+    def wrapper(*args, **kwargs):
+        if not _profiler.enabled:
+            return query_function(*args, **kwargs)
+        bound_arguments = signature.bind(*args, **kwargs)
+        mysql_connection = bound_arguments.arguments.get("mysql_connection")
+        parameters = {name: value for name, value in bound_arguments.arguments.items() if name != "mysql_connection"}
+        with profile_span("query", query_function.__name__, mysql_connection, parameters=parameters) as record:
+            result = query_function(*args, **kwargs)
+            record["rows"] = None if result is None else len(result)
+            # A result served by the query cache fetched nothing
+            record["cached"] = "fetch" not in record["phases"]
+            return result
+
+    return wrapper
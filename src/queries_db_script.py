@@ -3,115 +3,111 @@ Queries database Script implmentation
 """
 
 import mysql.connector
-import pandas as pd
-import matplotlib
-matplotlib.use('TkAgg')  # or another backend that works on your system
 
+from fulltext import search_terms
+from profiling import profile_phase, profiled_query
+from query_cache import cached_query
+from result_frames import fetch_data_frame, result_cursor
+from search_index import SEARCH_MODES, get_search_index
+from utilities import lazy_import, with_pooled_connection
 
-def query_1(mysql_connection):
+pd = lazy_import("pandas")
+
+# query_4 / query_5 run on MySQL full-text search or on the in-process search_index
+SEARCH_ENGINES = ("mysql", "index")
+
+# query_2 and query_2_trend count their years back from this year
+QUERY_2_CURRENT_YEAR = 2023
+
+# Column dtypes of the query_5 and query_5_batch rows, see result_frames.fetch_data_frame
+QUERY_5_DTYPES = {"title": "str", "directors": "str", "revenue": "int64", "average_revenue": "float64"}
+
+
+@with_pooled_connection
+@profiled_query
+@cached_query
+def query_1(mysql_connection=None, years=None, last_year=2022):
     """
     Fetch top genre by year.
-    Show table of top genres by year by revenue.
+    Show table of top genres by year by revenue, for the last `years` years up to last_year (all years when None).
+    Reads the GenreYearRevenue summary maintained at ingest.
     """
     query = """
     SELECT 
-        yearly_revenue.release_year AS 'Year',
+        GYR.release_year AS 'Year',
         G.name AS 'Top Genre',
-        yearly_revenue.max_revenue AS 'Max Revenue'
+        GYR.max_revenue AS 'Max Revenue'
     FROM
-        (
-            SELECT 
-                M.release_year,
-                MGA.genre_id,
-                MAX(total_revenue) AS max_revenue
-            FROM 
-                Movie M
-            JOIN MovieMetrics MM ON M.metrics_id = MM.metrics_id
-            JOIN MovieGenreAssociation MGA ON M.movie_id = MGA.movie_id
-            JOIN (
-                SELECT 
-                    M2.movie_id,
-                    SUM(MM2.revenue) AS total_revenue
-                FROM 
-                    Movie M2
-                JOIN MovieMetrics MM2 ON M2.metrics_id = MM2.metrics_id
-                GROUP BY M2.movie_id
-            ) AS yearly_totals ON M.movie_id = yearly_totals.movie_id
-            GROUP BY M.release_year, MGA.genre_id
-        ) AS yearly_revenue
-    JOIN Genre G ON yearly_revenue.genre_id = G.genre_id
-    WHERE EXISTS (
-        SELECT 1
-        FROM
-            (
-                SELECT 
-                    M.release_year,
-                    MAX(total_revenue) AS max_revenue
-                FROM 
-                    Movie M
-                JOIN MovieMetrics MM ON M.metrics_id = MM.metrics_id
-                JOIN MovieGenreAssociation MGA ON M.movie_id = MGA.movie_id
-                JOIN (
-                    SELECT 
-                        M2.movie_id,
-                        SUM(MM2.revenue) AS total_revenue
-                    FROM 
-                        Movie M2
-                    JOIN MovieMetrics MM2 ON M2.metrics_id = MM2.metrics_id
-                    GROUP BY M2.movie_id
-                ) AS yearly_totals ON M.movie_id = yearly_totals.movie_id
-                GROUP BY M.release_year
-            ) AS max_revenue_per_year
-        WHERE
-            yearly_revenue.release_year = max_revenue_per_year.release_year AND
-            yearly_revenue.max_revenue = max_revenue_per_year.max_revenue
-    )
-    ORDER BY yearly_revenue.release_year DESC;
+        GenreYearRevenue GYR
+    JOIN (
+        SELECT 
+            release_year,
+            MAX(max_revenue) AS max_revenue
+        FROM 
+            GenreYearRevenue
+        WHERE 
+            release_year BETWEEN %s AND %s
+        GROUP BY release_year
+    ) AS max_revenue_per_year ON
+        GYR.release_year = max_revenue_per_year.release_year AND
+        GYR.max_revenue = max_revenue_per_year.max_revenue
+    JOIN Genre G ON GYR.genre_id = G.genre_id
+    ORDER BY GYR.release_year DESC;
     """
+    if years is None:
+        start_year, end_year = 0, last_year
+    else:
+        start_year, end_year = last_year - int(years) + 1, last_year
 
+    cursor = None
     try:
-        cursor = mysql_connection.cursor()
-        cursor.execute(query)
-
-        # Fetch the results
-        rows = cursor.fetchall()
-
-        # Get column names
-        columns = [i[0] for i in cursor.description]
+        cursor = result_cursor(mysql_connection)
+        cursor.execute(query, (start_year, end_year))
 
-        # Create DataFrame from the fetched data
-        df = pd.DataFrame(rows, columns=columns)
+        # Fetch the results into a DataFrame
+        df = fetch_data_frame(cursor, {"Year": "int64", "Top Genre": "str", "Max Revenue": "int64"})
 
         # Print the DataFrame
         return df
     except mysql.connector.Error as error:
         print("Error while executing SQL query:", error)
+    finally:
+        if cursor is not None:
+            cursor.close()
 
 
-def fetch_genres(mysql_connection):
+@with_pooled_connection
+@profiled_query
+@cached_query
+def fetch_genres(mysql_connection=None):
     """
     Fetch the Genres names
     """
     query = "SELECT name FROM Genre ORDER BY name;"
+    cursor = None
     try:
         cursor = mysql_connection.cursor()
         cursor.execute(query)
-        genres = [item[0] for item in cursor.fetchall()]
-        cursor.close()
+        with profile_phase("fetch"):
+            genres = [item[0] for item in cursor.fetchall()]
         return genres
     except mysql.connector.Error as error:
         print("Error fetching genres:", error)
         return []
+    finally:
+        if cursor is not None:
+            cursor.close()
 
 
-def query_2(genre, years, mysql_connection):
+@with_pooled_connection
+@profiled_query
+@cached_query
+def query_2(genre, years, mysql_connection=None):
     """
     Revenue and rating by year according to genre
     """
-    cursor = mysql_connection.cursor()
-    current_year = 2023
     years = int(years)
-    start_year = current_year - years
+    start_year = QUERY_2_CURRENT_YEAR - years
 
     query = f"""
     SELECT 
@@ -120,7 +116,7 @@ def query_2(genre, years, mysql_connection):
         MM.rating AS 'Rating'
     FROM
         Movie M
-    JOIN MovieMetrics MM ON M.metrics_id = MM.metrics_id
+    JOIN MovieMetrics MM ON M.movie_id = MM.movie_id
     JOIN MovieGenreAssociation MGA ON M.movie_id = MGA.movie_id
     JOIN Genre G ON MGA.genre_id = G.genre_id
     WHERE 
@@ -130,11 +126,10 @@ def query_2(genre, years, mysql_connection):
         M.release_year;
     """
 
+    cursor = result_cursor(mysql_connection)
     try:
         cursor.execute(query, (genre,))
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns)
+        df = fetch_data_frame(cursor, {"Year": "int64", "Revenue": "float64", "Rating": "float64"})
 
         if df.empty:
             print(f"No data found for the specified genre in the last {years} years.")
@@ -152,47 +147,90 @@ def query_2(genre, years, mysql_connection):
             cursor.close()
 
 
-def query_3(mysql_connection):
+@with_pooled_connection
+@profiled_query
+@cached_query
+def query_2_trend(genre, years, mysql_connection=None):
     """
-    Display directors ordered by Average meta score of their movies
+    Average revenue and rating per year of the genre, aggregated by the database.
+    Averages skip missing values like a pandas group-by mean, the count columns tell how many movies each average covers.
     """
+    years = int(years)
+    start_year = QUERY_2_CURRENT_YEAR - years
+
+    query = """
+    SELECT
+        M.release_year AS 'Year',
+        AVG(MM.revenue) AS 'Average Revenue',
+        AVG(MM.rating) AS 'Average Rating',
+        COUNT(*) AS 'Movies',
+        COUNT(MM.revenue) AS 'Movies With Revenue',
+        COUNT(MM.rating) AS 'Movies With Rating'
+    FROM
+        Genre G
+    JOIN MovieGenreAssociation MGA ON G.genre_id = MGA.genre_id
+    JOIN Movie M ON MGA.movie_id = M.movie_id
+    JOIN MovieMetrics MM ON M.movie_id = MM.movie_id
+    WHERE
+        G.name = %s AND
+        M.release_year >= %s
+    GROUP BY
+        M.release_year
+    ORDER BY
+        M.release_year;
+    """
+
+    cursor = result_cursor(mysql_connection)
     try:
-        cursor = mysql_connection.cursor()
-        # Increase the maximum length for GROUP_CONCAT to avoid truncation
-        cursor.execute("SET SESSION group_concat_max_len = 55000;")  # Adjust based on your needs
+        cursor.execute(query, (genre, start_year))
+        df = fetch_data_frame(cursor, {
+            "Year": "int64",
+            "Average Revenue": "float64",
+            "Average Rating": "float64",
+            "Movies": "int64",
+            "Movies With Revenue": "int64",
+            "Movies With Rating": "int64",
+        })
 
-        query = """
-        SELECT 
-            D.full_name AS Director,
-            GROUP_CONCAT(A.full_name ORDER BY SubA.AVG_A_Metascore DESC SEPARATOR ', ') AS Actors_List
-        FROM
-            Worker D
-        JOIN MovieWorkerAssociation MWA_Director ON D.worker_id = MWA_Director.worker_id
-        JOIN Role RD ON D.role_id = RD.role_id AND RD.name = 'director'
-        JOIN Movie M ON MWA_Director.movie_id = M.movie_id
-        JOIN MovieMetrics MM ON M.metrics_id = MM.metrics_id
-        JOIN MovieWorkerAssociation MWA_Actor ON M.movie_id = MWA_Actor.movie_id
-        JOIN Worker A ON MWA_Actor.worker_id = A.worker_id
-        JOIN Role RA ON A.role_id = RA.role_id AND RA.name = 'actor'
-        JOIN (
-            SELECT 
-                M2.movie_id,
-                MWA_Actor.worker_id,
-                AVG(MM.metascore) AS AVG_A_Metascore
-            FROM 
-                MovieWorkerAssociation MWA_Actor
-            JOIN Movie M2 ON MWA_Actor.movie_id = M2.movie_id
-            JOIN MovieMetrics MM ON M2.metrics_id = MM.metrics_id
-            GROUP BY M2.movie_id, MWA_Actor.worker_id
-        ) SubA ON SubA.movie_id = M.movie_id AND SubA.worker_id = A.worker_id
-        GROUP BY D.full_name
-        ORDER BY AVG(MM.metascore) DESC;
-        """
+        if df.empty:
+            print(f"No data found for the specified genre in the last {years} years.")
+            return
+
+        return df
+
+    except mysql.connector.Error as error:
+        print("Error while executing SQL query:", error)
+    finally:
+        if cursor is not None:
+            cursor.close()
+
+
+@with_pooled_connection
+@profiled_query
+@cached_query
+def query_3(mysql_connection=None):
+    """
+    Display directors ordered by Average meta score of their movies.
+    Reads the DirectorMetascore summary maintained at ingest, the actors of a director
+    come from director_actors().
+    """
+    query = """
+    SELECT
+        D.full_name AS Director,
+        DM.avg_metascore AS 'Average Metascore',
+        DM.director_id AS 'Director Id'
+    FROM
+        DirectorMetascore DM
+    JOIN Worker D ON DM.director_id = D.worker_id
+    ORDER BY DM.avg_metascore DESC;
+    """
+
+    cursor = None
+    try:
+        cursor = result_cursor(mysql_connection)
         cursor.execute(query)
 
-        rows = cursor.fetchall()
-        columns = [i[0] for i in cursor.description]  # Extract column headers for the DataFrame
-        df = pd.DataFrame(rows, columns=columns)
+        df = fetch_data_frame(cursor, {"Director": "str", "Average Metascore": "float64", "Director Id": "int64"})
 
         return df
     except mysql.connector.Error as e:
@@ -202,43 +240,105 @@ def query_3(mysql_connection):
             cursor.close()  # Ensure the cursor is closed after the operation
 
 
-def query_4(buzzwords, mysql_connection):
+@with_pooled_connection
+@profiled_query
+@cached_query
+def director_actors(director_id, top_n=None, mysql_connection=None):
+    """
+    The actors the director worked with, ordered by the average meta score of their movies together,
+    only the first top_n when given. Reads the director's DirectorActorCollaboration rows by primary key.
+    """
+    query = """
+    SELECT
+        A.full_name AS Actor,
+        DAC.avg_metascore AS 'Average Metascore',
+        DAC.movies_count AS Movies
+    FROM
+        DirectorActorCollaboration DAC
+    JOIN Worker A ON DAC.actor_id = A.worker_id
+    WHERE
+        DAC.director_id = %s AND
+        DAC.actor_rank <= %s
+    ORDER BY DAC.actor_rank;
+    """
+    # Ranks start at 1, an unbounded lookup compares against the largest rank
+    max_rank = top_n if top_n is not None else 2 ** 32 - 1
+
+    cursor = None
+    try:
+        cursor = result_cursor(mysql_connection)
+        cursor.execute(query, (director_id, max_rank))
+
+        df = fetch_data_frame(cursor, {"Actor": "str", "Average Metascore": "float64", "Movies": "int64"})
+
+        return df
+    except mysql.connector.Error as e:
+        print("Error executing query:", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+
+
+def _check_search_engine(engine):
+    if engine not in SEARCH_ENGINES:
+        raise ValueError(f"Unknown search engine {engine}, expected one of {', '.join(SEARCH_ENGINES)}")
+
+
+@with_pooled_connection
+@profiled_query
+@cached_query
+def query_4(buzzwords, mysql_connection=None, engine="mysql", mode="any"):
     """
-    Display the TOP 20 movies containing any of the buzzwords, and their descriptions
+    Display the TOP 20 movies containing any (or all, with mode="all") of the buzzwords, and their descriptions
     """
-    buzzwords_boolean_query = " | ".join(buzzwords)
+    _check_search_engine(engine)
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode}, expected one of {', '.join(SEARCH_MODES)}")
+    if engine == "index":
+        return get_search_index(mysql_connection).search_top_movies(buzzwords, mode, limit=20)
+
+    # Boolean mode: plain terms match any of them, +terms must all match
+    term_prefix = "+" if mode == "all" else ""
+    buzzwords_boolean_query = " ".join(term_prefix + term for term in search_terms(buzzwords))
     query = """
         SELECT Movie.title as title, Movie.description as description, MovieMetrics.metascore as metascore
         FROM Movie, MovieMetrics
-        WHERE MATCH(Movie.description) AGAINST ("%s")
-            AND Movie.metrics_id = MovieMetrics.metrics_id
+        WHERE MATCH(Movie.description) AGAINST (%s IN BOOLEAN MODE)
+            AND Movie.movie_id = MovieMetrics.movie_id
             AND MovieMetrics.metascore IS NOT NULL
         ORDER BY MovieMetrics.metascore desc
         LIMIT 20;
     """
 
+    cursor = None
     try:
-        cursor = mysql_connection.cursor()
+        cursor = result_cursor(mysql_connection)
         cursor.execute(query, (buzzwords_boolean_query,))
 
-        rows = cursor.fetchall()
-        columns = [i[0] for i in cursor.description]  # Get column headers
-
         # Create DataFrame from fetched data
-        df = pd.DataFrame(rows, columns=columns)
-        cursor.close()
+        df = fetch_data_frame(cursor, {"title": "str", "description": "str", "metascore": "int64"})
         return df
     except mysql.connector.Error as e:
         print("Error executing query:", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
 
 
-def query_5(buzzword, mysql_connection):
+@with_pooled_connection
+@profiled_query
+@cached_query
+def query_5(buzzword, mysql_connection=None, engine="mysql"):
     """
     Show metrics on movie that contains the buzzword and has more than average revenue, shows the revenue and director.
     """
+    _check_search_engine(engine)
+    if engine == "index":
+        return get_search_index(mysql_connection).above_average_revenue(buzzword)
+
     query = """
     WITH RelevantMovies AS (
-        SELECT movie_id, metrics_id, title
+        SELECT movie_id, title
         From Movie
         WHERE MATCH(description) AGAINST (%s)
     ),
@@ -246,7 +346,7 @@ def query_5(buzzword, mysql_connection):
         Select RelevantMovies.movie_id, RelevantMovies.title, MovieMetrics.revenue,
         AVG(MovieMetrics.revenue) OVER () AS average_revenue
         From RelevantMovies, MovieMetrics
-        WHERE RelevantMovies.metrics_id = MovieMetrics.metrics_id
+        WHERE RelevantMovies.movie_id = MovieMetrics.movie_id
         AND MovieMetrics.revenue IS NOT NULL
     ),
     RelevantRevenueMovies AS (
@@ -266,16 +366,82 @@ def query_5(buzzword, mysql_connection):
         WHERE RRM.movie_id = RMD.movie_id
     """
 
+    cursor = None
     try:
-        cursor = mysql_connection.cursor()
+        cursor = result_cursor(mysql_connection)
         cursor.execute(query, (buzzword,))
 
-        rows = cursor.fetchall()
-        columns = [i[0] for i in cursor.description]  # Get column headers
-
         # Create DataFrame from fetched data
-        df = pd.DataFrame(rows, columns=columns)
-        cursor.close()
+        df = fetch_data_frame(cursor, QUERY_5_DTYPES)
         return df
     except mysql.connector.Error as e:
         print("Error executing query:", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+
+
+@with_pooled_connection
+@profiled_query
+@cached_query
+def query_5_batch(buzzwords, mysql_connection=None, engine="mysql"):
+    """
+    query_5 for every buzzword in one statement: each buzzword's movies with more than that buzzword's average revenue.
+    Returns one DataFrame keyed by the buzzword column.
+    """
+    _check_search_engine(engine)
+    buzzwords = list(dict.fromkeys(buzzwords))
+    if engine == "index":
+        return get_search_index(mysql_connection).above_average_revenue_batch(buzzwords)
+    if not buzzwords:
+        return pd.DataFrame(columns=["buzzword", "title", "directors", "revenue", "average_revenue"])
+
+    # AGAINST only takes a constant, every buzzword gets its own full-text lookup. The averages share
+    # one windowed pass and the directors are concatenated once per movie, whatever its number of buzzwords.
+    relevant_movies = "\n        UNION ALL\n".join(
+        f"        SELECT {term_index} AS term_index, movie_id FROM Movie WHERE MATCH(description) AGAINST (%s)"
+        for term_index in range(len(buzzwords))
+    )
+    query = f"""
+    WITH RelevantMovies AS (
+{relevant_movies}
+    ),
+    RelevantMoviesWithRevenue AS (
+        SELECT RelevantMovies.term_index, RelevantMovies.movie_id, MovieMetrics.revenue,
+        AVG(MovieMetrics.revenue) OVER (PARTITION BY RelevantMovies.term_index) AS average_revenue
+        FROM RelevantMovies, MovieMetrics
+        WHERE RelevantMovies.movie_id = MovieMetrics.movie_id
+        AND MovieMetrics.revenue IS NOT NULL
+    ),
+    RelevantRevenueMovies AS (
+        SELECT * FROM RelevantMoviesWithRevenue
+        WHERE RelevantMoviesWithRevenue.revenue > RelevantMoviesWithRevenue.average_revenue
+    ),
+    RelevantMovieDirectors AS (
+        SELECT MWA.movie_id, GROUP_CONCAT(Worker.full_name) AS directors
+        FROM MovieWorkerAssociation MWA, Worker
+        WHERE MWA.movie_id IN (SELECT movie_id FROM RelevantRevenueMovies)
+        AND MWA.worker_id = Worker.worker_id
+        AND Worker.role_id = 2
+        GROUP BY MWA.movie_id
+    )
+    SELECT RRM.term_index, Movie.title, RMD.directors, RRM.revenue, RRM.average_revenue
+        FROM RelevantRevenueMovies RRM, RelevantMovieDirectors RMD, Movie
+        WHERE RRM.movie_id = RMD.movie_id
+        AND RRM.movie_id = Movie.movie_id
+        ORDER BY RRM.term_index, RRM.movie_id
+    """
+
+    cursor = None
+    try:
+        cursor = result_cursor(mysql_connection)
+        cursor.execute(query, buzzwords)
+
+        df = fetch_data_frame(cursor, dict(QUERY_5_DTYPES, term_index="int64"))
+        df.insert(0, "buzzword", [buzzwords[term_index] for term_index in df.pop("term_index")])
+        return df
+    except mysql.connector.Error as e:
+        print("Error executing query:", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
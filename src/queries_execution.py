@@ -2,81 +2,104 @@
 This file includes the main function and provides user friendly usage of the custom queries in queries_db_script.py
 """
 
+import argparse
+import sys
+from pathlib import Path
+
 import mysql.connector
-import matplotlib.pyplot as plt
-import pandas as pd
 
 from queries_db_script import (
+    SEARCH_ENGINES,
+    director_actors,
     fetch_genres,
     query_1,
-    query_2,
+    query_2_trend,
     query_3,
     query_4,
     query_5
 )
-from utilities import connect_mysql_server
+from name_index import get_name_index
+from profiling import configure_profiling, profiling_summary
+from query_batch import OUTPUT_FORMATS, create_result_writer, print_timings, read_invocations, run_batch
+from query_cache import query_cache_stats
+from trend_charts import CHART_SIZE, chart_cache_stats, chart_file_name, draw_genre_trend, genre_trend_chart
+from utilities import close_connection_pool, get_connection_pool
+
+# Directory the genre charts are written to when no interactive plotting backend is available
+DEFAULT_PLOT_DIRECTORY = Path("plots")
+
+_NON_INTERACTIVE_BACKENDS = {"agg", "cairo", "pdf", "pgf", "ps", "svg", "template"}
 
 
 def _top_genres_the_last(mysql_connection, years):
-    df = query_1(mysql_connection)
     try:
         years = int(years)
-        start_year = 2022 - years + 1
 
-        # Filter the DataFrame for the last specified number of years
-        df_filtered = df[(df['Year'] >= start_year) & (df['Year'] <= 2022)]
+        # The year window is applied by the query itself, newest year first
+        df = query_1(mysql_connection, years)
 
-        # Ensure DataFrame is sorted by Year in descending order
-        df_filtered = df_filtered.sort_values(by='Year', ascending=False)
-
-        print(df_filtered)
+        print(df)
     except ValueError:
         print("Invalid input for years. Please enter a valid number.")
 
 
-def _plot_by_genre(genre, mysql_connection,years):
-    df = query_2(genre, years, mysql_connection)
-    # Process the data for plotting
-    df['Revenue'] = pd.to_numeric(df['Revenue'])
-    df['Rating'] = pd.to_numeric(df['Rating'])
+def _pyplot(headless):
+    """
+    Imports pyplot on first use, on the non-interactive Agg backend when headless
+    """
+    import matplotlib
+    if headless:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
 
-    # Group by year to summarize revenue and rating
-    revenue_by_year = df.groupby('Year')['Revenue'].mean()
-    rating_by_year = df.groupby('Year')['Rating'].mean()
 
-    # Plotting revenue by year
-    plt.figure(figsize=(14, 6))
-    plt.subplot(1, 2, 1)
-    revenue_by_year.plot(kind='bar', color='skyblue')
-    plt.title(f'Average Revenue by Year for {genre} (Last {years} Years)')
-    plt.xlabel('Year')
-    plt.ylabel('Average Revenue')
-    plt.grid(True)
+def _plot_by_genre(genre, mysql_connection, years, plot_directory=None):
+    """
+    Shows the revenue and rating charts of the genre, or writes them to an image file in plot_directory
+    (DEFAULT_PLOT_DIRECTORY when matplotlib has no interactive backend) and returns its path
+    """
+    plt = _pyplot(headless=plot_directory is not None)
+    if plot_directory is None and plt.get_backend().lower() in _NON_INTERACTIVE_BACKENDS:
+        plot_directory = DEFAULT_PLOT_DIRECTORY
 
-    # Plotting average rating by year
-    plt.subplot(1, 2, 2)
-    rating_by_year.plot(kind='bar', color='lightgreen')
-    plt.title(f'Average Rating by Year for {genre} (Last {years} Years)')
-    plt.xlabel('Year')
-    plt.ylabel('Average Rating')
-    plt.grid(True)
+    if plot_directory is None:
+        # The averages per year are computed by the database
+        trend = query_2_trend(genre, years, mysql_connection)
+        if trend is None:
+            return None
+        draw_genre_trend(plt.figure(figsize=CHART_SIZE), trend, genre, years)
+        plt.show()
+        return None
 
-    plt.tight_layout()
-    plt.show()
+    # Rendered charts are cached per genre, period and ingest generation
+    chart = genre_trend_chart(genre, years, mysql_connection)
+    if chart is None:
+        return None
+    plot_directory = Path(plot_directory)
+    plot_directory.mkdir(parents=True, exist_ok=True)
+    chart_path = plot_directory / chart_file_name(genre, years)
+    chart_path.write_bytes(chart)
+    print(f"Chart written to {chart_path}")
+    return chart_path
 
 
 def _directors_by_metascore(mysql_connection):
     df = query_3(mysql_connection)
     print(df.iloc[:, 0])
-    _director_actor_suitability(df)
+    _director_actor_suitability(mysql_connection)
 
 
-def _director_actor_suitability(df):
+def _director_actor_suitability(mysql_connection):
     director = input("\nPlease enter a director's name: ").strip()  # Trim whitespace for better matching
-    if director in df['Director'].values:
-        suitable_actors = df.loc[df['Director'] == director, 'Actors_List'].values[0]
+    matches = get_name_index(mysql_connection, "director").resolve(director)
+    if len(matches) > 1 and matches[0][2] == matches[1][2]:
+        print(f"Several directors match {director}, please enter one of: {', '.join(name for _, name, _ in matches)}")
+    elif matches:
+        director_id, director, _ = matches[0]
+        suitable_actors = director_actors(director_id, mysql_connection=mysql_connection)
         print(f"Director {director} is suitable to work with these actors in this order:\n (according to Average meta score of the movies they worked together on)")
-        print(suitable_actors)
+        print(", ".join(suitable_actors['Actor']))
     else:
         print(f"No data found for the director named {director}. Please check the spelling or try another name.")
 
@@ -113,17 +136,22 @@ def _print_menu_options():
     print("3 - Display directors ordered by Average meta score of their movies ")
     print("4 - Display the TOP 20 movies containing one of the buzzwords, and their descriptions")
     print("5 - Show metrics on movie that contains the buzzword and has more than average revenue, shows the revenue and director")
+    print("cache - shows the query cache hit/miss counters")
+    print("pool - shows the connection pool wait time and utilization")
+    print("profile - shows the per-query profiling summary (run with --profile)")
     print("exit - exits from the program")
     print("help - shows the options menu")
     print("-----------------------------------------------\n")
 
 
-def main():
+def main(search_engine="mysql", plot_directory=None):
     """
-    Usage the Database Queries
+    Usage the Database Queries, running query_4 and query_5 on the given search engine
+    and writing the genre charts to plot_directory when given
     """
+    mysql_connection = None
     try:
-        mysql_connection = connect_mysql_server()
+        mysql_connection = get_connection_pool().checkout()
         if mysql_connection.is_connected():
             print("MySQL connection is successful")
             _print_menu_options()
@@ -150,7 +178,7 @@ def main():
                         print("Invalid genre. Please enter a valid genre from the list above.")
                         genre = input("Please enter a genre from the list above: ")
                     years = input("Please enter how many years of data you want to see : ")
-                    _plot_by_genre(genre, mysql_connection, years)
+                    _plot_by_genre(genre, mysql_connection, years, plot_directory)
                 elif choice == '3':
                     _directors_by_metascore(mysql_connection)
                 elif choice == '4':
@@ -161,13 +189,24 @@ def main():
                             break
                         else:
                             buzzwords.append(buzzword)
-                    df = query_4(buzzwords, mysql_connection)
+                    df = query_4(buzzwords, mysql_connection, engine=search_engine)
                     _readable_print_query4_results(df)
 
                 elif choice == "5":
                     buzzword = input("Please enter the buzzword: ")
-                    df = query_5(buzzword, mysql_connection)
+                    df = query_5(buzzword, mysql_connection, engine=search_engine)
                     _readable_print_query5_results(df)
+                elif choice == 'cache':
+                    for counter, value in query_cache_stats().items():
+                        print(f"{counter}: {value}")
+                    for counter, value in chart_cache_stats().items():
+                        print(f"chart {counter}: {value}")
+                elif choice == 'pool':
+                    for statistic, value in get_connection_pool().stats().items():
+                        print(f"{statistic}: {value}")
+                elif choice == 'profile':
+                    summary = profiling_summary()
+                    print(summary.to_string(index=False) if not summary.empty else "No profiled queries, run with --profile.")
                 elif choice == 'exit':
                     break
                 elif choice == 'help':
@@ -178,9 +217,56 @@ def main():
     except mysql.connector.Error as error:
         print("Error while connecting to MySQL", error)
     finally:
-        if mysql_connection.is_connected():
-            mysql_connection.close()
-            print("MySQL connection is closed")
+        if mysql_connection is not None:
+            get_connection_pool().checkin(mysql_connection)
+        close_connection_pool()
+        print("MySQL connection is closed")
+
+
+def run_batch_mode(invocations, batch_file=None, output_format="jsonl", output_directory=None):
+    """
+    Runs query invocations from the command line and/or a batch file ('-' for stdin) without prompting
+    """
+    try:
+        if batch_file == "-":
+            invocations = list(invocations) + list(read_invocations(sys.stdin))
+        elif batch_file is not None:
+            with open(batch_file, encoding="utf-8") as lines:
+                invocations = list(invocations) + list(read_invocations(lines))
+
+        result_writer = create_result_writer(output_format, output_directory)
+        timings = run_batch(invocations, result_writer)
+        print_timings(timings)
+    except mysql.connector.Error as error:
+        print("Error while connecting to MySQL", error, file=sys.stderr)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+    finally:
+        close_connection_pool()
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Run the movie queries interactively, or in batch mode when invocations are given")
+    parser.add_argument("invocations", nargs="*", help="query invocations, e.g. 'q1 years=10' 'q4 words=space,war'")
+    parser.add_argument("--batch-file", default=None, help="file with one invocation per line, '-' for stdin")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="jsonl", help="batch output format")
+    parser.add_argument("--output", type=Path, default=None, help="batch output directory, stdout when omitted")
+    parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="LOG",
+                        help="profile every query, logging JSON records to LOG (stderr when omitted)")
+    parser.add_argument("--search-engine", choices=SEARCH_ENGINES, default="mysql",
+                        help="engine of the interactive buzzword queries (4 and 5)")
+    parser.add_argument("--plot-dir", type=Path, default=None,
+                        help="render the genre charts (option 2) to image files in this directory instead of a window")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    main()
+    arguments = _parse_arguments()
+    if arguments.profile:
+        configure_profiling(enabled=True, log_path=arguments.profile)
+    if arguments.invocations or arguments.batch_file:
+        run_batch_mode(arguments.invocations, arguments.batch_file, arguments.format, arguments.output)
+        if arguments.profile:
+            print(profiling_summary().to_string(index=False), file=sys.stderr)
+    else:
+        main(arguments.search_engine, arguments.plot_dir)
@@ -0,0 +1,246 @@
+"""
+This file runs query invocations non-interactively and writes machine-readable results.
+
+Every invocation is a query name followed by key=value parameters, one per line
+in a batch file or one per command line argument:
+    q1 years=10
+    q2 genre=Drama years=20
+    q2trend genre=Drama years=20
+    q3
+    actors director_id=12 top=10
+    q4 words=space,war
+    q4 words=space,war match=all engine=index
+    q5 word=love
+    q5batch words=love,war,space
+    genres
+
+All invocations run over one pooled connection and go through the query cache,
+and each result is written as soon as it is ready.
+"""
+
+import contextlib
+import csv
+import json
+import shlex
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from queries_db_script import director_actors, fetch_genres, query_1, query_2, query_2_trend, query_3, query_4, query_5, query_5_batch
+from utilities import lazy_import, pooled_connection
+
+pd = lazy_import("pandas")
+
+OUTPUT_FORMATS = ("jsonl", "csv", "parquet")
+
+
+def _words(value):
+    return [word.strip() for word in value.split(",") if word.strip()]
+
+
+# Query name -> (query function, parameter name -> (query argument, converter))
+QUERY_SPECS = {
+    "q1": (query_1, {"years": ("years", int), "last_year": ("last_year", int)}),
+    "q2": (query_2, {"genre": ("genre", str), "years": ("years", int)}),
+    "q2trend": (query_2_trend, {"genre": ("genre", str), "years": ("years", int)}),
+    "q3": (query_3, {}),
+    "actors": (director_actors, {"director_id": ("director_id", int), "top": ("top_n", int)}),
+    "q4": (query_4, {"words": ("buzzwords", _words), "match": ("mode", str), "engine": ("engine", str)}),
+    "q5": (query_5, {"word": ("buzzword", str), "engine": ("engine", str)}),
+    "q5batch": (query_5_batch, {"words": ("buzzwords", _words), "engine": ("engine", str)}),
+    "genres": (fetch_genres, {}),
+}
+
+# Columns of the queries returning None rather than an empty DataFrame when nothing matches
+NO_ROWS_COLUMNS = {
+    "q2": ["Year", "Revenue", "Rating"],
+    "q2trend": ["Year", "Average Revenue", "Average Rating", "Movies", "Movies With Revenue", "Movies With Rating"],
+}
+
+
+def parse_invocation(invocation):
+    """
+    Parses `q4 words=space,war` into (query name, query arguments)
+    """
+    tokens = shlex.split(invocation)
+    if not tokens:
+        raise ValueError(f"Empty invocation, expected one of: {', '.join(QUERY_SPECS)}")
+    query_name = tokens[0].lower()
+    if query_name not in QUERY_SPECS:
+        raise ValueError(f"Unknown query '{tokens[0]}', expected one of: {', '.join(QUERY_SPECS)}")
+
+    parameter_specs = QUERY_SPECS[query_name][1]
+    arguments = {}
+    for token in tokens[1:]:
+        name, separator, value = token.partition("=")
+        if not separator or name not in parameter_specs:
+            raise ValueError(f"Invalid parameter '{token}' for {query_name}, expected: {', '.join(parameter_specs) or 'none'}")
+        argument_name, converter = parameter_specs[name]
+        arguments[argument_name] = converter(value)
+    return query_name, arguments
+
+
+def read_invocations(lines):
+    """
+    Yields the invocations of a batch, skipping blank lines and # comments
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def json_default(value):
+    """
+    Converts the Decimal, NumPy and missing values of query results for json.dumps
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "item"):
+        return value.item()
+    if pd.isna(value):
+        return None
+    return str(value)
+
+
+def json_records(result):
+    """
+    The rows of a result DataFrame as dicts, with None for the missing values json.dumps would write as NaN
+    """
+    return result.astype(object).where(result.notna(), None).to_dict(orient="records")
+
+
+def _result_frame(result):
+    # fetch_genres returns a list of names
+    if isinstance(result, list):
+        return pd.DataFrame({"name": result})
+    return result
+
+
+class JsonlResultWriter:
+    """
+    Writes one JSON line per invocation to a stream
+    """
+
+    def __init__(self, stream, close_stream=False):
+        self.stream = stream
+        self.close_stream = close_stream
+
+    def write(self, index, invocation, result, elapsed):
+        record = {"index": index, "query": invocation, "seconds": round(elapsed, 6)}
+        if result is None:
+            record["error"] = "query failed"
+        else:
+            record["rows"] = json_records(result)
+        self.stream.write(json.dumps(record, default=json_default) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.close_stream:
+            self.stream.close()
+
+
+class CsvResultWriter:
+    """
+    Writes every result as a CSV file in a directory, or as `# query` headed CSV blocks to a stream
+    """
+
+    def __init__(self, stream=None, output_directory=None):
+        self.stream = stream
+        self.output_directory = output_directory
+
+    def write(self, index, invocation, result, elapsed):
+        if result is None:
+            print(f"# {invocation}: query failed", file=sys.stderr)
+            return
+        if self.output_directory is not None:
+            result.to_csv(self.output_directory / f"{index:05d}.csv", index=False)
+            return
+        self.stream.write(f"# {invocation}\n")
+        result.to_csv(self.stream, index=False, quoting=csv.QUOTE_NONNUMERIC)
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class ParquetResultWriter:
+    """
+    Writes every result as a Parquet file in a directory, needs pyarrow or fastparquet
+    """
+
+    def __init__(self, output_directory):
+        self.output_directory = output_directory
+
+    def write(self, index, invocation, result, elapsed):
+        if result is None:
+            print(f"# {invocation}: query failed", file=sys.stderr)
+            return
+        # Parquet has no object columns, Decimal values are written as floats
+        result = result.apply(lambda column: pd.to_numeric(column) if column.map(type).eq(Decimal).any() else column)
+        result.to_parquet(self.output_directory / f"{index:05d}.parquet", index=False)
+
+    def close(self):
+        pass
+
+
+def create_result_writer(output_format, output_directory=None, stream=None):
+    """
+    Returns the writer of the given format; results go to output_directory, or to stream when it is None
+    """
+    stream = stream or sys.stdout
+    if output_directory is not None:
+        output_directory = Path(output_directory)
+        output_directory.mkdir(parents=True, exist_ok=True)
+
+    if output_format == "jsonl":
+        if output_directory is not None:
+            return JsonlResultWriter(open(output_directory / "results.jsonl", "w", encoding="utf-8"), close_stream=True)
+        return JsonlResultWriter(stream)
+    if output_format == "csv":
+        return CsvResultWriter(stream, output_directory)
+    if output_format == "parquet":
+        if output_directory is None:
+            raise ValueError("Parquet output needs an output directory")
+        return ParquetResultWriter(output_directory)
+    raise ValueError(f"Unknown output format '{output_format}', expected one of: {', '.join(OUTPUT_FORMATS)}")
+
+
+def run_batch(invocations, result_writer):
+    """
+    Runs the invocations in order over one pooled connection and writes each result as soon as it is ready.
+    Whatever the connection and the queries print goes to stderr, the result writer may own stdout.
+    Returns a list of (invocation, seconds, rows) timings, rows is None for failed invocations.
+    """
+    timings = []
+    with contextlib.redirect_stdout(sys.stderr), pooled_connection() as mysql_connection:
+        for index, invocation in enumerate(invocations):
+            started_at = time.perf_counter()
+            try:
+                query_name, arguments = parse_invocation(invocation)
+                result = _result_frame(QUERY_SPECS[query_name][0](mysql_connection=mysql_connection, **arguments))
+                if result is None and query_name in NO_ROWS_COLUMNS:
+                    result = pd.DataFrame(columns=NO_ROWS_COLUMNS[query_name])
+            except ValueError as error:
+                print(f"Skipping '{invocation}': {error}", file=sys.stderr)
+                timings.append((invocation, 0.0, None))
+                continue
+            elapsed = time.perf_counter() - started_at
+
+            result_writer.write(index, invocation, result, elapsed)
+            timings.append((invocation, elapsed, None if result is None else len(result)))
+    result_writer.close()
+    return timings
+
+
+def print_timings(timings, stream=None):
+    """
+    Prints the per-invocation timings and the batch totals, to stderr by default
+    """
+    stream = stream or sys.stderr
+    for invocation, elapsed, rows_count in timings:
+        status = "failed" if rows_count is None else f"{rows_count} rows"
+        print(f"{elapsed:.4f}s  {invocation} ({status})", file=stream)
+    total_elapsed = sum(elapsed for _, elapsed, _ in timings)
+    print(f"{len(timings)} queries in {total_elapsed:.3f}s", file=stream)
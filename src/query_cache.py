@@ -0,0 +1,227 @@
+"""
+This file implements the query result cache used by queries_db_script.
+
+Results are keyed by query function and parameters and kept in a bounded LRU
+with a TTL, with an optional on-disk tier. Every ingest bumps the generation
+stored in IngestGeneration (see summary_tables), which invalidates all cached
+results the next time the cache checks it.
+"""
+
+import copy
+import functools
+import hashlib
+import inspect
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import mysql.connector
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_TTL_SECONDS = 3600
+
+# Minimum number of seconds between two reads of the ingest generation
+GENERATION_CHECK_INTERVAL = 5
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return tuple(sorted(_hashable(item) for item in value))
+    return value
+
+
+def _copy_result(result):
+    # Callers may modify the returned DataFrame, the cached one must stay intact
+    if hasattr(result, "copy"):
+        return result.copy()
+    return copy.copy(result)
+
+
+def fetch_ingest_generation(mysql_connection):
+    """
+    Returns the current ingest generation, or None when the database has no marker.
+    Ends the connection's open transaction first: under REPEATABLE READ a long-lived connection
+    would otherwise keep reading the generation of its first snapshot and never see an ingest.
+    """
+    cursor = None
+    try:
+        # Commit rather than roll back, the callers only read but must not lose a write of theirs
+        if mysql_connection.in_transaction:
+            mysql_connection.commit()
+        cursor = mysql_connection.cursor()
+        cursor.execute("SELECT generation FROM IngestGeneration WHERE id = 1;")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except mysql.connector.Error:
+        return None
+    finally:
+        if cursor is not None:
+            cursor.close()
+
+
+class QueryCache:
+    """
+    Bounded LRU + TTL cache of query results, with an optional on-disk tier
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, disk_directory=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_directory = Path(disk_directory) if disk_directory else None
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_checked_at = None
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return self.disk_directory / str(self._generation) / f"{digest}.pkl"
+
+    def _is_expired(self, stored_at):
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def check_generation(self, mysql_connection, force=False):
+        """
+        Clears the cache when the ingest generation changed since the last check
+        """
+        now = time.monotonic()
+        if not force and self._generation_checked_at is not None and now - self._generation_checked_at < GENERATION_CHECK_INTERVAL:
+            return
+        generation = fetch_ingest_generation(mysql_connection)
+        with self._lock:
+            self._generation_checked_at = now
+            if generation != self._generation:
+                if self._generation is not None or self._entries:
+                    self._stats["invalidations"] += 1
+                self._entries.clear()
+                if self.disk_directory and self.disk_directory.exists():
+                    for generation_directory in self.disk_directory.iterdir():
+                        if generation_directory.name != str(generation):
+                            shutil.rmtree(generation_directory, ignore_errors=True)
+                self._generation = generation
+
+    def get(self, key):
+        """
+        Returns (True, result) on a hit and (False, None) on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if not self._is_expired(stored_at):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, _copy_result(result)
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+            if self.disk_directory:
+                disk_path = self._disk_path(key)
+                if disk_path.exists():
+                    with open(disk_path, "rb") as cache_file:
+                        stored_at, result = pickle.load(cache_file)
+                    if not self._is_expired(stored_at):
+                        self._store_in_memory(key, stored_at, result)
+                        self._stats["disk_hits"] += 1
+                        return True, _copy_result(result)
+                    disk_path.unlink(missing_ok=True)
+                    self._stats["expirations"] += 1
+
+            self._stats["misses"] += 1
+            return False, None
+
+    def _store_in_memory(self, key, stored_at, result):
+        self._entries[key] = (stored_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def put(self, key, result):
+        stored_at = time.time()
+        result = _copy_result(result)
+        with self._lock:
+            self._store_in_memory(key, stored_at, result)
+            if self.disk_directory:
+                disk_path = self._disk_path(key)
+                disk_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(disk_path, "wb") as cache_file:
+                    pickle.dump((stored_at, result), cache_file)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.disk_directory and self.disk_directory.exists():
+                shutil.rmtree(self.disk_directory, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            return stats
+
+
+_query_cache = QueryCache()
+
+
+def get_query_cache():
+    return _query_cache
+
+
+def configure_query_cache(max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, disk_directory=None, enabled=True):
+    """
+    Replaces the shared query cache with one using the given settings
+    """
+    global _query_cache
+    _query_cache = QueryCache(max_entries, ttl_seconds, disk_directory)
+    _query_cache.enabled = enabled
+    return _query_cache
+
+
+def query_cache_stats():
+    return _query_cache.stats()
+
+
+def cached_query(query_function):
+    """
+    Caches the results of a query function taking a `mysql_connection` argument,
+    keyed by the function and the rest of its arguments. Failed queries (None) are not cached.
+    """
+    signature = inspect.signature(query_function)
+
+    @functools.wraps(query_function)
+    def wrapper(*args, **kwargs):
+        cache = _query_cache
+        if not cache.enabled:
+            return query_function(*args, **kwargs)
+
+        bound_arguments = signature.bind(*args, **kwargs)
+        bound_arguments.apply_defaults()
+        mysql_connection = bound_arguments.arguments["mysql_connection"]
+        key = (query_function.__qualname__,) + tuple(
+            (name, _hashable(value)) for name, value in bound_arguments.arguments.items() if name != "mysql_connection"
+        )
+
+        cache.check_generation(mysql_connection)
+        hit, result = cache.get(key)
+        if hit:
+            return result
+
+        result = query_function(*args, **kwargs)
+        if result is not None:
+            cache.put(key, result)
+        return result
+
+    wrapper.uncached = query_function
+    return wrapper
@@ -0,0 +1,275 @@
+"""
+This file serves the analyses of queries_db_script over a local HTTP JSON API.
+
+Endpoints (GET):
+    /top-genres?years=10                 query_1
+    /genre-trend?genre=Drama&years=20    query_2
+    /genre-trend-by-year?genre=Drama&years=20   query_2_trend, average revenue and rating per year
+    /genre-trend-chart?genre=Drama&years=20     the PNG chart of query_2_trend, from the chart cache
+    /directors                           query_3, every director by average metascore
+    /directors?director=christopher nolan&top=10   the actors of the director (exact, prefix or fuzzy name)
+    /buzzwords?words=space,war           query_4 (&match=all for movies with every word)
+    /above-average-revenue?word=love     query_5
+    /above-average-revenue?words=love,war   query_5_batch, the rows of every word keyed by a buzzword column
+    (both take &engine=index to run on the in-process search index instead of MySQL)
+    /genres                              fetch_genres
+    /stats                               query cache, chart cache and connection pool statistics
+
+Requests are handled in threads over the shared connection pool and the query
+cache. At most `max_concurrent_requests` queries run at a time, other requests
+wait up to REQUEST_QUEUE_TIMEOUT seconds before getting a 503. Results are
+streamed as a chunked JSON array of row objects.
+"""
+
+import argparse
+import json
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from queries_db_script import (
+    SEARCH_ENGINES,
+    director_actors,
+    fetch_genres,
+    query_1,
+    query_2,
+    query_2_trend,
+    query_3,
+    query_4,
+    query_5,
+    query_5_batch
+)
+from name_index import get_name_index
+from search_index import SEARCH_MODES
+from query_batch import json_default, json_records
+from query_cache import query_cache_stats
+from trend_charts import chart_cache_stats, genre_trend_chart
+from utilities import MYSQL_POOL_SIZE, close_connection_pool, configure_connection_pool, get_connection_pool, pooled_connection
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# Seconds a request waits for a free query slot before it is rejected
+REQUEST_QUEUE_TIMEOUT = 10
+
+# Number of result rows per streamed chunk
+STREAM_ROWS = 500
+
+
+def _words(value):
+    return [word.strip() for word in value.split(",") if word.strip()]
+
+
+def _search_engine(value):
+    if value not in SEARCH_ENGINES:
+        raise ValueError(value)
+    return value
+
+
+def _search_mode(value):
+    if value not in SEARCH_MODES:
+        raise ValueError(value)
+    return value
+
+
+def _above_average_revenue(buzzword=None, buzzwords=None, engine="mysql"):
+    if buzzwords is not None:
+        return query_5_batch(buzzwords, engine=engine)
+    if buzzword is None:
+        raise ValueError("Missing parameter 'word' or 'words'")
+    return query_5(buzzword, engine=engine)
+
+
+def _genre_trend(trend_function, genre, years):
+    # query_2, query_2_trend and genre_trend_chart return None when the genre has no movies in the period
+    result = trend_function(genre, years)
+    if result is None:
+        raise LookupError(f"No {genre} movies in the last {years} years")
+    return result
+
+
+def _directors(director=None, top_n=None):
+    if director is None:
+        return query_3()
+    with pooled_connection() as mysql_connection:
+        matches = get_name_index(mysql_connection, "director").resolve(director)
+        if not matches:
+            raise LookupError(f"No director named {director}")
+        if len(matches) > 1 and matches[0][2] == matches[1][2]:
+            raise LookupError(f"Several directors match {director}: {', '.join(name for _, name, _ in matches)}")
+        return director_actors(matches[0][0], top_n, mysql_connection)
+
+
+# Path -> (handler, query parameter -> (handler argument, converter, required))
+ENDPOINTS = {
+    "/top-genres": (lambda years=None: query_1(years=years), {"years": ("years", int, False)}),
+    "/genre-trend": (
+        lambda genre, years: _genre_trend(query_2, genre, years),
+        {"genre": ("genre", str, True), "years": ("years", int, True)},
+    ),
+    "/genre-trend-by-year": (
+        lambda genre, years: _genre_trend(query_2_trend, genre, years),
+        {"genre": ("genre", str, True), "years": ("years", int, True)},
+    ),
+    "/genre-trend-chart": (
+        lambda genre, years: _genre_trend(genre_trend_chart, genre, years),
+        {"genre": ("genre", str, True), "years": ("years", int, True)},
+    ),
+    "/directors": (_directors, {"director": ("director", str, False), "top": ("top_n", int, False)}),
+    "/buzzwords": (
+        lambda buzzwords, engine="mysql", mode="any": query_4(buzzwords, engine=engine, mode=mode),
+        {"words": ("buzzwords", _words, True), "engine": ("engine", _search_engine, False), "match": ("mode", _search_mode, False)},
+    ),
+    "/above-average-revenue": (
+        _above_average_revenue,
+        {"word": ("buzzword", str, False), "words": ("buzzwords", _words, False), "engine": ("engine", _search_engine, False)},
+    ),
+    "/genres": (lambda: fetch_genres(), {}),
+}
+
+
+def _parse_parameters(query_string, parameter_specs):
+    """
+    Converts the query string into handler arguments, raises ValueError on a missing or invalid parameter
+    """
+    values = {name: value_list[-1] for name, value_list in parse_qs(query_string).items()}
+    arguments = {}
+    for name, (argument_name, converter, required) in parameter_specs.items():
+        if name not in values:
+            if required:
+                raise ValueError(f"Missing parameter '{name}'")
+            continue
+        try:
+            arguments[argument_name] = converter(values[name])
+        except ValueError:
+            raise ValueError(f"Invalid value for parameter '{name}': {values[name]}")
+    return arguments
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MoviesQueryService/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_image(self, image):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(image)))
+        self.end_headers()
+        self.wfile.write(image)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def _stream_rows(self, rows):
+        """
+        Sends the rows as a JSON array in chunks of STREAM_ROWS rows
+        """
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        self._write_chunk(b"[")
+        for start in range(0, len(rows), STREAM_ROWS):
+            separator = "," if start else ""
+            batch = rows[start:start + STREAM_ROWS]
+            self._write_chunk((separator + ",".join(json.dumps(row, default=json_default) for row in batch)).encode())
+        self._write_chunk(b"]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            self._send_json(HTTPStatus.OK, {
+                "cache": query_cache_stats(),
+                "charts": chart_cache_stats(),
+                "pool": get_connection_pool().stats(),
+            })
+            return
+        if url.path not in ENDPOINTS:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint {url.path}", "endpoints": sorted(ENDPOINTS) + ["/stats"]})
+            return
+
+        handler, parameter_specs = ENDPOINTS[url.path]
+        try:
+            arguments = _parse_parameters(url.query, parameter_specs)
+        except ValueError as error:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(error)})
+            return
+
+        if not self.server.query_slots.acquire(timeout=REQUEST_QUEUE_TIMEOUT):
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Too many concurrent requests"})
+            return
+        try:
+            result = handler(**arguments)
+        except LookupError as error:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": str(error)})
+            return
+        except ValueError as error:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(error)})
+            return
+        except Exception as error:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(error)})
+            return
+        finally:
+            self.server.query_slots.release()
+
+        if result is None:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Query failed"})
+        elif isinstance(result, bytes):
+            self._send_image(result)
+        elif isinstance(result, list):
+            self._stream_rows([{"name": name} for name in result])
+        else:
+            self._stream_rows(json_records(result))
+
+
+class QueryService(ThreadingHTTPServer):
+    """
+    Threaded HTTP server running at most max_concurrent_requests queries at a time
+    """
+    daemon_threads = True
+
+    def __init__(self, address, max_concurrent_requests=MYSQL_POOL_SIZE):
+        super().__init__(address, QueryRequestHandler)
+        self.query_slots = threading.BoundedSemaphore(max_concurrent_requests)
+
+
+def main(host=DEFAULT_HOST, port=DEFAULT_PORT, max_concurrent_requests=MYSQL_POOL_SIZE):
+    """
+    Serves the queries until interrupted
+    """
+    # One connection per running query
+    configure_connection_pool(size=max_concurrent_requests)
+    service = QueryService((host, port), max_concurrent_requests)
+    print(f"Serving the movie queries on http://{host}:{port} ({max_concurrent_requests} concurrent queries)")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server_close()
+        close_connection_pool()
+        print("Query service stopped")
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Serve the movie queries over HTTP")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--max-concurrent", type=int, default=MYSQL_POOL_SIZE, help="queries running at the same time")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = _parse_arguments()
+    main(arguments.host, arguments.port, arguments.max_concurrent)
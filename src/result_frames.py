@@ -0,0 +1,125 @@
+"""
+This file materializes query results from a cursor into DataFrames of typed columns.
+
+Rows are fetched in batches of FETCH_BATCH_SIZE and every batch is converted
+column by column into a NumPy array of the dtype the query declares for the
+column ("int64", "float64" or "str"), so the result is never held as one list
+of Python rows. On MySQL the queries run on raw cursors (through the C
+extension when it is installed): numbers arrive as their text and NumPy parses
+a whole column of a batch at once, without a Decimal or int object per value.
+Columns without a declared dtype get one from their MySQL field type.
+
+configure_materialization(typed=False) goes back to fetchall() and
+pd.DataFrame(rows), the path benchmark.py compares against.
+"""
+
+from mysql.connector import FieldType
+
+from profiling import profile_phase
+from utilities import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+FETCH_BATCH_SIZE = 10000
+
+# Dtypes of the columns declared without one, by MySQL field type. The others, and SQLite columns, are inferred by pandas.
+_INTEGER_FIELD_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG, FieldType.YEAR}
+_FLOAT_FIELD_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+
+_materialization = {"typed": True, "batch_size": FETCH_BATCH_SIZE}
+
+
+def configure_materialization(typed=True, batch_size=FETCH_BATCH_SIZE):
+    """
+    Selects the typed batched materialization, or fetchall() into pd.DataFrame(rows) when typed is False
+    """
+    _materialization.update(typed=typed, batch_size=batch_size)
+
+
+def result_cursor(mysql_connection):
+    """
+    Opens the cursor of a query read by fetch_data_frame, a raw one on MySQL when materializing typed columns
+    """
+    if _materialization["typed"]:
+        return mysql_connection.cursor(raw=True)
+    return mysql_connection.cursor()
+
+
+def _column_dtype(description, dtypes):
+    name, type_code = description[0], description[1]
+    if name in dtypes:
+        return dtypes[name]
+    if type_code in _INTEGER_FIELD_TYPES:
+        return "int64"
+    if type_code in _FLOAT_FIELD_TYPES:
+        return "float64"
+    return None
+
+
+def _column_array(values, dtype):
+    """
+    Converts the values of one column of a batch, raw text or converted by the connector, to a NumPy array.
+    Integer columns holding NULLs become float64 with NaN, like pd.DataFrame(rows) makes them.
+    Raises ValueError for a value that is not a number of the column's dtype.
+    """
+    has_nulls = None in values
+    sample = next((value for value in values if value is not None), None)
+    if dtype in ("str", None):
+        if isinstance(sample, (bytes, bytearray)) and not has_nulls:
+            # One decode for the whole batch, unless a value holds the separator
+            decoded = b"\0".join(values).decode().split("\0")
+            if len(decoded) == len(values):
+                return np.array(decoded, dtype=object)
+        return np.array([value.decode() if isinstance(value, (bytes, bytearray)) else value for value in values], dtype=object)
+
+    dtype = np.dtype(np.float64 if has_nulls else dtype)
+    if isinstance(sample, (bytes, bytearray)):
+        text = b" ".join(b"nan" if value is None else value for value in values) if has_nulls else b" ".join(values)
+        array = np.fromstring(text, dtype=dtype, sep=" ")
+        # fromstring stops at the first value it cannot parse and reads an integer only up to a decimal point or exponent
+        if len(array) == len(values) and (dtype.kind == "f" or not text.translate(None, b"0123456789+- ")):
+            return array
+        convert = float if dtype.kind == "f" else int
+        return np.array([np.nan if value is None else convert(value) for value in values], dtype=dtype)
+    return np.array(values, dtype=dtype)
+
+
+def _concatenate(arrays, dtype):
+    if not arrays:
+        return np.empty(0, dtype=object if dtype in ("str", None) else dtype)
+    return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+
+def fetch_data_frame(cursor, dtypes=None):
+    """
+    Fetches the rows of the executed query into a DataFrame with the query's column names,
+    typed with the dtypes of `dtypes` (column name -> "int64", "float64" or "str")
+    """
+    columns = [description[0] for description in cursor.description]
+    if not _materialization["typed"]:
+        with profile_phase("fetch"):
+            rows = cursor.fetchall()
+        with profile_phase("build_data_frame"):
+            return pd.DataFrame(rows, columns=columns)
+
+    column_dtypes = [_column_dtype(description, dtypes or {}) for description in cursor.description]
+    column_batches = [[] for _ in columns]
+    while True:
+        with profile_phase("fetch"):
+            rows = cursor.fetchmany(_materialization["batch_size"])
+        if not rows:
+            break
+        with profile_phase("build_data_frame"):
+            for batches, values, dtype in zip(column_batches, zip(*rows), column_dtypes):
+                batches.append(_column_array(values, dtype))
+
+    with profile_phase("build_data_frame"):
+        data_frame = pd.DataFrame(
+            {column: _concatenate(batches, dtype) for column, batches, dtype in zip(columns, column_batches, column_dtypes)},
+            columns=columns,
+            copy=False,
+        )
+        if None in column_dtypes:
+            data_frame = data_frame.infer_objects()
+        return data_frame
@@ -0,0 +1,350 @@
+"""
+This file implements the in-process search engine of query_4 and query_5.
+
+Movie descriptions are tokenized with the InnoDB full-text parser rules of
+fulltext.py into an inverted index: a sorted vocabulary, the offsets of every
+term's postings and the postings themselves (document positions, ascending).
+The postings and the document columns (movie ids, metascores, revenues,
+titles, descriptions, query_5 workers) are written as .npy / UTF-8 files under
+SEARCH_INDEX_DIRECTORY and memory-mapped on first use, so a process only pages
+in the terms and rows it reads. One index is written per ingest generation.
+"""
+
+import heapq
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from functools import cached_property
+from pathlib import Path
+
+from fulltext import MAX_TOKEN_LENGTH, MIN_TOKEN_LENGTH, STOPWORDS, TOKEN_PATTERN, search_terms
+from profiling import profile_phase
+from query_cache import GENERATION_CHECK_INTERVAL, fetch_ingest_generation
+from utilities import lazy_import, pooled_connection
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+SEARCH_INDEX_DIRECTORY = Path(__file__).resolve().parent / ".search_index"
+SEARCH_INDEX_VERSION = 1
+
+SEARCH_MODES = ("any", "all")
+
+# Stored for a NULL metascore or revenue, both columns are unsigned
+_NULL = -1
+
+# The workers query_5 reports for a movie (Worker.role_id = 2)
+_QUERY_5_WORKERS_ROLE_ID = 2
+
+_DOCUMENTS_QUERY = """
+    SELECT Movie.movie_id, Movie.title, Movie.description, MovieMetrics.metascore, MovieMetrics.revenue
+    FROM Movie
+    LEFT JOIN MovieMetrics ON Movie.movie_id = MovieMetrics.movie_id
+    ORDER BY Movie.movie_id;
+"""
+
+_WORKERS_QUERY = """
+    SELECT MWA.movie_id, GROUP_CONCAT(Worker.full_name)
+    FROM MovieWorkerAssociation MWA
+    JOIN Worker ON MWA.worker_id = Worker.worker_id
+    WHERE Worker.role_id = %s
+    GROUP BY MWA.movie_id;
+"""
+
+_TEXT_COLUMNS = ("title", "description", "workers")
+
+
+def write_text_column(directory, name, values):
+    """
+    Writes strings as one UTF-8 blob (name.bin) plus the byte offset of every string (name_offsets.npy)
+    """
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    (directory / f"{name}.bin").write_bytes(b"".join(encoded))
+    np.save(directory / f"{name}_offsets.npy", offsets)
+
+
+def read_text_column(directory, name):
+    """
+    Maps a column written by write_text_column, returns (blob, offsets): string i is blob[offsets[i]:offsets[i + 1]]
+    """
+    blob_path = Path(directory) / f"{name}.bin"
+    blob = b""
+    # An empty file can't be mapped
+    if blob_path.stat().st_size:
+        with open(blob_path, "rb") as blob_file:
+            blob = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+    return blob, np.load(Path(directory) / f"{name}_offsets.npy", mmap_mode="r")
+
+
+def read_texts(text_column, positions):
+    """
+    Decodes the strings at the positions of a column returned by read_text_column
+    """
+    blob, offsets = text_column
+    positions = np.asarray(positions, dtype=np.int64)
+    starts, ends = offsets[positions].tolist(), offsets[positions + 1].tolist()
+    return [blob[start:end].decode() for start, end in zip(starts, ends)]
+
+
+def write_search_index(directory, documents, generation=None):
+    """
+    Writes the index of a documents DataFrame (movie_id, title, description, metascore, revenue, workers)
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True)
+    documents = documents.reset_index(drop=True)
+
+    tokens = documents["description"].fillna("").str.casefold().str.findall(TOKEN_PATTERN).explode().dropna()
+    tokens = tokens[tokens.str.len().between(MIN_TOKEN_LENGTH, MAX_TOKEN_LENGTH) & ~tokens.isin(STOPWORDS)]
+    pairs = pd.DataFrame({"term": tokens.to_numpy(), "document": tokens.index.to_numpy()}).drop_duplicates()
+    term_codes, vocabulary = pd.factorize(pairs["term"], sort=True)
+    order = np.lexsort((pairs["document"].to_numpy(), term_codes))
+
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_codes, minlength=len(vocabulary)), out=offsets[1:])
+    np.save(directory / "offsets.npy", offsets)
+    np.save(directory / "postings.npy", pairs["document"].to_numpy()[order].astype(np.int32))
+
+    np.save(directory / "movie_ids.npy", documents["movie_id"].to_numpy(dtype=np.int64))
+    np.save(directory / "metascores.npy", pd.to_numeric(documents["metascore"]).fillna(_NULL).to_numpy().astype(np.int16))
+    np.save(directory / "revenues.npy", pd.to_numeric(documents["revenue"]).fillna(_NULL).to_numpy().astype(np.int64))
+    for column in _TEXT_COLUMNS:
+        write_text_column(directory, column, documents[column].fillna("").astype(str))
+
+    with open(directory / "vocabulary.json", "w", encoding="utf-8") as vocabulary_file:
+        json.dump(list(vocabulary), vocabulary_file)
+    with open(directory / "meta.json", "w", encoding="utf-8") as meta_file:
+        json.dump({
+            "version": SEARCH_INDEX_VERSION, "generation": generation, "documents": len(documents), "terms": len(vocabulary),
+        }, meta_file)
+
+
+def read_search_documents(mysql_connection):
+    """
+    Reads the indexed columns of every movie from the database
+    """
+    cursor = mysql_connection.cursor()
+    try:
+        cursor.execute(_DOCUMENTS_QUERY)
+        documents = pd.DataFrame(cursor.fetchall(), columns=["movie_id", "title", "description", "metascore", "revenue"])
+        cursor.execute(_WORKERS_QUERY, (_QUERY_5_WORKERS_ROLE_ID,))
+        workers = dict(cursor.fetchall())
+    finally:
+        cursor.close()
+    documents["workers"] = documents["movie_id"].map(workers)
+    return documents
+
+
+class SearchIndex:
+    """
+    Memory-mapped inverted index over the movie descriptions
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with open(self.directory / "meta.json", encoding="utf-8") as meta_file:
+            self.meta = json.load(meta_file)
+        with open(self.directory / "vocabulary.json", encoding="utf-8") as vocabulary_file:
+            self._term_ids = {term: term_id for term_id, term in enumerate(json.load(vocabulary_file))}
+
+    def __len__(self):
+        return self.meta["documents"]
+
+    def _array(self, name):
+        return np.load(self.directory / f"{name}.npy", mmap_mode="r")
+
+    @cached_property
+    def _offsets(self):
+        return self._array("offsets")
+
+    @cached_property
+    def _postings(self):
+        return self._array("postings")
+
+    @cached_property
+    def _movie_ids(self):
+        return self._array("movie_ids")
+
+    @cached_property
+    def _metascores(self):
+        return self._array("metascores")
+
+    @cached_property
+    def _revenues(self):
+        return self._array("revenues")
+
+    @cached_property
+    def _text_columns(self):
+        return {column: read_text_column(self.directory, column) for column in _TEXT_COLUMNS}
+
+    def _texts(self, column, documents):
+        return read_texts(self._text_columns[column], documents)
+
+    def postings(self, term):
+        """
+        The positions of the documents containing the term, ascending
+        """
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            return np.empty(0, dtype=np.int32)
+        return self._postings[self._offsets[term_id]:self._offsets[term_id + 1]]
+
+    def match(self, words, mode="any"):
+        """
+        The positions of the documents containing any / all of the terms of the words
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode}, expected one of {', '.join(SEARCH_MODES)}")
+        term_postings = [self.postings(term) for term in search_terms(words)]
+        if not term_postings:
+            return np.empty(0, dtype=np.int32)
+        if mode == "all":
+            # Intersect the shortest lists first, the running result only shrinks
+            term_postings.sort(key=len)
+            documents = np.asarray(term_postings[0])
+            for postings in term_postings[1:]:
+                if not len(documents):
+                    break
+                documents = np.intersect1d(documents, postings, assume_unique=True)
+            return documents
+        return np.unique(np.concatenate(term_postings))
+
+    def top_by_metascore(self, documents, limit):
+        """
+        The positions of the `limit` documents with the highest metascore, ties by movie order
+        """
+        metascores = self._metascores[documents]
+        rated = metascores != _NULL
+        documents, metascores = documents[rated], metascores[rated]
+        if len(documents) > limit > 0:
+            # Only the documents scoring at least the limit-th best score can be selected
+            threshold = np.partition(metascores, len(metascores) - limit)[len(metascores) - limit]
+            candidates = metascores >= threshold
+            documents, metascores = documents[candidates], metascores[candidates]
+        best = heapq.nlargest(limit, zip(metascores.tolist(), (-documents).tolist()))
+        return np.array([-negated_document for _, negated_document in best], dtype=np.int64)
+
+    def search_top_movies(self, words, mode="any", limit=20):
+        """
+        Title, description and metascore of the best rated movies matching the words (query_4)
+        """
+        with profile_phase("search"):
+            documents = self.top_by_metascore(self.match(words, mode), limit)
+        with profile_phase("fetch"):
+            return pd.DataFrame({
+                "title": self._texts("title", documents),
+                "description": self._texts("description", documents),
+                "metascore": self._metascores[documents].astype(np.int64),
+            })
+
+    def above_average_revenue(self, words):
+        """
+        The movies matching the words whose revenue is above the average revenue of the matching movies (query_5)
+        """
+        return self.above_average_revenue_batch([words]).drop(columns="buzzword")
+
+    def above_average_revenue_batch(self, buzzwords):
+        """
+        above_average_revenue of every buzzword in one pass, keyed by the buzzword column (query_5_batch)
+        """
+        with profile_phase("search"):
+            term_documents = [self.match(buzzword, "any") for buzzword in buzzwords]
+            term_indexes = np.repeat(np.arange(len(buzzwords)), [len(documents) for documents in term_documents])
+            documents = np.concatenate(term_documents) if term_documents else np.empty(0, dtype=np.int32)
+            revenues = self._revenues[documents]
+            with_revenue = revenues != _NULL
+            term_indexes, documents, revenues = term_indexes[with_revenue], documents[with_revenue], revenues[with_revenue]
+
+            counts = np.bincount(term_indexes, minlength=len(buzzwords))
+            total_revenues = np.zeros(len(buzzwords), dtype=np.int64)
+            np.add.at(total_revenues, term_indexes, revenues)
+            # revenue > total / count, compared exactly like MySQL's DECIMAL average
+            selected = revenues * counts[term_indexes] > total_revenues[term_indexes]
+            term_indexes, documents, revenues = term_indexes[selected], documents[selected], revenues[selected]
+
+        with profile_phase("fetch"):
+            # A movie matching several buzzwords is read once
+            distinct_documents, document_indexes = np.unique(documents, return_inverse=True)
+            titles = np.array(self._texts("title", distinct_documents), dtype=object)[document_indexes]
+            workers = np.array(self._texts("workers", distinct_documents), dtype=object)[document_indexes]
+            has_workers = workers != ""
+            term_indexes = term_indexes[has_workers]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                average_revenues = total_revenues / counts
+            return pd.DataFrame({
+                "buzzword": [buzzwords[term_index] for term_index in term_indexes],
+                "title": titles[has_workers],
+                "directors": workers[has_workers],
+                "revenue": revenues[has_workers].astype(np.int64),
+                "average_revenue": average_revenues[term_indexes],
+            })
+
+
+def build_search_index(mysql_connection, generation=None, directory=SEARCH_INDEX_DIRECTORY):
+    """
+    Writes the index of the current database contents for the generation and returns it
+    """
+    index_path = Path(directory) / f"generation-{generation}"
+    staging_path = Path(directory) / f".staging-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(staging_path, ignore_errors=True)
+    write_search_index(staging_path, read_search_documents(mysql_connection), generation)
+    shutil.rmtree(index_path, ignore_errors=True)
+    os.replace(staging_path, index_path)
+
+    # Older generations are unused, still mapped files are left for the next build
+    for previous_path in Path(directory).glob("generation-*"):
+        if previous_path != index_path:
+            shutil.rmtree(previous_path, ignore_errors=True)
+    return SearchIndex(index_path)
+
+
+def open_search_index(mysql_connection, generation, directory=SEARCH_INDEX_DIRECTORY):
+    """
+    Maps the index written for the generation, building it when missing or from an older version
+    """
+    index_path = Path(directory) / f"generation-{generation}"
+    if generation is not None and (index_path / "meta.json").exists():
+        index = SearchIndex(index_path)
+        if index.meta["version"] == SEARCH_INDEX_VERSION:
+            return index
+    return build_search_index(mysql_connection, generation, directory)
+
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+
+def get_search_index(mysql_connection):
+    """
+    Returns the shared index, reopened when an ingest completed since it was opened
+    """
+    global _search_index
+    with _search_index_lock:
+        now = time.monotonic()
+        if _search_index is not None and now - _search_index["checked_at"] < GENERATION_CHECK_INTERVAL:
+            return _search_index["index"]
+
+        generation = fetch_ingest_generation(mysql_connection)
+        if _search_index is None or generation != _search_index["generation"]:
+            _search_index = {"index": open_search_index(mysql_connection, generation), "generation": generation}
+        _search_index["checked_at"] = now
+        return _search_index["index"]
+
+
+def main(directory=SEARCH_INDEX_DIRECTORY):
+    """
+    Builds the index of the current database contents
+    """
+    with pooled_connection() as mysql_connection:
+        started_at = time.perf_counter()
+        index = build_search_index(mysql_connection, fetch_ingest_generation(mysql_connection), directory)
+    print(f"Indexed {index.meta['documents']} movies, {index.meta['terms']} terms in {time.perf_counter() - started_at:.2f}s: {index.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+This file runs the project's MySQL statements on an embedded SQLite database.
+
+connect_sqlite_database() returns a connection with the part of the
+mysql.connector API the project uses (cursor, execute/executemany, fetches,
+commit/rollback, in_transaction, is_connected), so the schema creation, the
+loaders and the queries run unchanged. Statements are translated on the fly:
+    %s placeholders                  ? placeholders
+    USE, CREATE DATABASE, SET SESSION, FLUSH TABLES    no-ops
+    DROP DATABASE                    drops every table
+    START TRANSACTION                BEGIN IMMEDIATE, after committing the running transaction like MySQL
+    CREATE, DROP, ALTER              committed right away like MySQL
+    CREATE TABLE                     single column INT keys become INTEGER rowid keys (AUTO_INCREMENT
+                                     included), inline INDEX clauses become CREATE INDEX statements,
+                                     CHAR, VARCHAR and TEXT columns compare case-insensitively
+    CREATE INDEX ... USING HASH      a B-tree index, analyzed right away
+    CREATE FULLTEXT INDEX            an FTS5 table of the column words, kept in sync by triggers
+    MATCH(column) AGAINST (%s ...)   a lookup of the row ids in that FTS5 table
+    DELETE alias FROM table alias JOIN ...   DELETE of the rows the joined SELECT finds
+    GROUP_CONCAT(... SEPARATOR s), ON DUPLICATE KEY UPDATE, INSERT IGNORE    their SQLite forms
+Both the indexed words and the searched terms follow the InnoDB word rules of
+fulltext.py, so the triggers need a connection opened here. Foreign keys are
+declared but, like during a MySQL bulk load, not enforced; create_db_script
+verifies them. SQLite errors are raised as mysql.connector errors, so the
+existing error handling applies. Without table statistics the SQLite planner
+picks poor join orders (the director/actor summary joins every director with
+every actor), so a commit runs ANALYZE once ANALYZE_ROWS_WRITTEN rows were
+written since the last one.
+"""
+
+import contextlib
+import re
+import sqlite3
+from decimal import Decimal
+
+import mysql.connector
+import numpy as np
+
+from fulltext import tokenize
+
+# Seconds a statement waits for a lock held by another connection
+SQLITE_BUSY_TIMEOUT = 30
+
+# Translated statements remembered per connection
+TRANSLATION_CACHE_SIZE = 1024
+
+# Rows written through a connection after which its next commit refreshes the planner statistics, and the
+# rows ANALYZE samples per index (analysis_limit) so that stays cheap on large tables
+ANALYZE_ROWS_WRITTEN = 10000
+ANALYZE_SAMPLE_ROWS = 1000
+
+for _numpy_type in (np.int8, np.int16, np.int32, np.int64, np.uint8, np.uint16, np.uint32, np.uint64, np.bool_):
+    sqlite3.register_adapter(_numpy_type, int)
+for _numpy_type in (np.float32, np.float64):
+    sqlite3.register_adapter(_numpy_type, float)
+sqlite3.register_adapter(Decimal, str)
+
+# SQLite integers are signed 64 bit, BIGINT UNSIGNED values above that range (the fingerprints) are stored
+# two's complement, reading them back .astype("uint64") restores them
+_INT64_MAX = 2 ** 63 - 1
+_UINT64_WRAP = 2 ** 64
+
+_NO_OP_PATTERN = re.compile(r"^\s*(USE\s|CREATE\s+DATABASE\s|SET\s+SESSION\s|FLUSH\s+TABLES\b)", re.IGNORECASE)
+_DROP_DATABASE_PATTERN = re.compile(r"^\s*DROP\s+DATABASE\b", re.IGNORECASE)
+_START_TRANSACTION_PATTERN = re.compile(r"^\s*START\s+TRANSACTION\b", re.IGNORECASE)
+_DDL_PATTERN = re.compile(r"^\s*(CREATE|DROP|ALTER)\s", re.IGNORECASE)
+_CREATE_INDEX_PATTERN = re.compile(r"^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+_CREATE_TABLE_PATTERN = re.compile(r"^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+_SINGLE_PRIMARY_KEY_PATTERN = re.compile(r"PRIMARY\s+KEY\s*\(\s*(\w+)\s*\)", re.IGNORECASE)
+_INLINE_INDEX_PATTERN = re.compile(r",\s*INDEX\s+(\w+)\s*\(([^)]*)\)", re.IGNORECASE)
+_TEXT_COLUMN_PATTERN = re.compile(r"\b((?:VAR)?CHAR\s*\(\s*\d+\s*\)|TEXT\b)", re.IGNORECASE)
+_FULLTEXT_INDEX_PATTERN = re.compile(r"^\s*CREATE\s+FULLTEXT\s+INDEX\s+(\w+)\s+ON\s+(\w+)\s*\(\s*(\w+)\s*\)", re.IGNORECASE)
+_MATCH_AGAINST_PATTERN = re.compile(
+    r"MATCH\s*\(\s*(?:(\w+)\.)?(\w+)\s*\)\s*AGAINST\s*\(\s*%s(\s+IN\s+BOOLEAN\s+MODE)?\s*\)", re.IGNORECASE
+)
+_DELETE_JOIN_PATTERN = re.compile(r"^\s*DELETE\s+(\w+)\s+FROM\s+(\w+)\s+\1\b(.*?)\s*;?\s*$", re.IGNORECASE | re.DOTALL)
+_INSERT_COLUMNS_PATTERN = re.compile(r"^\s*INSERT\s+(?:IGNORE\s+)?INTO\s+(\w+)\s*\(([^)]*)\)\s*VALUES\s*\(([^)]*)\)", re.IGNORECASE)
+_ON_DUPLICATE_KEY_PATTERN = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_FUNCTION_PATTERN = re.compile(r"\bVALUES\s*\(\s*(\w+)\s*\)", re.IGNORECASE)
+
+_REWRITES = [
+    (re.compile(r"\s+AUTO_INCREMENT\b", re.IGNORECASE), ""),
+    (re.compile(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b", re.IGNORECASE), ""),
+    (re.compile(r"\s+USING\s+HASH\b", re.IGNORECASE), ""),
+    (re.compile(r"\s+SEPARATOR\s+('(?:[^']|'')*')", re.IGNORECASE), r", \1"),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE), "INSERT OR IGNORE"),
+    (re.compile(r"%s"), "?"),
+]
+
+_SQLITE_TO_MYSQL_ERRORS = [
+    (sqlite3.IntegrityError, mysql.connector.errors.IntegrityError),
+    (sqlite3.OperationalError, mysql.connector.errors.OperationalError),
+    (sqlite3.ProgrammingError, mysql.connector.errors.ProgrammingError),
+    (sqlite3.NotSupportedError, mysql.connector.errors.NotSupportedError),
+    (sqlite3.Error, mysql.connector.errors.DatabaseError),
+]
+
+
+@contextlib.contextmanager
+def _mysql_errors():
+    try:
+        yield
+    except sqlite3.Error as error:
+        mysql_error_type = next(mysql_type for sqlite_type, mysql_type in _SQLITE_TO_MYSQL_ERRORS if isinstance(error, sqlite_type))
+        raise mysql_error_type(msg=str(error)) from error
+
+
+def fts5_query(against, boolean_mode=False):
+    """
+    Converts a MySQL AGAINST argument into an FTS5 query, the empty phrase matching nothing when no word can match.
+    Natural language and plain boolean words match any word, +words must all match and -words must not.
+    """
+    required_terms, optional_terms, excluded_terms = [], [], []
+    for word in (against or "").split():
+        operator = word[0] if boolean_mode and word[0] in "+-" else ""
+        terms = {"+": required_terms, "-": excluded_terms}.get(operator, optional_terms)
+        terms.extend(f'"{term}"' for term in tokenize(word))
+    query = " AND ".join(required_terms) if required_terms else " OR ".join(optional_terms)
+    if query and excluded_terms:
+        query = f"({query}) NOT ({' OR '.join(excluded_terms)})"
+    return query or '""'
+
+
+def _sqlite_parameters(params, integer_positions=()):
+    """
+    Returns the parameters as SQLite stores them in MySQL's place: floats bound to integer columns are rounded
+    (SQLite would keep 32700000.000000004 in a BIGINT column) and unsigned 64 bit integers wrapped
+    """
+    values = list(params) if params is not None else []
+    for position in integer_positions:
+        value = values[position]
+        if isinstance(value, float) and value == value:
+            values[position] = int(value + (0.5 if value >= 0 else -0.5))
+    return tuple(value - _UINT64_WRAP if type(value) is int and value > _INT64_MAX else value for value in values)
+
+
+def _create_table_statements(statement):
+    """
+    Returns the SQLite statements of a MySQL CREATE TABLE
+    """
+    table_name = _CREATE_TABLE_PATTERN.match(statement).group(1)
+    # A single column INTEGER primary key is the rowid, assigned on insert like AUTO_INCREMENT
+    primary_key = _SINGLE_PRIMARY_KEY_PATTERN.search(statement)
+    if primary_key:
+        statement = re.sub(rf"\b({primary_key.group(1)})\s+INT\b", r"\1 INTEGER", statement, count=1, flags=re.IGNORECASE)
+    # MySQL compares text case-insensitively (utf8mb4_0900_ai_ci), NOCASE does for ASCII letters, in
+    # comparisons, GROUP BY, ORDER BY and the unique and secondary indexes over the column
+    statement = _TEXT_COLUMN_PATTERN.sub(r"\1 COLLATE NOCASE", statement)
+    index_statements = [
+        f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({columns})"
+        for index_name, columns in _INLINE_INDEX_PATTERN.findall(statement)
+    ]
+    return [_INLINE_INDEX_PATTERN.sub("", statement), *index_statements]
+
+
+def fulltext_words(text):
+    """
+    Returns the text as the space separated terms the InnoDB parser would index, which the FTS5 tables index
+    """
+    return " ".join(tokenize(text)) if text is not None else None
+
+
+def _fulltext_index_statements(index_name, table_name, column, rowid_column):
+    """
+    Returns the statements creating a contentless FTS5 table of the fulltext_words() of the column,
+    filling it, recording it in the FullTextIndex table and creating the triggers syncing it
+    """
+    indexed_words = f"fulltext_words({{row}}.{column})"
+    insert_words = (
+        f"INSERT INTO {index_name}(rowid, {column}) SELECT {{row}}.{rowid_column}, {indexed_words} "
+        f"WHERE {{row}}.{column} IS NOT NULL;"
+    )
+    delete_words = (
+        f"INSERT INTO {index_name}({index_name}, rowid, {column}) SELECT 'delete', {{row}}.{rowid_column}, {indexed_words} "
+        f"WHERE {{row}}.{column} IS NOT NULL;"
+    )
+    return [
+        # Apostrophes and underscores are word characters, like in the InnoDB words
+        f"CREATE VIRTUAL TABLE {index_name} USING fts5({column}, content='', "
+        f"tokenize = \"unicode61 remove_diacritics 2 tokenchars '''_'\")",
+        f"INSERT INTO {index_name}(rowid, {column}) "
+        f"SELECT {rowid_column}, fulltext_words({column}) FROM {table_name} WHERE {column} IS NOT NULL",
+        "CREATE TABLE IF NOT EXISTS FullTextIndex(index_name TEXT PRIMARY KEY, table_name TEXT, column_name TEXT, rowid_column TEXT)",
+        f"INSERT OR REPLACE INTO FullTextIndex VALUES ('{index_name}', '{table_name}', '{column}', '{rowid_column}')",
+        f"CREATE TRIGGER {index_name}_insert AFTER INSERT ON {table_name} BEGIN {insert_words.format(row='new')} END",
+        f"CREATE TRIGGER {index_name}_delete AFTER DELETE ON {table_name} BEGIN {delete_words.format(row='old')} END",
+        f"CREATE TRIGGER {index_name}_update AFTER UPDATE OF {column} ON {table_name} BEGIN "
+        f"{delete_words.format(row='old')} {insert_words.format(row='new')} END",
+    ]
+
+
+class SQLiteCursor:
+    """
+    mysql.connector style cursor translating the statements it executes
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.sqlite_connection.cursor()
+        self.description = None
+        self.rowcount = -1
+
+    def _executed(self):
+        self.description = self._cursor.description
+        self.rowcount = self._cursor.rowcount
+
+    def execute(self, statement, params=None):
+        with _mysql_errors():
+            self.description = None
+            self.rowcount = -1
+            if _NO_OP_PATTERN.match(statement):
+                return
+            if _DROP_DATABASE_PATTERN.match(statement):
+                self._connection.drop_all_tables()
+                return
+            if _START_TRANSACTION_PATTERN.match(statement):
+                self._connection.start_transaction()
+                return
+
+            (main_statement, *follow_up_statements), integer_positions = self._connection.translate(statement)
+            self._cursor.execute(main_statement, _sqlite_parameters(params, integer_positions))
+            self._executed()
+            self._connection.rows_written(self.rowcount)
+            for follow_up_statement in follow_up_statements:
+                self._connection.sqlite_connection.execute(follow_up_statement)
+            if _DDL_PATTERN.match(statement):
+                # Like MySQL, schema changes commit the running transaction
+                self._connection.commit()
+                self._connection.schema_changed()
+                create_index = _CREATE_INDEX_PATTERN.match(statement)
+                if create_index:
+                    self._connection.sqlite_connection.execute(f"ANALYZE {create_index.group(1)};")
+
+    def executemany(self, statement, rows):
+        with _mysql_errors():
+            (main_statement, *_), integer_positions = self._connection.translate(statement)
+            self._cursor.executemany(main_statement, [_sqlite_parameters(row, integer_positions) for row in rows])
+            self._executed()
+            self._connection.rows_written(self.rowcount)
+
+    def fetchone(self):
+        with _mysql_errors():
+            return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        with _mysql_errors():
+            return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        with _mysql_errors():
+            return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """
+    mysql.connector style connection to an SQLite database file
+    """
+
+    def __init__(self, database_path):
+        self.database_path = str(database_path)
+        with _mysql_errors():
+            self.sqlite_connection = sqlite3.connect(self.database_path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+            if self.database_path != ":memory:":
+                # Readers don't block the writer of a load
+                self.sqlite_connection.execute("PRAGMA journal_mode = WAL;")
+                self.sqlite_connection.execute("PRAGMA synchronous = NORMAL;")
+            self.sqlite_connection.execute(f"PRAGMA analysis_limit = {ANALYZE_SAMPLE_ROWS};")
+            self.sqlite_connection.create_function("fulltext_query", 2, fts5_query, deterministic=True)
+            self.sqlite_connection.create_function("fulltext_words", 1, fulltext_words, deterministic=True)
+            self.sqlite_connection.create_function("VERSION", 0, lambda: f"SQLite {sqlite3.sqlite_version}", deterministic=True)
+        self._fulltext_indexes = None
+        self._translations = {}
+        self._rows_written = 0
+        self._closed = False
+
+    def _fulltext_index(self, column):
+        """
+        Returns (FTS5 table, row id column) of the full-text index over a column
+        """
+        if column.lower() not in (self._fulltext_indexes or {}):
+            try:
+                indexes = self.sqlite_connection.execute("SELECT column_name, index_name, rowid_column FROM FullTextIndex;").fetchall()
+            except sqlite3.OperationalError:
+                indexes = []
+            self._fulltext_indexes = {
+                indexed_column.lower(): (index_name, rowid_column) for indexed_column, index_name, rowid_column in indexes
+            }
+        if column.lower() not in self._fulltext_indexes:
+            raise sqlite3.OperationalError(f"No full-text index on column {column}")
+        return self._fulltext_indexes[column.lower()]
+
+    def _rewrite_match(self, match):
+        qualifier, column, boolean_mode = match.groups()
+        index_name, rowid_column = self._fulltext_index(column)
+        qualified_rowid = f"{qualifier}.{rowid_column}" if qualifier else rowid_column
+        return (
+            f"{qualified_rowid} IN (SELECT rowid FROM {index_name} "
+            f"WHERE {index_name} MATCH fulltext_query(%s, {1 if boolean_mode else 0}))"
+        )
+
+    def _integer_positions(self, statement):
+        """
+        Returns the positions of the parameters an INSERT binds to integer columns
+        """
+        insert = _INSERT_COLUMNS_PATTERN.match(statement)
+        if not insert:
+            return ()
+        table_name, columns, values = insert.groups()
+        # SQLite gives integer affinity to every declared type containing INT
+        integer_columns = {
+            name.lower() for _, name, column_type, _, _, _ in self.sqlite_connection.execute(f"PRAGMA table_info({table_name});")
+            if "INT" in column_type.upper()
+        }
+        columns = [column.strip().lower() for column in columns.split(",")]
+        values = [value.strip() for value in values.split(",")]
+        if len(columns) != len(values) or any(value != "%s" for value in values):
+            return ()
+        return tuple(position for position, column in enumerate(columns) if column in integer_columns)
+
+    def rows_written(self, rows_count):
+        if rows_count > 0:
+            self._rows_written += rows_count
+
+    def _analyze_if_loaded(self):
+        """
+        Refreshes the planner statistics once ANALYZE_ROWS_WRITTEN rows were written since the last refresh
+        """
+        if self._rows_written >= ANALYZE_ROWS_WRITTEN:
+            self._rows_written = 0
+            self.sqlite_connection.execute("ANALYZE;")
+
+    def schema_changed(self):
+        self._translations = {}
+        self._fulltext_indexes = None
+
+    def translate(self, statement):
+        """
+        Returns the SQLite statements of a MySQL statement, the one taking the parameters first and then its
+        follow-ups, with the positions of the parameters bound to integer columns
+        """
+        if statement not in self._translations:
+            if len(self._translations) >= TRANSLATION_CACHE_SIZE:
+                self._translations.clear()
+            self._translations[statement] = (self._translate(statement), self._integer_positions(statement))
+        return self._translations[statement]
+
+    def _translate(self, statement):
+        fulltext_index = _FULLTEXT_INDEX_PATTERN.match(statement)
+        if fulltext_index:
+            index_name, table_name, column = fulltext_index.groups()
+            rowid_column = next(
+                (name for _, name, column_type, _, _, primary_key in self.sqlite_connection.execute(f"PRAGMA table_info({table_name});")
+                 if primary_key == 1 and column_type.upper() == "INTEGER"),
+                "rowid",
+            )
+            return _fulltext_index_statements(index_name, table_name, column, rowid_column)
+
+        statements = _create_table_statements(statement) if _CREATE_TABLE_PATTERN.match(statement) else [statement]
+        delete_join = _DELETE_JOIN_PATTERN.match(statements[0])
+        if delete_join:
+            alias, table_name, joins = delete_join.groups()
+            statements[0] = f"DELETE FROM {table_name} WHERE rowid IN (SELECT {alias}.rowid FROM {table_name} {alias}{joins});"
+        statements[0] = _MATCH_AGAINST_PATTERN.sub(self._rewrite_match, statements[0])
+        on_duplicate_key = _ON_DUPLICATE_KEY_PATTERN.search(statements[0])
+        if on_duplicate_key:
+            update_assignments = _VALUES_FUNCTION_PATTERN.sub(r"excluded.\1", statements[0][on_duplicate_key.end():])
+            statements[0] = statements[0][:on_duplicate_key.start()] + "ON CONFLICT DO UPDATE SET" + update_assignments
+        for pattern, replacement in _REWRITES:
+            statements = [pattern.sub(replacement, sqlite_statement) for sqlite_statement in statements]
+        return statements
+
+    def drop_all_tables(self):
+        # Dropping an FTS5 table drops its shadow tables, so the virtual tables go first
+        for virtual_only in (True, False):
+            table_names = [
+                name for name, creation_statement in self.sqlite_connection.execute(
+                    "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%';"
+                ).fetchall()
+                if creation_statement.upper().startswith("CREATE VIRTUAL TABLE") or not virtual_only
+            ]
+            for table_name in table_names:
+                self.sqlite_connection.execute(f"DROP TABLE IF EXISTS {table_name};")
+        self.sqlite_connection.commit()
+        self.schema_changed()
+
+    def start_transaction(self):
+        if self.sqlite_connection.in_transaction:
+            self.commit()
+        # Transactions are started to write: taking the write lock up front waits for the other writers, a deferred
+        # transaction that read first fails right away (SQLITE_BUSY) once another writer committed
+        self.sqlite_connection.execute("BEGIN IMMEDIATE;")
+
+    @property
+    def in_transaction(self):
+        return self.sqlite_connection.in_transaction
+
+    def cursor(self, *args, **kwargs):
+        return SQLiteCursor(self)
+
+    def commit(self):
+        with _mysql_errors():
+            self.sqlite_connection.commit()
+            self._analyze_if_loaded()
+
+    def rollback(self):
+        with _mysql_errors():
+            self.sqlite_connection.rollback()
+
+    def is_connected(self):
+        return not self._closed
+
+    def close(self):
+        self._closed = True
+        self.sqlite_connection.close()
+
+
+def connect_sqlite_database(database_path):
+    """
+    Opens the SQLite database file (created when missing) as a mysql.connector style connection
+    """
+    print(f"Opening SQLite database: {database_path}")
+    return SQLiteConnection(database_path)
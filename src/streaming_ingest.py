@@ -0,0 +1,272 @@
+"""
+This file handles streaming data insertion for datasets too large to hold in memory.
+
+The CSV is read in fixed size chunks. Every chunk is normalized and written
+before the next one is read, and dimension ids (certificate, genre, worker)
+are resolved incrementally through bounded caches, so memory stays at a
+fixed ceiling regardless of the file size.
+"""
+
+import argparse
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import mysql.connector
+import pandas as pd
+
+from api_data_retrieve import (
+    BULK_BATCH_SIZE,
+    column_values,
+    executemany_in_batches,
+    insert_roles,
+    map_ids
+)
+from movies_dataset import MOVIES_DATASET_FILENAME, normalize_movies_data_frame
+from summary_tables import refresh_summary_tables
+from utilities import connect_database, mysql_database_name
+
+# Number of CSV rows parsed and written at a time
+STREAM_CHUNK_SIZE = 10000
+
+# Maximum number of dimension ids kept in memory per dimension table
+DIMENSION_CACHE_SIZE = 100000
+
+# Maximum number of keys per lookup statement
+LOOKUP_BATCH_SIZE = 1000
+
+
+class DimensionResolver:
+    """
+    Resolves dimension keys to their ids, inserting keys the database has not seen yet.
+    Resolved ids are kept in a bounded LRU cache; evicted keys are looked up again on demand.
+    """
+
+    def __init__(self, table, key_columns, id_column, insert_statement, insert_row=None, cache_size=DIMENSION_CACHE_SIZE):
+        self.table = table
+        self.key_columns = key_columns
+        self.id_column = id_column
+        self.insert_statement = insert_statement
+        self.insert_row = insert_row or (lambda key: key if isinstance(key, tuple) else (key,))
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _cache_ids(self, id_map):
+        for key, key_id in id_map.items():
+            self._cache[key] = key_id
+            self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _lookup(self, mysql_cursor, keys):
+        id_map = {}
+        select_columns = ", ".join(self.key_columns + [self.id_column])
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            batch = keys[start:start + LOOKUP_BATCH_SIZE]
+            if len(self.key_columns) == 1:
+                placeholders = ", ".join(["%s"] * len(batch))
+                condition = f"{self.key_columns[0]} IN ({placeholders})"
+                parameters = batch
+            else:
+                row_placeholder = "(" + ", ".join(["%s"] * len(self.key_columns)) + ")"
+                placeholders = ", ".join([row_placeholder] * len(batch))
+                condition = f"({', '.join(self.key_columns)}) IN ({placeholders})"
+                parameters = [value for key in batch for value in key]
+            mysql_cursor.execute(f"SELECT {select_columns} FROM {self.table} WHERE {condition};", parameters)
+            for row in mysql_cursor.fetchall():
+                key = row[0] if len(row) == 2 else tuple(row[:-1])
+                id_map[key] = row[-1]
+        return id_map
+
+    def resolve(self, mysql_cursor, keys, batch_size=BULK_BATCH_SIZE):
+        """
+        Returns a key -> id map for the given keys, inserting the missing ones.
+        """
+        keys = list(dict.fromkeys(keys))
+        id_map = {}
+        missing_keys = []
+        for key in keys:
+            key_id = self._cache.get(key)
+            if key_id is None:
+                missing_keys.append(key)
+            else:
+                self._cache.move_to_end(key)
+                id_map[key] = key_id
+
+        if missing_keys:
+            found_ids = self._lookup(mysql_cursor, missing_keys)
+            new_keys = [key for key in missing_keys if key not in found_ids]
+            if new_keys:
+                executemany_in_batches(mysql_cursor, self.insert_statement, map(self.insert_row, new_keys), batch_size)
+                found_ids.update(self._lookup(mysql_cursor, new_keys))
+            self._cache_ids(found_ids)
+            id_map.update(found_ids)
+        return id_map
+
+
+def create_dimension_resolvers(cache_size):
+    return {
+        "certificates": DimensionResolver(
+            "Certificate", ["certificate"], "certificate_id",
+            "INSERT INTO Certificate (certificate, description) VALUES (%s, %s);",
+            insert_row=lambda certificate: (certificate, "Description placeholder"),
+            cache_size=cache_size
+        ),
+        "genres": DimensionResolver(
+            "Genre", ["name"], "genre_id",
+            "INSERT INTO Genre (name) VALUES (%s);",
+            cache_size=cache_size
+        ),
+        "workers": DimensionResolver(
+            "Worker", ["full_name", "role_id"], "worker_id",
+            "INSERT INTO Worker (full_name, role_id) VALUES (%s, %s);",
+            cache_size=cache_size
+        ),
+    }
+
+
+def iter_normalized_batches(csv_path, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yields the normalized tables of the dataset one chunk of rows at a time.
+    Chunk row labels continue across chunks, so movie ids match a full load.
+    """
+    for movies_chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        yield normalize_movies_data_frame(movies_chunk)
+
+
+def _write_batch(mysql_cursor, normalized_batch, resolvers, batch_size):
+    """
+    Writes one normalized batch, returns the number of rows written per table
+    """
+    movies = normalized_batch["movies"]
+    movie_genres = normalized_batch["movie_genres"]
+    movie_workers = normalized_batch["movie_workers"]
+    rows_written = {}
+
+    certificate_ids = resolvers["certificates"].resolve(
+        mysql_cursor, column_values(normalized_batch["certificates"], "certificate"), batch_size
+    )
+    genre_ids = resolvers["genres"].resolve(mysql_cursor, column_values(normalized_batch["genres"], "name"), batch_size)
+    worker_keys = list(zip(column_values(movie_workers, "full_name"), column_values(movie_workers, "role_id")))
+    worker_ids = resolvers["workers"].resolve(mysql_cursor, worker_keys, batch_size)
+
+    movie_ids = column_values(movies, "movie_id")
+    rows_written["Movie"] = executemany_in_batches(
+        mysql_cursor,
+        "INSERT INTO Movie (movie_id, title, release_year, duration_minutes, description, certificate_id) VALUES (%s, %s, %s, %s, %s, %s);",
+        zip(
+            movie_ids,
+            column_values(movies, "title"),
+            column_values(movies, "release_year"),
+            column_values(movies, "duration_minutes"),
+            column_values(movies, "description"),
+            map_ids(column_values(movies, "certificate"), certificate_ids)
+        ),
+        batch_size
+    )
+
+    rows_written["MovieMetrics"] = executemany_in_batches(
+        mysql_cursor,
+        "INSERT INTO MovieMetrics (rating, votes, metascore, revenue, movie_id) VALUES (%s, %s, %s, %s, %s);",
+        zip(
+            column_values(movies, "rating"),
+            column_values(movies, "votes"),
+            column_values(movies, "metascore"),
+            column_values(movies, "revenue"),
+            movie_ids
+        ),
+        batch_size
+    )
+
+    rows_written["MovieGenreAssociation"] = executemany_in_batches(
+        mysql_cursor,
+        "INSERT INTO MovieGenreAssociation (movie_id, genre_id) VALUES (%s, %s);",
+        zip(column_values(movie_genres, "movie_id"), map_ids(column_values(movie_genres, "name"), genre_ids)),
+        batch_size
+    )
+
+    # A person credited both as director and actor of a movie is one association row
+    movie_worker_rows = sorted(set(zip(column_values(movie_workers, "movie_id"), map_ids(worker_keys, worker_ids))))
+    rows_written["MovieWorkerAssociation"] = executemany_in_batches(
+        mysql_cursor,
+        "INSERT INTO MovieWorkerAssociation (movie_id, worker_id) VALUES (%s, %s);",
+        movie_worker_rows,
+        batch_size
+    )
+    rows_written["MovieFingerprint"] = executemany_in_batches(
+        mysql_cursor,
+        "INSERT INTO MovieFingerprint (movie_id, source_key, row_hash) VALUES (%s, %s, %s);",
+        zip(movie_ids, column_values(movies, "source_key"), column_values(movies, "row_hash")),
+        batch_size
+    )
+    return rows_written
+
+
+def stream_ingest(mysql_connection, csv_path, chunk_size=STREAM_CHUNK_SIZE, batch_size=BULK_BATCH_SIZE, cache_size=DIMENSION_CACHE_SIZE):
+    """
+    Streams the dataset into the database chunk by chunk, one transaction per chunk.
+    Returns the total number of rows written per table.
+    """
+    mysql_cursor = mysql_connection.cursor()
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    insert_roles(mysql_connection, mysql_cursor)
+
+    resolvers = create_dimension_resolvers(cache_size)
+    total_rows_written = {}
+    started_at = time.perf_counter()
+    try:
+        for chunk_number, normalized_batch in enumerate(iter_normalized_batches(csv_path, chunk_size), start=1):
+            try:
+                mysql_cursor.execute("START TRANSACTION;")
+                rows_written = _write_batch(mysql_cursor, normalized_batch, resolvers, batch_size)
+                mysql_connection.commit()
+            except mysql.connector.Error as error:
+                print(f"Error inserting chunk {chunk_number}: ", error)
+                mysql_connection.rollback()
+                raise
+
+            for table_name, rows_count in rows_written.items():
+                total_rows_written[table_name] = total_rows_written.get(table_name, 0) + rows_count
+            elapsed = time.perf_counter() - started_at
+            movies_count = total_rows_written["Movie"]
+            print(f"Chunk {chunk_number}: {movies_count} movies written ({movies_count / elapsed:.0f} movies/sec).")
+    finally:
+        mysql_cursor.close()
+    return total_rows_written
+
+
+def main(chunk_size=STREAM_CHUNK_SIZE, batch_size=BULK_BATCH_SIZE, cache_size=DIMENSION_CACHE_SIZE, csv_path=None):
+    """
+    handles streaming data insertion
+    """
+    mysql_connection = None
+    if csv_path is None:
+        csv_path = Path(__file__).resolve().parent / MOVIES_DATASET_FILENAME
+
+    try:
+        mysql_connection = connect_database()
+        rows_written = stream_ingest(mysql_connection, csv_path, chunk_size, batch_size, cache_size)
+        for table_name, rows_count in rows_written.items():
+            print(f"{table_name}: {rows_count} rows.")
+        refresh_summary_tables(mysql_connection)
+    except mysql.connector.Error as mysql_connection_error:
+        print("MySQL data retrieve error: ", mysql_connection_error)
+    except Exception as err:
+        print(err)
+    finally:
+        if mysql_connection:
+            mysql_connection.close()
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description="Stream the IMDb dataset into the movies database")
+    parser.add_argument("--csv", type=Path, default=None, help="dataset to load")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE, help="CSV rows per chunk")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="rows per executemany batch")
+    parser.add_argument("--cache-size", type=int, default=DIMENSION_CACHE_SIZE, help="dimension ids kept in memory per table")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = _parse_arguments()
+    main(arguments.chunk_size, arguments.batch_size, arguments.cache_size, arguments.csv)
@@ -0,0 +1,185 @@
+"""
+This file maintains the summary tables derived from the loaded data.
+
+GenreYearRevenue holds the revenue aggregates of every (release year, genre),
+so query_1 reads the top genre per year from a few indexed rows instead of
+aggregating the whole catalogue. It is refreshed in full at the end of a load
+and only for the affected years after a delta load.
+
+DirectorMetascore and DirectorActorCollaboration hold every director's average
+metascore and, per director, the actors they worked with ranked by the average
+metascore of their shared movies, so query_3 and the director/actor suitability
+lookup read a director's rows by primary key instead of joining the associations.
+They are refreshed in full at the end of a load and only for the affected
+directors after a delta load.
+
+IngestGeneration counts the completed ingests; query caches compare it to
+detect that their results are stale.
+"""
+
+import mysql.connector
+
+from utilities import connect_database, mysql_database_name
+
+# Maximum number of years or directors per refresh statement
+_YEARS_BATCH_SIZE = 500
+_DIRECTORS_BATCH_SIZE = 1000
+
+_GENRE_YEAR_REVENUE_SELECT = """
+    SELECT
+        M.release_year,
+        MGA.genre_id,
+        MAX(MM.revenue),
+        SUM(MM.revenue),
+        COUNT(*)
+    FROM Movie M
+    JOIN MovieMetrics MM ON M.movie_id = MM.movie_id
+    JOIN MovieGenreAssociation MGA ON M.movie_id = MGA.movie_id
+"""
+
+
+def refresh_genre_year_revenue(mysql_cursor, years=None) -> int:
+    """
+    Recomputes the GenreYearRevenue rows of the given release years, or of all years when years is None.
+    Runs inside the caller's transaction. Returns the number of summary rows written.
+    """
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    insert_statement = """
+    INSERT INTO GenreYearRevenue (release_year, genre_id, max_revenue, total_revenue, movies_count)
+    """ + _GENRE_YEAR_REVENUE_SELECT
+
+    if years is None:
+        mysql_cursor.execute("DELETE FROM GenreYearRevenue;")
+        mysql_cursor.execute(insert_statement + " GROUP BY M.release_year, MGA.genre_id;")
+        return mysql_cursor.rowcount
+
+    years = sorted(set(years))
+    rows_count = 0
+    for start in range(0, len(years), _YEARS_BATCH_SIZE):
+        batch = years[start:start + _YEARS_BATCH_SIZE]
+        placeholders = ", ".join(["%s"] * len(batch))
+        mysql_cursor.execute(f"DELETE FROM GenreYearRevenue WHERE release_year IN ({placeholders});", batch)
+        mysql_cursor.execute(
+            insert_statement + f" WHERE M.release_year IN ({placeholders}) GROUP BY M.release_year, MGA.genre_id;",
+            batch
+        )
+        rows_count += mysql_cursor.rowcount
+    return rows_count
+
+
+_DIRECTOR_METASCORE_SELECT = """
+    SELECT
+        MWA.worker_id,
+        AVG(MM.metascore),
+        COUNT(*)
+    FROM MovieWorkerAssociation MWA
+    JOIN Worker D ON MWA.worker_id = D.worker_id
+    JOIN Role RD ON D.role_id = RD.role_id AND RD.name = 'director'
+    JOIN MovieMetrics MM ON MWA.movie_id = MM.movie_id
+"""
+
+_DIRECTOR_ACTOR_COLLABORATION_SELECT = """
+    SELECT
+        MWA_Director.worker_id,
+        ROW_NUMBER() OVER (PARTITION BY MWA_Director.worker_id ORDER BY AVG(MM.metascore) DESC, MWA_Actor.worker_id),
+        MWA_Actor.worker_id,
+        AVG(MM.metascore),
+        COUNT(*)
+    FROM MovieWorkerAssociation MWA_Director
+    JOIN Worker D ON MWA_Director.worker_id = D.worker_id
+    JOIN Role RD ON D.role_id = RD.role_id AND RD.name = 'director'
+    JOIN MovieWorkerAssociation MWA_Actor ON MWA_Director.movie_id = MWA_Actor.movie_id
+    JOIN Worker A ON MWA_Actor.worker_id = A.worker_id
+    JOIN Role RA ON A.role_id = RA.role_id AND RA.name = 'actor'
+    JOIN MovieMetrics MM ON MWA_Director.movie_id = MM.movie_id
+"""
+
+
+def refresh_director_collaborations(mysql_cursor, director_ids=None) -> int:
+    """
+    Recomputes the DirectorMetascore and DirectorActorCollaboration rows of the given directors,
+    or of all directors when director_ids is None.
+    Runs inside the caller's transaction. Returns the number of collaboration rows written.
+    """
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    metascore_insert = """
+    INSERT INTO DirectorMetascore (director_id, avg_metascore, movies_count)
+    """ + _DIRECTOR_METASCORE_SELECT
+    collaboration_insert = """
+    INSERT INTO DirectorActorCollaboration (director_id, actor_rank, actor_id, avg_metascore, movies_count)
+    """ + _DIRECTOR_ACTOR_COLLABORATION_SELECT
+
+    if director_ids is None:
+        mysql_cursor.execute("DELETE FROM DirectorMetascore;")
+        mysql_cursor.execute("DELETE FROM DirectorActorCollaboration;")
+        mysql_cursor.execute(metascore_insert + " GROUP BY MWA.worker_id;")
+        mysql_cursor.execute(collaboration_insert + " GROUP BY MWA_Director.worker_id, MWA_Actor.worker_id;")
+        return mysql_cursor.rowcount
+
+    director_ids = sorted(set(director_ids))
+    rows_count = 0
+    for start in range(0, len(director_ids), _DIRECTORS_BATCH_SIZE):
+        batch = director_ids[start:start + _DIRECTORS_BATCH_SIZE]
+        placeholders = ", ".join(["%s"] * len(batch))
+        mysql_cursor.execute(f"DELETE FROM DirectorMetascore WHERE director_id IN ({placeholders});", batch)
+        mysql_cursor.execute(f"DELETE FROM DirectorActorCollaboration WHERE director_id IN ({placeholders});", batch)
+        mysql_cursor.execute(
+            metascore_insert + f" WHERE MWA.worker_id IN ({placeholders}) GROUP BY MWA.worker_id;", batch
+        )
+        mysql_cursor.execute(
+            collaboration_insert + f" WHERE MWA_Director.worker_id IN ({placeholders}) GROUP BY MWA_Director.worker_id, MWA_Actor.worker_id;",
+            batch
+        )
+        rows_count += mysql_cursor.rowcount
+    return rows_count
+
+
+def bump_ingest_generation(mysql_cursor) -> None:
+    """
+    Marks the end of an ingest, runs inside the caller's transaction
+    """
+    mysql_cursor.execute(f"USE {mysql_database_name()};")
+    mysql_cursor.execute(
+        "INSERT INTO IngestGeneration (id, generation) VALUES (1, 1) ON DUPLICATE KEY UPDATE generation = generation + 1;"
+    )
+
+
+def refresh_summary_tables(mysql_connection, years=None, director_ids=None) -> int:
+    """
+    Refreshes the summary tables and bumps the ingest generation in their own transaction
+    """
+    mysql_cursor = mysql_connection.cursor()
+    try:
+        mysql_cursor.execute("START TRANSACTION;")
+        rows_count = refresh_genre_year_revenue(mysql_cursor, years)
+        collaborations_count = refresh_director_collaborations(mysql_cursor, director_ids)
+        bump_ingest_generation(mysql_cursor)
+        mysql_connection.commit()
+        print(f"Summary tables refreshed: {rows_count} GenreYearRevenue rows, {collaborations_count} DirectorActorCollaboration rows.")
+        return rows_count + collaborations_count
+    except mysql.connector.Error as error:
+        print("Error refreshing summary tables: ", error)
+        mysql_connection.rollback()
+        return 0
+    finally:
+        mysql_cursor.close()
+
+
+def main():
+    """
+    Rebuilds the summary tables of an already loaded database
+    """
+    mysql_connection = None
+
+    try:
+        mysql_connection = connect_database()
+        refresh_summary_tables(mysql_connection)
+    except mysql.connector.Error as mysql_connection_error:
+        print("MySQL summary refresh error: ", mysql_connection_error)
+    finally:
+        if mysql_connection:
+            mysql_connection.close()
+
+
+if __name__ == "__main__":
+    main()
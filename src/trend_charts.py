@@ -0,0 +1,216 @@
+"""
+This file renders the genre trend charts of query_2_trend and caches the rendered images.
+
+Charts are drawn on standalone Agg figures rather than through pyplot, so server
+threads can render them concurrently. Rendered PNGs are kept in a bounded LRU
+keyed by (genre, years, ingest generation), with an optional on-disk tier. A
+cached chart is returned without checking out a connection until the ingest
+generation is due for its next check (GENERATION_CHECK_INTERVAL), and an ingest
+invalidates every chart rendered before it.
+"""
+
+import io
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from queries_db_script import query_2_trend
+from query_cache import GENERATION_CHECK_INTERVAL, fetch_ingest_generation
+from utilities import with_pooled_connection
+
+DEFAULT_MAX_CHARTS = 64
+
+# Size in inches and resolution of the rendered charts
+CHART_SIZE = (14, 6)
+CHART_DPI = 100
+
+# Bar color of each plotted query_2_trend column
+_TREND_COLUMNS = (("Average Revenue", "skyblue"), ("Average Rating", "lightgreen"))
+
+
+def chart_file_name(genre, years):
+    genre_slug = re.sub(r"\W+", "_", genre).lower()
+    return f"genre_trend_{genre_slug}_{years}_years.png"
+
+
+def draw_genre_trend(figure, trend, genre, years):
+    """
+    Draws the average revenue and rating bars of a query_2_trend result side by side on the figure
+    """
+    labels = [str(year) for year in trend["Year"]]
+    for position, (column, color) in enumerate(_TREND_COLUMNS, 1):
+        axes = figure.add_subplot(1, 2, position)
+        axes.bar(labels, trend[column], color=color)
+        axes.set_title(f"{column} by Year for {genre} (Last {years} Years)")
+        axes.set_xlabel("Year")
+        axes.set_ylabel(column)
+        axes.tick_params(axis="x", labelrotation=90)
+        axes.grid(True)
+    figure.tight_layout()
+
+
+def render_genre_trend(trend, genre, years):
+    """
+    Renders the chart of a query_2_trend result to PNG bytes
+    """
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+    draw_genre_trend(figure, trend, genre, years)
+    image = io.BytesIO()
+    figure.savefig(image, format="png")
+    return image.getvalue()
+
+
+class ChartCache:
+    """
+    Bounded LRU of rendered charts keyed by (genre, years, ingest generation), with an optional on-disk tier
+    """
+
+    def __init__(self, max_charts=DEFAULT_MAX_CHARTS, disk_directory=None):
+        self.max_charts = max_charts
+        self.disk_directory = Path(disk_directory) if disk_directory else None
+        self.enabled = True
+        self._charts = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_checked_at = None
+        self._stats = {"hits": 0, "disk_hits": 0, "renders": 0, "evictions": 0, "invalidations": 0}
+
+    def _disk_path(self, genre, years, generation):
+        return self.disk_directory / str(generation) / chart_file_name(genre, years)
+
+    def generation_is_current(self):
+        """
+        Whether the ingest generation was read less than GENERATION_CHECK_INTERVAL seconds ago
+        """
+        checked_at = self._generation_checked_at
+        return checked_at is not None and time.monotonic() - checked_at < GENERATION_CHECK_INTERVAL
+
+    def check_generation(self, mysql_connection):
+        """
+        Drops the charts of older generations when the ingest generation changed since the last check
+        """
+        if self.generation_is_current():
+            return
+        generation = fetch_ingest_generation(mysql_connection)
+        with self._lock:
+            self._generation_checked_at = time.monotonic()
+            if generation != self._generation:
+                if self._generation is not None or self._charts:
+                    self._stats["invalidations"] += 1
+                self._charts.clear()
+                if self.disk_directory and self.disk_directory.exists():
+                    for generation_directory in self.disk_directory.iterdir():
+                        if generation_directory.name != str(generation):
+                            shutil.rmtree(generation_directory, ignore_errors=True)
+                self._generation = generation
+
+    def get(self, genre, years):
+        """
+        Returns the cached chart of the current generation, or None
+        """
+        with self._lock:
+            key = (genre, years, self._generation)
+            chart = self._charts.get(key)
+            if chart is not None:
+                self._charts.move_to_end(key)
+                self._stats["hits"] += 1
+                return chart
+
+            if self.disk_directory:
+                disk_path = self._disk_path(*key)
+                if disk_path.exists():
+                    chart = disk_path.read_bytes()
+                    self._store_in_memory(key, chart)
+                    self._stats["disk_hits"] += 1
+                    return chart
+            return None
+
+    def _store_in_memory(self, key, chart):
+        self._charts[key] = chart
+        self._charts.move_to_end(key)
+        while len(self._charts) > self.max_charts:
+            self._charts.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def put(self, genre, years, chart):
+        with self._lock:
+            key = (genre, years, self._generation)
+            self._stats["renders"] += 1
+            self._store_in_memory(key, chart)
+            if self.disk_directory:
+                disk_path = self._disk_path(*key)
+                disk_path.parent.mkdir(parents=True, exist_ok=True)
+                disk_path.write_bytes(chart)
+
+    def clear(self):
+        with self._lock:
+            self._charts.clear()
+            if self.disk_directory and self.disk_directory.exists():
+                shutil.rmtree(self.disk_directory, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._charts)
+            requests = stats["hits"] + stats["disk_hits"] + stats["renders"]
+            stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / requests if requests else 0.0
+            return stats
+
+
+_chart_cache = ChartCache()
+
+
+def get_chart_cache():
+    return _chart_cache
+
+
+def configure_chart_cache(max_charts=DEFAULT_MAX_CHARTS, disk_directory=None, enabled=True):
+    """
+    Replaces the shared chart cache with one using the given settings
+    """
+    global _chart_cache
+    _chart_cache = ChartCache(max_charts, disk_directory)
+    _chart_cache.enabled = enabled
+    return _chart_cache
+
+
+def chart_cache_stats():
+    return _chart_cache.stats()
+
+
+def genre_trend_chart(genre, years, mysql_connection=None):
+    """
+    Returns the PNG chart of the genre's average revenue and rating per year over the last `years` years,
+    or None when the genre has no movies in that period
+    """
+    years = int(years)
+    cache = _chart_cache
+    if cache.enabled and cache.generation_is_current():
+        chart = cache.get(genre, years)
+        if chart is not None:
+            return chart
+    return _render_genre_trend_chart(genre, years, mysql_connection=mysql_connection)
+
+
+@with_pooled_connection
+def _render_genre_trend_chart(genre, years, mysql_connection=None):
+    cache = _chart_cache
+    if not cache.enabled:
+        trend = query_2_trend(genre, years, mysql_connection)
+        return render_genre_trend(trend, genre, years) if trend is not None else None
+
+    cache.check_generation(mysql_connection)
+    chart = cache.get(genre, years)
+    if chart is not None:
+        return chart
+    trend = query_2_trend(genre, years, mysql_connection)
+    if trend is None:
+        return None
+    chart = render_genre_trend(trend, genre, years)
+    cache.put(genre, years, chart)
+    return chart
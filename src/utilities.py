@@ -2,6 +2,18 @@
 Movies Database Constants
 """
 
+import contextlib
+import functools
+import importlib
+import inspect
+import os
+import queue
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
 import mysql.connector
 
 MYSQL_HOST = "localhost"
@@ -12,6 +24,14 @@ MYSQL_DATABASE_NAME = "ahmadk1"
 MYSQL_USER = "ahmadk1"
 MYSQL_PASSWORD = "ahma50949"
 
+MYSQL_POOL_SIZE = 5
+# Seconds to wait for a free pooled connection before giving up
+MYSQL_POOL_TIMEOUT = 30
+
+# Database every connection goes to: "mysql" (the server above) or "sqlite" (an embedded database file)
+STORAGE_BACKEND = os.environ.get("MOVIES_STORAGE_BACKEND", "mysql")
+SQLITE_DATABASE_PATH = os.environ.get("MOVIES_SQLITE_PATH", str(Path(__file__).resolve().parent / "movies.sqlite3"))
+
 def connect_mysql_server():
     """
     Connects to the mysql server
@@ -22,5 +42,252 @@ def connect_mysql_server():
         port=MYSQL_PORT,
         user=MYSQL_USER,
         password=MYSQL_PASSWORD,
-        database=MYSQL_DATABASE_NAME
+        database=_storage_backend["mysql_database"]
     )
+
+
+_storage_backend = {"name": STORAGE_BACKEND, "sqlite_path": SQLITE_DATABASE_PATH, "mysql_database": MYSQL_DATABASE_NAME}
+
+
+def _connect_sqlite_database():
+    # Imported on first use, the backend loads numpy for its parameter adapters
+    from sqlite_backend import connect_sqlite_database
+    return connect_sqlite_database(_storage_backend["sqlite_path"])
+
+
+# Backend name -> function opening a connection to it
+STORAGE_BACKENDS = {
+    "mysql": connect_mysql_server,
+    "sqlite": _connect_sqlite_database,
+}
+
+
+def configure_storage_backend(name, sqlite_path=SQLITE_DATABASE_PATH, mysql_database=MYSQL_DATABASE_NAME):
+    """
+    Selects the backend (and SQLite database file or MySQL database) of the connections opened from now on,
+    the shared pool is closed
+    """
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend {name}, expected one of {', '.join(STORAGE_BACKENDS)}")
+    close_connection_pool()
+    _storage_backend["name"] = name
+    _storage_backend["sqlite_path"] = str(sqlite_path)
+    _storage_backend["mysql_database"] = mysql_database
+
+
+def storage_backend_name():
+    return _storage_backend["name"]
+
+
+def mysql_database_name():
+    return _storage_backend["mysql_database"]
+
+
+def connect_database():
+    """
+    Connects to the configured storage backend
+    """
+    return STORAGE_BACKENDS[_storage_backend["name"]]()
+
+
+class _LazyModule(types.ModuleType):
+    """
+    Stand-in for a module, imported on first attribute access
+    """
+
+    def __getattr__(self, attribute):
+        # import_module holds the import lock, concurrent first accesses import the module once
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+
+def lazy_import(module_name):
+    """
+    Returns the module, imported on first attribute access: `pd = lazy_import("pandas")` keeps pandas out of the startup
+    """
+    return sys.modules.get(module_name) or _LazyModule(module_name)
+
+
+class ConnectionPool:
+    """
+    Fixed size pool of database connections.
+    Connections are opened on demand, health checked on checkout and discarded
+    instead of returned when the borrower failed with a MySQL error.
+    """
+
+    def __init__(self, size=MYSQL_POOL_SIZE, timeout=MYSQL_POOL_TIMEOUT, connect=None):
+        self.size = size
+        self.timeout = timeout
+        self._connect = connect or connect_database
+        self._idle_connections = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "in_use": 0,
+            "peak_in_use": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def checkout(self):
+        """
+        Takes a connection out of the pool, waiting up to the pool timeout for a free one.
+        Every checkout must be matched by a checkin.
+        """
+        started_at = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise mysql.connector.errors.PoolError(f"No free connection within {self.timeout}s (pool size {self.size})")
+        wait_seconds = time.perf_counter() - started_at
+
+        mysql_connection = None
+        while mysql_connection is None:
+            try:
+                candidate = self._idle_connections.get_nowait()
+            except queue.Empty:
+                break
+            if candidate.is_connected():
+                mysql_connection = candidate
+            else:
+                self._discard(candidate)
+
+        try:
+            if mysql_connection is None:
+                mysql_connection = self._connect()
+                with self._lock:
+                    self._stats["created"] += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+            self._stats["wait_seconds_total"] += wait_seconds
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait_seconds)
+        return mysql_connection
+
+    def _discard(self, mysql_connection):
+        with self._lock:
+            self._stats["recycled"] += 1
+        try:
+            mysql_connection.close()
+        except mysql.connector.Error:
+            pass
+
+    def checkin(self, mysql_connection, failed=False):
+        """
+        Returns a checked out connection, failed connections are closed instead of reused
+        """
+        try:
+            if failed or self._closed:
+                self._discard(mysql_connection)
+            else:
+                if mysql_connection.in_transaction:
+                    mysql_connection.rollback()
+                self._idle_connections.put(mysql_connection)
+        except mysql.connector.Error:
+            self._discard(mysql_connection)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the duration of the with block
+        """
+        mysql_connection = self.checkout()
+        failed = False
+        try:
+            yield mysql_connection
+        except mysql.connector.Error:
+            failed = True
+            raise
+        finally:
+            self.checkin(mysql_connection, failed)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except queue.Empty:
+                break
+            except mysql.connector.Error:
+                pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self.size
+        stats["idle"] = self._idle_connections.qsize()
+        stats["utilization"] = stats["in_use"] / self.size
+        stats["wait_seconds_average"] = stats["wait_seconds_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Returns the shared connection pool, creating it on first use
+    """
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = ConnectionPool()
+        return _connection_pool
+
+
+def configure_connection_pool(size=MYSQL_POOL_SIZE, timeout=MYSQL_POOL_TIMEOUT):
+    """
+    Replaces the shared connection pool with one of the given size
+    """
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is not None:
+            _connection_pool.close()
+        _connection_pool = ConnectionPool(size, timeout)
+        return _connection_pool
+
+
+def close_connection_pool():
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is not None:
+            _connection_pool.close()
+            _connection_pool = None
+
+
+def pooled_connection():
+    """
+    Checks out a connection of the shared pool: `with pooled_connection() as mysql_connection:`
+    """
+    return get_connection_pool().connection()
+
+
+def with_pooled_connection(query_function):
+    """
+    Runs the query function over a pooled connection when it is called without a `mysql_connection`
+    """
+    signature = inspect.signature(query_function)
+
+    @functools.wraps(query_function)
+    def wrapper(*args, **kwargs):
+        bound_arguments = signature.bind(*args, **kwargs)
+        if bound_arguments.arguments.get("mysql_connection") is not None:
+            return query_function(*args, **kwargs)
+        with pooled_connection() as mysql_connection:
+            bound_arguments.arguments["mysql_connection"] = mysql_connection
+            return query_function(*bound_arguments.args, **bound_arguments.kwargs)
+
+    return wrapper